@@ -0,0 +1,194 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted (wait queue full or max wait exceeded)."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class Permit:
+    """One admitted slot. release() is idempotent so it can be called from several cleanup paths."""
+
+    def __init__(self, controller: "AdmissionController") -> None:
+        self._controller = controller
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        """Give the slot back (to the next waiter, if any)."""
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.monotonic() - self._started)
+
+
+class AdmissionController:
+    """Bound the number of in-flight agent runs with a FIFO wait queue.
+
+    Up to max_in_flight runs execute at once. Further requests wait in FIFO order,
+    at most max_queue of them and for at most max_wait seconds each; beyond that
+    they are rejected immediately with AdmissionRejected (mapped to 429 +
+    Retry-After) instead of piling onto the LLM backend.
+    """
+
+    def __init__(
+        self, max_in_flight: int = 32, max_queue: int = 64, max_wait: float = 30.0
+    ) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self._in_flight = 0
+        self._waiters: deque[tuple[asyncio.Future, float]] = deque()
+
+        # Exponentially weighted run duration, used to estimate Retry-After
+        self._avg_run_seconds = 1.0
+
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.timed_out_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """Build a controller from ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE and ADMISSION_MAX_WAIT_SECONDS."""
+        return cls(
+            max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", 32)),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", 64)),
+            max_wait=float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", 30)),
+        )
+
+    @property
+    def in_flight(self) -> int:
+        """Number of admitted runs currently executing."""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests waiting for a slot."""
+        return len(self._waiters)
+
+    def oldest_wait_seconds(self) -> float:
+        """How long the request at the head of the queue has been waiting."""
+        if not self._waiters:
+            return 0.0
+        return time.monotonic() - self._waiters[0][1]
+
+    def _retry_after(self) -> int:
+        """Estimate (whole seconds) until a new request would get a slot."""
+        backlog = len(self._waiters) + 1
+        estimate = self._avg_run_seconds * backlog / self.max_in_flight
+        return max(1, min(60, math.ceil(estimate)))
+
+    def _admitted(self, waited: float) -> Permit:
+        """Record an admission and hand out its permit."""
+        self.admitted_total += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        return Permit(self)
+
+    def _release(self, run_seconds: float) -> None:
+        """Pass the slot to the oldest live waiter or free it."""
+        self._avg_run_seconds = 0.9 * self._avg_run_seconds + 0.1 * run_seconds
+        while self._waiters:
+            future, _ = self._waiters.popleft()
+            if not future.done():
+                # The slot is handed over directly, so in_flight stays the same
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    async def acquire(self) -> Permit:
+        """Wait for a slot in FIFO order.
+
+        Raises:
+            AdmissionRejected: if the wait queue is full or the slot did not free up within max_wait.
+        """
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return self._admitted(0.0)
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_total += 1
+            raise AdmissionRejected(
+                "Server is at capacity, retry later", self._retry_after()
+            )
+
+        enqueued = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, enqueued)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(future, timeout=self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over while we were giving up; pass it on
+                self._release(0.0)
+            else:
+                try:
+                    self._waiters.remove(entry)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out_total += 1
+                raise AdmissionRejected(
+                    f"No capacity within {self.max_wait:g}s, retry later",
+                    self._retry_after(),
+                ) from None
+            raise
+
+        return self._admitted(time.monotonic() - enqueued)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Permit]:
+        """Async context manager holding one slot for the duration of the block."""
+        permit = await self.acquire()
+        try:
+            yield permit
+        finally:
+            permit.release()
+
+    def stats(self) -> dict:
+        """Current queue/in-flight state and counters (for /health and scaling signals)."""
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "oldest_wait_seconds": round(self.oldest_wait_seconds(), 3),
+            "admitted_total": self.admitted_total,
+            "rejected_total": self.rejected_total,
+            "timed_out_total": self.timed_out_total,
+            "wait_seconds_avg": round(
+                self.wait_seconds_total / self.admitted_total, 3
+            )
+            if self.admitted_total
+            else 0.0,
+            "wait_seconds_max": round(self.wait_seconds_max, 3),
+        }
+
+
+async def admission_rejected_handler(
+    request: Request, exc: AdmissionRejected
+) -> JSONResponse:
+    """FastAPI exception handler turning AdmissionRejected into 429 + Retry-After."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
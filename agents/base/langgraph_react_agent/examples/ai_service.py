@@ -7,6 +7,7 @@ from langchain_core.messages import (
     ToolMessage,
 )
 from langgraph_react_agent_base.agent import get_graph_closure
+from langgraph_react_agent_base.streaming import STREAM_MODES, stream_part_to_deltas
 
 
 def ai_stream_service(context, base_url=None, model_id=None):
@@ -75,10 +76,25 @@ def ai_stream_service(context, base_url=None, model_id=None):
         }
 
     def generate_stream(context) -> Generator[dict, None, None]:
-        """Stream agent updates (tool calls and final answer) as choice deltas from the context payload."""
+        """Stream agent updates (tool calls and final answer) as choice deltas from the context payload.
+
+        With "stream_mode": "messages" in the payload, assistant tokens are streamed as they
+        are generated (plus assembled tool calls and tool results) instead of whole node updates.
+        """
         payload = context.get_json()
         messages = [convert_dict_to_message(m) for m in payload.get("messages", [])]
 
+        if payload.get("stream_mode") == "messages":
+            streamed_ids: set = set()
+            for mode, data in agent.stream(
+                {"messages": messages}, stream_mode=STREAM_MODES
+            ):
+                for delta in stream_part_to_deltas(mode, data, streamed_ids):
+                    yield {
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": None}]
+                    }
+            return
+
         response_stream = agent.stream({"messages": messages}, stream_mode="updates")
 
         for update in response_stream:
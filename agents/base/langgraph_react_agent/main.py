@@ -1,20 +1,83 @@
-import json
 import os
-from contextlib import asynccontextmanager
-
-from fastapi import FastAPI, HTTPException
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-from pydantic import BaseModel
-
+import sys
+import uuid
+from contextlib import AsyncExitStack, asynccontextmanager, nullcontext
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from pydantic import BaseModel, ConfigDict, Field
+
+from langgraph_react_agent_base.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    admission_rejected_handler,
+)
 from langgraph_react_agent_base.agent import get_graph_closure
+from langgraph_react_agent_base.completion_cache import get_completion_cache
+from langgraph_react_agent_base.deadlines import (
+    RequestAborted,
+    open_scope,
+    request_aborted_handler,
+    request_timeout,
+    run_cancellable,
+)
+from langgraph_react_agent_base.metrics import (
+    MetricsMiddleware,
+    langchain_metrics_callback,
+    metrics_response,
+    observe_first_token,
+    register_admission,
+    register_completion_cache,
+    register_single_flight,
+)
+from langgraph_react_agent_base.serialization import (
+    ORJSONResponse,
+    ReturnMode,
+    langchain_serializer,
+    ndjson_line,
+    select_messages,
+    sse_event,
+)
+from langgraph_react_agent_base.single_flight import get_single_flight
+from langgraph_react_agent_base.streaming import STREAM_MODES, stream_part_to_deltas
+from langgraph_react_agent_base.threads import (
+    THREAD_DB_PATH,
+    ThreadStore,
+    new_messages_start,
+    run_options,
+    thread_config,
+)
 from langgraph_react_agent_base.utils import get_env_var
 
 
 # Request/Response models
 class ChatRequest(BaseModel):
-    """Incoming chat request body for the /chat endpoint."""
+    """Incoming chat request body for the /chat endpoint.
+
+    "return" selects what is sent back: "final" (only the answer), "new" (messages
+    produced by this run) or "full" (whole conversation, the default). "timeout"
+    (seconds) shortens the request's time budget, capped by REQUEST_TIMEOUT_SECONDS.
+    With "thread_id" the conversation is kept on the server: only the new message is
+    sent and earlier turns are restored from the thread.
+    """
+
+    model_config = ConfigDict(populate_by_name=True)
 
     message: str
+    return_mode: ReturnMode = Field(default="full", alias="return")
+    timeout: float | None = Field(default=None, gt=0)
+    thread_id: str | None = Field(default=None, min_length=1, max_length=256)
+
+
+class BatchChatRequest(BaseModel):
+    """Incoming request body for the /chat/batch endpoint."""
+
+    conversations: list[ChatRequest]
+    max_concurrency: int | None = Field(default=None, ge=1)
+    timeout: float | None = Field(default=None, gt=0)
 
 
 class ChatResponse(BaseModel):
@@ -27,6 +90,30 @@ class ChatResponse(BaseModel):
 # Global variable for agent graph
 agent_graph = None
 
+# Same graph with a checkpointer, used for requests carrying a thread_id
+thread_graph = None
+thread_store: ThreadStore | None = None
+
+message_serializer = langchain_serializer()
+
+# Bounds concurrent graph runs (ADMISSION_* env vars); excess requests queue, then get 429
+admission = AdmissionController.from_env()
+register_admission(admission)
+
+# Opt-in LLM response cache (COMPLETION_CACHE_* env vars), shared by every client of the agent
+completion_cache = get_completion_cache()
+register_completion_cache(completion_cache)
+
+# Identical concurrent LLM requests share one upstream call (SINGLE_FLIGHT_ENABLED)
+single_flight = get_single_flight()
+register_single_flight(single_flight)
+
+# Feeds the per-node, per-tool and per-LLM-call histograms served on /metrics
+metrics_callback = langchain_metrics_callback()
+
+# Upper bound (and default) for graph runs executed concurrently by one /chat/batch request
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 16))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -34,8 +121,10 @@ async def lifespan(app: FastAPI):
 
     Reads BASE_URL and MODEL_ID from the environment, builds the graph via
     get_graph_closure, and sets the global agent_graph for the /chat endpoint.
+    Unless THREAD_DB_PATH is empty, also opens the thread store and derives
+    thread_graph, the same graph checkpointed to it.
     """
-    global agent_graph
+    global agent_graph, thread_graph, thread_store
 
     # Get environment variables
     base_url = get_env_var("BASE_URL")
@@ -48,10 +137,21 @@ async def lifespan(app: FastAPI):
     # Get graph closure and create agent graph
     agent_graph = get_graph_closure(model_id=model_id, base_url=base_url)
 
+    if THREAD_DB_PATH:
+        thread_store = await ThreadStore().open()
+        thread_store.start_eviction()
+        thread_graph = agent_graph.copy(
+            update={"checkpointer": thread_store.checkpointer}
+        )
+
     yield
 
     # Cleanup on shutdown (if needed)
     agent_graph = None
+    thread_graph = None
+    if thread_store is not None:
+        await thread_store.close()
+        thread_store = None
 
 
 # Create FastAPI app
@@ -59,89 +159,288 @@ app = FastAPI(
     title="LangGraph React Agent API",
     description="FastAPI service for LangGraph React Agent",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
+app.add_exception_handler(AdmissionRejected, admission_rejected_handler)
+app.add_exception_handler(RequestAborted, request_aborted_handler)
+app.add_middleware(MetricsMiddleware)
+
+
+def _result_to_response(
+    result: dict, return_mode: ReturnMode = "full", turn_id: str | None = None
+) -> dict:
+    """Convert the final graph state into the JSON response body.
+
+    Messages are selected according to return_mode before serialization, so
+    "final" only pays for the last message. For threads, turn_id is the id of the
+    request's message, after which the messages of this run start.
+    """
+    messages = result.get("messages", [])
+    n_input = new_messages_start(messages, turn_id) if turn_id is not None else 1
+    messages = select_messages(messages, return_mode, n_input=n_input)
+    return {
+        "messages": message_serializer.serialize_many(messages),
+        "finish_reason": "stop",
+    }
+
+
+def _graph_for(thread_id: str | None):
+    """Graph to run a request on: the checkpointed one for threads, the stateless one otherwise."""
+    if thread_id is None:
+        return agent_graph
+    if thread_graph is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Conversation threads are disabled (THREAD_DB_PATH is empty)",
+        )
+    return thread_graph
+
+
+def _thread_turn(thread_id: str | None):
+    """Context manager holding the thread for one turn (no-op without thread_id)."""
+    if thread_id is None:
+        return nullcontext()
+    return thread_store.turn(thread_id)
+
+
+def _run_config(thread_id: str | None) -> dict:
+    """Run config of one graph run."""
+    return thread_config(
+        {"recursion_limit": 10, "callbacks": [metrics_callback]}, thread_id
+    )
+
+
+def _new_message(request: ChatRequest) -> HumanMessage:
+    """The request's message; threaded turns get an id to find it in the restored history."""
+    if request.thread_id is None:
+        return HumanMessage(content=request.message)
+    return HumanMessage(content=request.message, id=str(uuid.uuid4()))
 
 
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """
     Chat endpoint that accepts a message and returns the agent's response.
 
+    The run is cancelled when the client disconnects (499) or when the request's
+    deadline passes (504); the deadline also bounds every LLM and tool call.
+
     Args:
         request: ChatRequest containing the user message
+        http_request: Raw request, watched for client disconnects and X-Request-Timeout
 
     Returns:
-        JSON response with full conversation history including tool calls
+        JSON response with the conversation history (including tool calls) selected by request.return_mode
     """
     global agent_graph
 
     if agent_graph is None:
         raise HTTPException(status_code=503, detail="Agent not initialized")
 
-    try:
-        messages = [HumanMessage(content=request.message)]
+    graph = _graph_for(request.thread_id)
+    scope = open_scope(request_timeout(http_request, request.timeout))
+
+    # Turns of one thread wait for each other before taking an admission slot
+    async with _thread_turn(request.thread_id), admission.slot():
+        try:
+            message = _new_message(request)
+
+            # Use invoke to get the agent's response
+            result = await run_cancellable(
+                http_request,
+                graph.ainvoke(
+                    {"messages": [message]},
+                    config=_run_config(request.thread_id),
+                    **run_options(request.thread_id),
+                ),
+                scope,
+            )
+
+            return _result_to_response(result, request.return_mode, message.id)
+
+        except RequestAborted:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error processing request: {str(e)}"
+            )
+
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest, http_request: Request):
+    """
+    Batch endpoint that runs many independent conversations through the agent graph.
+
+    Conversations are executed concurrently (at most max_concurrency graph runs at a
+    time, capped by BATCH_MAX_CONCURRENCY) and results are streamed back as NDJSON in
+    completion order, so one slow conversation does not hold back the others. Each
+    line carries the index of the conversation in the request and either the same
+    body as /chat or an error. Every conversation goes through admission control on
+    its own, so a conversation that is not admitted is reported as an error line.
+    Conversations with a thread_id continue that thread, like /chat.
+    All conversations share one deadline; the ones still running when it passes are
+    reported as errors.
 
-        # Use invoke to get the agent's response
-        result = await agent_graph.ainvoke(
-            {"messages": messages}, config={"recursion_limit": 10}
-        )
+    Args:
+        request: BatchChatRequest containing the conversations and optional max_concurrency
+        http_request: Raw request, read for X-Request-Timeout
 
-        response_messages = []
-
-        if "messages" in result and len(result["messages"]) > 0:
-            for message in result["messages"]:
-                # 1. User message (HumanMessage)
-                if isinstance(message, HumanMessage):
-                    response_messages.append(
-                        {
-                            "role": "user",
-                            "content": message.content,
-                        }
-                    )
-
-                # 2. AI message (AIMessage)
-                elif isinstance(message, AIMessage):
-                    msg_data = {
-                        "role": "assistant",
-                        "content": message.content or "",
-                    }
-                    if message.tool_calls:
-                        msg_data["tool_calls"] = [
-                            {
-                                "id": tc["id"],
-                                "type": "function",
-                                "function": {
-                                    "name": tc["name"],
-                                    "arguments": json.dumps(tc["args"]),
-                                },
-                            }
-                            for tc in message.tool_calls
-                        ]
-                    response_messages.append(msg_data)
-
-                # 3. Tool response (ToolMessage)
-                elif isinstance(message, ToolMessage):
-                    response_messages.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": message.tool_call_id,
-                            "name": message.name,
-                            "content": message.content,
-                        }
-                    )
-
-        return {"messages": response_messages, "finish_reason": "stop"}
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Error processing request: {str(e)}"
-        )
+    Returns:
+        StreamingResponse with media type application/x-ndjson
+    """
+    global agent_graph
+
+    if agent_graph is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+
+    for conversation in request.conversations:
+        _graph_for(conversation.thread_id)
+
+    max_concurrency = min(
+        request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY
+    )
+    messages = [_new_message(conversation) for conversation in request.conversations]
+    inputs = [{"messages": [message]} for message in messages]
+    configs = [
+        {**_run_config(conversation.thread_id), "max_concurrency": max_concurrency}
+        for conversation in request.conversations
+    ]
+
+    async def admitted_invoke(graph_input: dict, config: RunnableConfig) -> dict:
+        thread_id = config.get("configurable", {}).get("thread_id")
+        async with _thread_turn(thread_id), admission.slot():
+            return await _graph_for(thread_id).ainvoke(
+                graph_input, config, **run_options(thread_id)
+            )
+
+    timeout = request_timeout(http_request, request.timeout)
+
+    async def result_stream():
+        open_scope(timeout)
+        async for index, result in RunnableLambda(admitted_invoke).abatch_as_completed(
+            inputs,
+            config=configs,
+            return_exceptions=True,
+        ):
+            if isinstance(result, Exception):
+                item = {
+                    "index": index,
+                    "error": f"Error processing request: {str(result)}",
+                }
+            else:
+                item = {
+                    "index": index,
+                    **_result_to_response(
+                        result,
+                        request.conversations[index].return_mode,
+                        messages[index].id,
+                    ),
+                }
+            yield ndjson_line(item)
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Streaming chat endpoint (Server-Sent Events).
+
+    Emits OpenAI-style chunks ({"choices": [{"delta": ...}]}) while the graph runs:
+    assistant token deltas as the LLM generates them, assembled tool calls once the
+    model turn finishes, and tool results as soon as each tool returns. The stream
+    ends with a chunk carrying finish_reason "stop" followed by "data: [DONE]".
+    When the deadline passes the stream ends with an error frame; a client
+    disconnect cancels the run.
+
+    Args:
+        request: ChatRequest containing the user message
+        http_request: Raw request, read for X-Request-Timeout
+
+    Returns:
+        StreamingResponse with media type text/event-stream
+    """
+    global agent_graph
+
+    if agent_graph is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+
+    graph = _graph_for(request.thread_id)
+    message = _new_message(request)
+    timeout = request_timeout(http_request, request.timeout)
+
+    # Like /chat, turns of one thread wait for each other before taking an admission
+    # slot; both are taken before the response starts so an overloaded server can
+    # still answer 429
+    turn = AsyncExitStack()
+    await turn.enter_async_context(_thread_turn(request.thread_id))
+    try:
+        permit = await admission.acquire()
+    except BaseException:
+        await turn.__aexit__(*sys.exc_info())
+        raise
+
+    async def release() -> None:
+        permit.release()
+        await turn.aclose()
+
+    async def event_stream():
+        scope = open_scope(timeout)
+        streamed_ids: set = set()
+        try:
+            async with turn:
+                async for mode, data in graph.astream(
+                    {"messages": [message]},
+                    config=_run_config(request.thread_id),
+                    stream_mode=STREAM_MODES,
+                    **run_options(request.thread_id),
+                ):
+                    scope.check()
+                    for delta in stream_part_to_deltas(mode, data, streamed_ids):
+                        if "content" in delta:
+                            observe_first_token()
+                        yield sse_event(
+                            {"choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                        )
+
+            yield sse_event(
+                {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            )
+        except Exception as e:
+            yield sse_event({"error": f"Error processing request: {str(e)}"})
+        finally:
+            permit.release()
+
+        yield sse_event("[DONE]")
+
+    # The background task covers streams that are closed before they start
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release),
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request/step/tool/LLM latency histograms, in-flight gauges and token counters."""
+    return metrics_response()
 
 
 @app.get("/health")
 async def health():
-    """Return service health and whether the agent graph has been initialized."""
-    return {"status": "healthy", "agent_initialized": agent_graph is not None}
+    """Return service health, whether the agent graph has been initialized, admission queue, LLM request coalescing, completion cache and thread store state."""
+    return {
+        "status": "healthy",
+        "agent_initialized": agent_graph is not None,
+        "admission": admission.stats(),
+        "completion_cache": (
+            completion_cache.stats() if completion_cache is not None else None
+        ),
+        "single_flight": single_flight.stats() if single_flight is not None else None,
+        "threads": thread_store.stats() if thread_store is not None else None,
+    }
 
 
 if __name__ == "__main__":
@@ -1,12 +1,64 @@
-from typing import Any
+import asyncio
+from typing import Any, Awaitable, Callable
 
 from langchain.agents import create_agent
+from langchain.agents.middleware import AgentMiddleware, ModelRequest
+from langchain.agents.middleware.types import ToolCallRequest
 from langchain_openai import ChatOpenAI
 
+from langgraph_react_agent_base.deadlines import (
+    DeadlineExceeded,
+    check_deadline,
+    remaining_time,
+)
+from langgraph_react_agent_base.single_flight import llm_async_http_client, llm_http_client
 from langgraph_react_agent_base.tools import dummy_web_search, dummy_math
 from langgraph_react_agent_base.utils import get_env_var
 
 
+class DeadlineMiddleware(AgentMiddleware):
+    """Bound every model and tool call by the remaining time of the current request.
+
+    Outside a request scope (e.g. in ai_service) remaining_time() is None and calls
+    run unchanged.
+    """
+
+    @staticmethod
+    def _with_timeout(request: ModelRequest) -> ModelRequest:
+        """Pass the remaining budget to the LLM client as its per-call timeout."""
+        check_deadline()
+        remaining = remaining_time()
+        if remaining is None:
+            return request
+        return request.override(
+            model_settings={**request.model_settings, "timeout": remaining}
+        )
+
+    def wrap_model_call(self, request: ModelRequest, handler: Callable) -> Any:
+        return handler(self._with_timeout(request))
+
+    async def awrap_model_call(
+        self, request: ModelRequest, handler: Callable[..., Awaitable]
+    ) -> Any:
+        return await handler(self._with_timeout(request))
+
+    def wrap_tool_call(self, request: ToolCallRequest, handler: Callable) -> Any:
+        check_deadline()
+        return handler(request)
+
+    async def awrap_tool_call(
+        self, request: ToolCallRequest, handler: Callable[..., Awaitable]
+    ) -> Any:
+        check_deadline()
+        remaining = remaining_time()
+        if remaining is None:
+            return await handler(request)
+        try:
+            return await asyncio.wait_for(handler(request), timeout=remaining)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Request deadline exceeded") from None
+
+
 def get_graph_closure(
     model_id: str = None,
     base_url: str = None,
@@ -46,11 +98,19 @@ def get_graph_closure(
         temperature=0.01,
         api_key=api_key,
         base_url=base_url,
+        # Pooled client; coalesces identical in-flight requests and serves cached completions
+        http_client=llm_http_client(),
+        http_async_client=llm_async_http_client(),
     )
 
     system_prompt = """You are a helpful assistant. When you receive a result from a tool, 
         use that information to provide a FINAL answer to the user immediately. 
         Do NOT call tools repeatedly for the same question."""
-    agent = create_agent(model=chat, tools=tools, system_prompt=system_prompt)
+    agent = create_agent(
+        model=chat,
+        tools=tools,
+        system_prompt=system_prompt,
+        middleware=[DeadlineMiddleware()],
+    )
 
     return agent
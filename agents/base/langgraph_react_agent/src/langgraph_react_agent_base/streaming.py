@@ -0,0 +1,64 @@
+from typing import Any
+
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+
+from langgraph_react_agent_base.serialization import langchain_serializer
+
+# "messages" yields LLM token chunks as they are generated, "updates" yields the
+# assembled AIMessage (with complete tool calls) and ToolMessages once a node finishes.
+STREAM_MODES = ["messages", "updates"]
+
+# Same OpenAI-style message dicts as the non-streaming /chat responses
+_serializer = langchain_serializer()
+
+
+def stream_part_to_deltas(
+    mode: str, data: Any, streamed_ids: set[str | None] | None = None
+) -> list[dict]:
+    """Convert one (mode, data) part from graph.astream(stream_mode=STREAM_MODES) into chat deltas.
+
+    Token chunks become assistant content deltas, finished model turns with tool
+    calls become a single tool_calls delta (arguments already assembled from the
+    streamed fragments), and tool results become tool deltas. A final answer is
+    emitted from its update only when none of its tokens were streamed (a
+    non-streaming model, a cached response or a message built by middleware).
+    Everything else is dropped.
+
+    Args:
+        mode: Stream mode the part belongs to ("messages" or "updates").
+        data: Payload for that mode: (message_chunk, metadata) or {node_name: state_update}.
+        streamed_ids: Ids of the messages whose tokens were streamed so far; pass the
+            same set for every part of one run (it is updated in place).
+
+    Returns:
+        List of OpenAI-style delta dicts (possibly empty).
+    """
+    if streamed_ids is None:
+        streamed_ids = set()
+
+    if mode == "messages":
+        chunk, _metadata = data
+        if isinstance(chunk, AIMessageChunk) and chunk.text:
+            streamed_ids.add(chunk.id)
+            return [{"role": "assistant", "content": chunk.text}]
+        return []
+
+    deltas = []
+    for update in data.values():
+        if not isinstance(update, dict) or "messages" not in update:
+            continue
+
+        msgs = update["messages"]
+        if not isinstance(msgs, list):
+            msgs = [msgs]
+
+        for message in msgs:
+            if isinstance(message, AIMessage) and message.tool_calls:
+                serialized = _serializer.serialize(message)
+                deltas.append({"role": "assistant", "tool_calls": serialized["tool_calls"]})
+            elif isinstance(message, AIMessage):
+                if message.text and message.id not in streamed_ids:
+                    deltas.append({"role": "assistant", "content": message.text})
+            elif isinstance(message, ToolMessage):
+                deltas.append(_serializer.serialize(message))
+    return deltas
@@ -0,0 +1,130 @@
+import sys
+import os
+import json
+
+import httpx
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.langgraph_react_agent_base.completion_cache import (
+    CachingTransport,
+    CompletionCache,
+    completion_key,
+)
+
+URL = "http://llm/v1/chat/completions"
+
+
+def _client(cache: CompletionCache, calls: list) -> httpx.Client:
+    """Client whose upstream streams an SSE body in two chunks and records each call."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        chunks = [b"data: {}\n\n", b"data: [DONE]\n\n"]
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            content=iter(chunks),
+        )
+
+    return httpx.Client(transport=CachingTransport(cache, httpx.MockTransport(handler)))
+
+
+def _body(**params) -> dict:
+    return {"model": "m", "messages": [{"role": "user", "content": "hi"}], **params}
+
+
+def test_hit_replays_response_without_upstream_call(tmp_path):
+    """Test that a repeated request is answered from the cache with the same body."""
+    cache = CompletionCache(path=str(tmp_path / "cache.sqlite"))
+    calls = []
+    client = _client(cache, calls)
+
+    first = client.post(URL, json=_body(stream=True))
+    second = client.post(URL, json=_body(stream=True))
+
+    assert len(calls) == 1
+    assert second.content == first.content == b"data: {}\n\ndata: [DONE]\n\n"
+    assert second.headers["content-type"] == "text/event-stream"
+    assert cache.stats()["memory_hits_total"] == 1
+
+
+def test_partially_read_stream_is_not_stored(tmp_path):
+    """Test that a stream closed before its end never becomes a cache entry."""
+    cache = CompletionCache(path=str(tmp_path / "cache.sqlite"))
+    calls = []
+    client = _client(cache, calls)
+
+    with client.stream("POST", URL, json=_body(stream=True)) as response:
+        next(response.iter_raw())
+    client.post(URL, json=_body(stream=True))
+
+    assert len(calls) == 2
+
+
+def test_disk_tier_survives_restart_until_ttl(tmp_path):
+    """Test that a new cache on the same file serves stored entries, but not expired ones."""
+    path = str(tmp_path / "cache.sqlite")
+    calls = []
+    _client(CompletionCache(path=path), calls).post(URL, json=_body())
+
+    _client(CompletionCache(path=path), calls).post(URL, json=_body())
+    assert len(calls) == 1
+
+    _client(CompletionCache(path=path, ttl=-1), calls).post(URL, json=_body(seed=1))
+    _client(CompletionCache(path=path, ttl=-1), calls).post(URL, json=_body(seed=1))
+    assert len(calls) == 3
+
+
+def test_memory_tier_evicts_least_recently_used():
+    """Test that the LRU tier keeps at most max_entries, dropping the oldest."""
+    cache = CompletionCache(path="", max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, 200, [], b"x")
+    cache.get("a")
+    cache.put("c", 200, [], b"x")
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions_total"] == 1
+
+
+def test_key_covers_parameters_and_caller_fields():
+    """Test that sampling parameters and caller fields change the key, while null fields do not."""
+
+    def key(body: dict) -> str:
+        return completion_key(httpx.Request("POST", URL, json=body))
+
+    assert key(_body()) == key(_body(temperature=None))
+    assert key(_body()) != key(_body(user="u1"))
+    assert key(_body(safety_identifier="u1")) != key(_body(safety_identifier="u2"))
+    assert key(_body()) != key(_body(store=True))
+    assert key(_body()) != key(_body(temperature=0.5))
+    assert key(_body()) != key(_body(tools=[{"type": "function"}]))
+    assert completion_key(httpx.Request("GET", URL)) is None
+
+
+def test_disk_hits_only_touch_stale_entries(tmp_path):
+    """Test that a disk hit rewrites last_used only once it is older than touch_interval."""
+    path = str(tmp_path / "cache.sqlite")
+    CompletionCache(path=path).put("k", 200, [], b"x")
+
+    def last_used() -> float:
+        return cache._conn.execute(
+            "SELECT last_used FROM completions WHERE key = 'k'"
+        ).fetchone()[0]
+
+    cache = CompletionCache(path=path, touch_interval=3600)
+    stored = last_used()
+    assert cache.get_disk("k") is not None
+    assert last_used() == stored
+
+    cache = CompletionCache(path=path, touch_interval=0)
+    assert cache.get_disk("k") is not None
+    assert last_used() > stored
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
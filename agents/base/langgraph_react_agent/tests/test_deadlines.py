@@ -0,0 +1,103 @@
+import sys
+import os
+import asyncio
+import time
+
+import pytest
+from starlette.requests import Request
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.langgraph_react_agent_base.deadlines import (
+    REQUEST_TIMEOUT_SECONDS,
+    ClientDisconnected,
+    DeadlineExceeded,
+    RequestScope,
+    open_scope,
+    request_timeout,
+    run_cancellable,
+)
+
+
+def _request(headers: dict | None = None) -> Request:
+    """Build a bare HTTP request with the given headers."""
+    raw_headers = [
+        (name.lower().encode(), value.encode())
+        for name, value in (headers or {}).items()
+    ]
+    return Request({"type": "http", "headers": raw_headers})
+
+
+def test_request_timeout_defaults_to_cap():
+    """Test that requests without a timeout get the server-wide budget."""
+    assert request_timeout(_request()) == REQUEST_TIMEOUT_SECONDS
+
+
+def test_request_timeout_smallest_client_value_wins():
+    """Test that the header and the body field can only shorten the budget."""
+    request = _request({"X-Request-Timeout": "5"})
+
+    assert request_timeout(request, 10) == 5
+    assert request_timeout(request, 2) == 2
+    assert request_timeout(_request(), REQUEST_TIMEOUT_SECONDS + 60) == REQUEST_TIMEOUT_SECONDS
+
+
+def test_request_timeout_ignores_invalid_header():
+    """Test that a malformed header falls back to the other values."""
+    assert request_timeout(_request({"X-Request-Timeout": "soon"}), 3) == 3
+
+
+def test_scope_raises_after_deadline():
+    """Test that an expired scope reports no time left and raises DeadlineExceeded."""
+    scope = RequestScope(0.01)
+    time.sleep(0.02)
+
+    assert scope.remaining() == 0.0
+    with pytest.raises(DeadlineExceeded):
+        scope.check()
+
+
+def test_cancelled_scope_raises_client_disconnected():
+    """Test that a cancelled scope stops the run even with time left."""
+    scope = RequestScope(None)
+    assert scope.remaining() is None
+    scope.check()
+
+    scope.cancelled = True
+    with pytest.raises(ClientDisconnected):
+        scope.check()
+
+
+def test_deadline_stops_worker_threads_with_deadline_exceeded():
+    """Test that a run stopped by its deadline makes threads still running it raise DeadlineExceeded."""
+    errors = []
+
+    def work(scope: RequestScope) -> None:
+        time.sleep(0.1)
+        try:
+            scope.check()
+        except Exception as e:
+            errors.append(e)
+
+    async def receive() -> dict:
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    async def run():
+        scope = open_scope(0.02)
+        request = Request({"type": "http", "headers": []}, receive)
+        with pytest.raises(DeadlineExceeded):
+            await run_cancellable(request, asyncio.to_thread(work, scope), scope)
+        # The wait may end a hair before the deadline: the reason must not depend on the clock
+        scope.deadline = None
+        await asyncio.sleep(0.15)
+
+    asyncio.run(run())
+
+    assert len(errors) == 1
+    assert isinstance(errors[0], DeadlineExceeded)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,68 @@
+import sys
+import os
+import uuid
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.langgraph_react_agent_base.metrics import (
+    REGISTRY,
+    langchain_metrics_callback,
+)
+
+
+def _count(metric: str, **labels) -> float:
+    """Current observation count of a histogram child (0 if never observed)."""
+    return REGISTRY.get_sample_value(f"{metric}_count", labels) or 0.0
+
+
+def test_graph_node_is_timed():
+    """Test that a graph node run is recorded under its node name."""
+    handler = langchain_metrics_callback()
+    run_id = uuid.uuid4()
+    before = _count("agent_step_duration_seconds", step="model")
+
+    handler.on_chain_start(
+        {}, {}, run_id=run_id, name="model", metadata={"langgraph_node": "model"}
+    )
+    handler.on_chain_end({}, run_id=run_id)
+
+    assert _count("agent_step_duration_seconds", step="model") == before + 1
+
+
+def test_runnables_inside_a_node_are_not_timed_as_steps():
+    """Test that sub-runnables inheriting the node metadata are ignored."""
+    handler = langchain_metrics_callback()
+    run_id = uuid.uuid4()
+    before = _count("agent_step_duration_seconds", step="RunnableSequence")
+
+    handler.on_chain_start(
+        {},
+        {},
+        run_id=run_id,
+        name="RunnableSequence",
+        metadata={"langgraph_node": "model"},
+    )
+    handler.on_chain_end({}, run_id=run_id)
+
+    assert _count("agent_step_duration_seconds", step="RunnableSequence") == before
+
+
+def test_tool_call_is_timed_even_when_it_fails():
+    """Test that tool invocations are recorded on success and on error."""
+    handler = langchain_metrics_callback()
+    before = _count("agent_tool_duration_seconds", tool="search")
+
+    ok_run, failed_run = uuid.uuid4(), uuid.uuid4()
+    handler.on_tool_start({"name": "search"}, "RedHat", run_id=ok_run, name="search")
+    handler.on_tool_end("RedHat", run_id=ok_run)
+    handler.on_tool_start({"name": "search"}, "RedHat", run_id=failed_run, name="search")
+    handler.on_tool_error(ValueError("boom"), run_id=failed_run)
+
+    assert _count("agent_tool_duration_seconds", tool="search") == before + 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,178 @@
+import sys
+import os
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.langgraph_react_agent_base.deadlines import DeadlineExceeded, open_scope
+from src.langgraph_react_agent_base.single_flight import (
+    AsyncSingleFlightTransport,
+    SingleFlight,
+    SingleFlightTransport,
+)
+
+URL = "http://llm/v1/chat/completions"
+BODY = b"data: a\n\ndata: b\n\ndata: [DONE]\n\n"
+
+
+class _SlowStream(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        for line in BODY.split(b"\n\n")[:-1]:
+            await asyncio.sleep(0.02)
+            yield line + b"\n\n"
+
+
+def _async_client(single_flight: SingleFlight, calls: list) -> httpx.AsyncClient:
+    """Client whose upstream answers after a short delay with a slowly streamed body."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        await asyncio.sleep(0.2)
+        if b"fail" in request.content:
+            raise httpx.ConnectError("backend down")
+        return httpx.Response(200, stream=_SlowStream())
+
+    transport = AsyncSingleFlightTransport(single_flight, httpx.MockTransport(handler))
+    return httpx.AsyncClient(transport=transport)
+
+
+def test_identical_concurrent_requests_share_one_upstream_call():
+    """Test that concurrent identical requests get the same body from a single call."""
+    single_flight, calls = SingleFlight(), []
+
+    async def run():
+        client = _async_client(single_flight, calls)
+        return await asyncio.gather(*[client.post(URL, json={"n": 1}) for _ in range(5)])
+
+    responses = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert all(response.content == BODY for response in responses)
+    assert single_flight.stats()["coalesced_total"] == 4
+    assert single_flight.stats()["in_flight"] == 0
+
+
+def test_waiter_survives_cancelled_leader():
+    """Test that cancelling the request that started the call does not affect its waiters."""
+    single_flight, calls = SingleFlight(), []
+
+    async def run():
+        client = _async_client(single_flight, calls)
+        leader = asyncio.create_task(client.post(URL, json={"n": 1}))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(client.post(URL, json={"n": 1}))
+        await asyncio.sleep(0.01)
+        waiter_count = single_flight.stats()["waiters"]
+        leader.cancel()
+        return waiter_count, await waiter
+
+    waiter_count, response = asyncio.run(run())
+
+    assert waiter_count == 1
+    assert response.content == BODY
+    assert len(calls) == 1
+
+
+def test_waiter_gives_up_at_its_request_deadline():
+    """Test that a waiter stops waiting for the shared call when its request runs out of time."""
+    single_flight, calls = SingleFlight(), []
+
+    async def wait_with_deadline(client: httpx.AsyncClient) -> httpx.Response:
+        open_scope(0.05)
+        return await client.post(URL, json={"n": 1})
+
+    async def run():
+        client = _async_client(single_flight, calls)
+        leader = asyncio.create_task(client.post(URL, json={"n": 1}))
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            await wait_with_deadline(client)
+        return time.monotonic() - started, await leader
+
+    waited, response = asyncio.run(run())
+
+    assert waited < 0.15
+    assert response.content == BODY
+    assert len(calls) == 1
+
+
+def test_upstream_error_reaches_every_waiter_and_is_not_kept():
+    """Test that a failed call fails all its waiters and the next request retries upstream."""
+    single_flight, calls = SingleFlight(), []
+
+    async def run():
+        client = _async_client(single_flight, calls)
+        results = await asyncio.gather(
+            *[client.post(URL, json={"n": "fail"}) for _ in range(3)],
+            return_exceptions=True,
+        )
+        await asyncio.gather(client.post(URL, json={"n": "fail"}), return_exceptions=True)
+        return results
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, httpx.ConnectError) for result in results)
+    assert len(calls) == 2
+
+
+def test_sync_clients_in_threads_are_coalesced():
+    """Test that requests from sync clients in worker threads share one call too."""
+    single_flight, calls = SingleFlight(), []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        time.sleep(0.3)
+        return httpx.Response(200, content=BODY)
+
+    transport = SingleFlightTransport(single_flight, httpx.MockTransport(handler))
+    client = httpx.Client(transport=transport)
+    bodies = []
+    threads = [
+        threading.Thread(target=lambda: bodies.append(client.post(URL, json={}).content))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert bodies == [BODY] * 4
+
+
+def test_sync_upstream_base_exception_does_not_hang_waiters():
+    """Test that a BaseException in the sync upstream call reaches its subscribers instead of hanging them."""
+
+    class Aborted(BaseException):
+        pass
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise Aborted()
+
+    transport = SingleFlightTransport(SingleFlight(), httpx.MockTransport(handler))
+    client = httpx.Client(transport=transport)
+    errors = []
+
+    def post() -> None:
+        try:
+            client.post(URL, json={})
+        except Aborted as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=post)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert len(errors) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,108 @@
+import sys
+import os
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.langgraph_react_agent_base.streaming import (
+    STREAM_MODES,
+    stream_part_to_deltas,
+)
+
+
+def test_stream_modes():
+    """Test that both token and node-update streams are requested."""
+    assert STREAM_MODES == ["messages", "updates"]
+
+
+def test_token_chunk_becomes_content_delta():
+    """Test that an LLM token chunk is emitted as an assistant content delta."""
+    deltas = stream_part_to_deltas("messages", (AIMessageChunk(content="Red"), {}))
+
+    assert deltas == [{"role": "assistant", "content": "Red"}]
+
+
+def test_empty_token_chunk_is_dropped():
+    """Test that chunks carrying only tool-call fragments produce no content delta."""
+    chunk = AIMessageChunk(
+        content="",
+        tool_call_chunks=[{"id": "c1", "name": "search", "args": '{"q', "index": 0}],
+    )
+
+    assert stream_part_to_deltas("messages", (chunk, {})) == []
+
+
+def test_tool_message_in_messages_mode_is_dropped():
+    """Test that tool results are only emitted once, from the updates stream."""
+    message = ToolMessage(content="RedHat", tool_call_id="c1", name="search")
+
+    assert stream_part_to_deltas("messages", (message, {})) == []
+
+
+def test_model_update_with_tool_calls_becomes_tool_calls_delta():
+    """Test that an assembled tool call is emitted with JSON arguments."""
+    message = AIMessage(
+        content="",
+        tool_calls=[{"id": "c1", "name": "search", "args": {"query": "RedHat"}}],
+    )
+
+    deltas = stream_part_to_deltas("updates", {"model": {"messages": [message]}})
+
+    assert deltas == [
+        {
+            "role": "assistant",
+            "tool_calls": [
+                {
+                    "id": "c1",
+                    "type": "function",
+                    "function": {"name": "search", "arguments": '{"query":"RedHat"}'},
+                }
+            ],
+        }
+    ]
+
+
+def test_tools_update_becomes_tool_delta():
+    """Test that a tool result is emitted as a tool delta."""
+    message = ToolMessage(content="RedHat", tool_call_id="c1", name="search")
+
+    deltas = stream_part_to_deltas("updates", {"tools": {"messages": [message]}})
+
+    assert deltas == [
+        {"role": "tool", "tool_call_id": "c1", "name": "search", "content": "RedHat"}
+    ]
+
+
+def test_final_answer_update_is_not_repeated():
+    """Test that a final answer update is skipped since its tokens were already streamed."""
+    streamed_ids = set()
+    chunk = AIMessageChunk(content="RedHat", id="m1")
+    stream_part_to_deltas("messages", (chunk, {}), streamed_ids)
+    message = AIMessage(content="RedHat", id="m1")
+
+    update = {"model": {"messages": [message]}}
+    assert stream_part_to_deltas("updates", update, streamed_ids) == []
+
+
+def test_final_answer_without_streamed_tokens_is_emitted():
+    """Test that a whole final AIMessage (no token chunks for its id) is emitted as content."""
+    streamed_ids = set()
+    chunk = AIMessageChunk(content="Earlier", id="m1")
+    stream_part_to_deltas("messages", (chunk, {}), streamed_ids)
+    message = AIMessage(content="RedHat", id="m2")
+
+    deltas = stream_part_to_deltas("updates", {"model": {"messages": [message]}}, streamed_ids)
+
+    assert deltas == [{"role": "assistant", "content": "RedHat"}]
+
+
+def test_empty_node_update_is_skipped():
+    """Test that nodes returning no state update are ignored."""
+    assert stream_part_to_deltas("updates", {"before_model": None}) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
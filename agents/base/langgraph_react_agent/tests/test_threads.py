@@ -0,0 +1,211 @@
+import sys
+import os
+import asyncio
+from typing import Annotated, Sequence
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.langgraph_react_agent_base.threads import (
+    ThreadStore,
+    new_messages_start,
+    thread_config,
+)
+
+
+class State(TypedDict):
+    messages: Annotated[Sequence[BaseMessage], add_messages]
+
+
+def _echo_graph(checkpointer):
+    """One-node graph answering with the number of messages it has seen."""
+
+    def echo(state: State) -> dict:
+        return {"messages": [AIMessage(content=str(len(state["messages"])))]}
+
+    workflow = StateGraph(State)
+    workflow.add_node("echo", echo)
+    workflow.add_edge(START, "echo")
+    workflow.add_edge("echo", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+async def _turn(store: ThreadStore, graph, thread_id: str, text: str) -> dict:
+    async with store.turn(thread_id):
+        return await graph.ainvoke(
+            {"messages": [HumanMessage(content=text)]},
+            thread_config({}, thread_id),
+            durability="exit",
+        )
+
+
+def test_thread_keeps_history_and_only_latest_checkpoint(tmp_path):
+    """Test that a thread restores earlier turns and stores a single checkpoint."""
+
+    async def run():
+        store = await ThreadStore(path=str(tmp_path / "threads.sqlite")).open()
+        graph = _echo_graph(store.checkpointer)
+        try:
+            await _turn(store, graph, "t1", "hi")
+            result = await _turn(store, graph, "t1", "again")
+            async with store._conn.execute(
+                "SELECT COUNT(*) FROM checkpoints WHERE thread_id = 't1'"
+            ) as cursor:
+                checkpoints = (await cursor.fetchone())[0]
+            return result, checkpoints
+        finally:
+            await store.close()
+
+    result, checkpoints = asyncio.run(run())
+
+    assert [m.content for m in result["messages"]] == ["hi", "1", "again", "3"]
+    assert checkpoints == 1
+
+
+def test_expired_threads_are_evicted(tmp_path):
+    """Test that threads idle for longer than the TTL are deleted."""
+
+    async def run():
+        store = await ThreadStore(path=str(tmp_path / "threads.sqlite"), ttl=-1).open()
+        graph = _echo_graph(store.checkpointer)
+        try:
+            await _turn(store, graph, "t1", "hi")
+            evicted = await store.evict()
+            state = await graph.aget_state(thread_config({}, "t1"))
+            return evicted, state.values
+        finally:
+            await store.close()
+
+    evicted, values = asyncio.run(run())
+
+    assert evicted == 1
+    assert values == {}
+
+
+def test_failed_turn_is_still_evicted(tmp_path):
+    """Test that a turn failing after its checkpoint was written still records activity, so it expires."""
+
+    async def run():
+        store = await ThreadStore(path=str(tmp_path / "threads.sqlite"), ttl=-1).open()
+        graph = _echo_graph(store.checkpointer)
+        try:
+            with pytest.raises(RuntimeError):
+                async with store.turn("t1"):
+                    await graph.ainvoke(
+                        {"messages": [HumanMessage(content="hi")]},
+                        thread_config({}, "t1"),
+                        durability="exit",
+                    )
+                    raise RuntimeError("run failed")
+            evicted = await store.evict()
+            state = await graph.aget_state(thread_config({}, "t1"))
+            return evicted, state.values
+        finally:
+            await store.close()
+
+    evicted, values = asyncio.run(run())
+
+    assert evicted == 1
+    assert values == {}
+
+
+def test_size_bound_evicts_least_recently_used_first(tmp_path):
+    """Test that the oldest threads are deleted once the database is over its bound."""
+
+    async def run():
+        store = await ThreadStore(path=str(tmp_path / "threads.sqlite")).open()
+        graph = _echo_graph(store.checkpointer)
+        try:
+            for thread_id in ("old", "new"):
+                await _turn(store, graph, thread_id, "x" * 50_000)
+            store.max_bytes = await store._used_bytes() - 1
+            await store.evict()
+            old = await graph.aget_state(thread_config({}, "old"))
+            new = await graph.aget_state(thread_config({}, "new"))
+            return old.values, new.values, store.stats()
+        finally:
+            await store.close()
+
+    old, new, stats = asyncio.run(run())
+
+    assert old == {}
+    assert len(new["messages"]) == 2
+    assert stats["evicted_size_total"] == 1
+
+
+def test_eviction_shrinks_the_database_file(tmp_path):
+    """Test that evicting threads gives their pages back, so the database gets smaller."""
+
+    async def pragma(store: ThreadStore, name: str) -> int:
+        async with store._conn.execute(f"PRAGMA {name}") as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def run():
+        store = await ThreadStore(path=str(tmp_path / "threads.sqlite"), ttl=-1).open()
+        graph = _echo_graph(store.checkpointer)
+        try:
+            for index in range(8):
+                await _turn(store, graph, f"t{index}", "x" * 200_000)
+            before = await pragma(store, "page_count")
+            evicted = await store.evict()
+            return evicted, before, await pragma(store, "page_count"), await pragma(
+                store, "freelist_count"
+            )
+        finally:
+            await store.close()
+
+    evicted, before, after, free_pages = asyncio.run(run())
+
+    assert evicted == 8
+    assert free_pages == 0
+    assert after < before / 4
+
+
+def test_incremental_vacuum_is_only_set_on_a_new_database(tmp_path):
+    """Test that auto_vacuum is enabled when the file is created and an existing file is left as is."""
+
+    async def auto_vacuum(path: str) -> int:
+        store = await ThreadStore(path=path).open()
+        try:
+            async with store._conn.execute("PRAGMA auto_vacuum") as cursor:
+                return (await cursor.fetchone())[0]
+        finally:
+            await store.close()
+
+    async def run():
+        import aiosqlite
+
+        existing = str(tmp_path / "existing.sqlite")
+        async with aiosqlite.connect(existing) as conn:
+            await conn.execute("CREATE TABLE other (id INTEGER)")
+            await conn.commit()
+        return await auto_vacuum(str(tmp_path / "new.sqlite")), await auto_vacuum(existing)
+
+    new, existing = asyncio.run(run())
+
+    # 2 = INCREMENTAL, 0 = NONE
+    assert new == 2
+    assert existing == 0
+
+
+def test_new_messages_start():
+    """Test that the messages of this run start right after the request's message."""
+    messages = [
+        HumanMessage(content="hi", id="m1"),
+        AIMessage(content="hello"),
+        HumanMessage(content="again", id="m2"),
+        AIMessage(content="hello again"),
+    ]
+
+    assert new_messages_start(messages, "m2") == 3
+    assert new_messages_start(messages, "missing") == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,74 @@
+"""Per-request construction cost of the LlamaIndex workflow instance: built per request vs pooled.
+
+Without the pool every request builds a FunctionCallingAgent (memory, step
+registry and validation); with it a request checks out an idle instance and
+gives it back, which resets its memory. Both variants put a short conversation
+into the instance's memory, like a run would, so the pooled variant pays for
+its reset.
+
+Run from the agent directory (after ./init.sh):
+
+    PYTHONPATH=src python benchmarks/bench_agent_pool.py --iterations 2000
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("API_KEY", "benchmark")
+os.environ.setdefault("BASE_URL", "http://127.0.0.1:1/v1")
+os.environ.setdefault("MODEL_ID", "benchmark-model")
+
+from llama_index.core.llms import ChatMessage  # noqa: E402
+
+from llama_index_workflow_agent_base.agent import get_workflow_closure  # noqa: E402
+from llama_index_workflow_agent_base.agent_pool import AgentPool  # noqa: E402
+
+CONVERSATION = [
+    ChatMessage(role="user", content="What is RedHat?"),
+    ChatMessage(role="assistant", content="RedHat is a software company."),
+]
+
+
+def _summary(label: str, samples: list[float]) -> str:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return (
+        f"{label:<22} mean {statistics.mean(samples) * 1e6:9.1f} us   "
+        f"p50 {samples[len(samples) // 2] * 1e6:9.1f} us   p99 {p99 * 1e6:9.1f} us"
+    )
+
+
+def _use(agent) -> None:
+    for message in CONVERSATION:
+        agent.memory.put(message)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000, help="requests per variant")
+    args = parser.parse_args()
+
+    get_agent = get_workflow_closure()
+    pool = AgentPool(get_agent)
+
+    per_request, pooled = [], []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        _use(get_agent())
+        per_request.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with pool.checkout() as agent:
+            _use(agent)
+        pooled.append(time.perf_counter() - start)
+
+    print(f"Workflow instance per request ({args.iterations} iterations)")
+    print(_summary("built per request", per_request))
+    print(_summary("pooled", pooled))
+    print(f"pool: {pool.stats()}")
+
+
+if __name__ == "__main__":
+    main()
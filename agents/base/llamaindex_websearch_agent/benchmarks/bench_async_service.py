@@ -0,0 +1,153 @@
+"""Per-request overhead of examples/ai_service.py called from async code: agenerate vs generate.
+
+An async host (like a FastAPI gateway) can either await agenerate on its own
+loop or push the sync generate into a worker thread, which then hands the
+request to one of the service's loop threads and blocks on the result. Both
+paths run the same workflow against a local stub of the OpenAI chat
+completions API answering immediately, so the difference is the cost of the
+thread hops. Streaming is compared the same way (agenerate_stream vs iterating
+generate_stream in a worker thread).
+
+Run from the agent directory (after ./init.sh):
+
+    PYTHONPATH=src:examples python benchmarks/bench_async_service.py --requests 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("API_KEY", "benchmark")
+os.environ.setdefault("BASE_URL", "http://127.0.0.1:1/v1")
+os.environ.setdefault("MODEL_ID", "benchmark-model")
+os.environ.setdefault("COMPLETION_CACHE_ENABLED", "false")
+# Every request is identical: measure the service, not request coalescing
+os.environ.setdefault("SINGLE_FLIGHT_ENABLED", "false")
+
+from ai_service import ai_stream_service, ai_stream_service_async  # noqa: E402
+
+
+def _chunk(**fields) -> str:
+    chunk = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "benchmark-model",
+        **fields,
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+# The workflow streams its LLM calls, so the stub answers with Server-Sent Events
+ANSWER = (
+    "".join(
+        _chunk(
+            choices=[
+                {
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": word},
+                    "finish_reason": None,
+                }
+            ]
+        )
+        for word in ("Red", "Hat", " is", " a", " company")
+    )
+    + _chunk(choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+    + "data: [DONE]\n\n"
+).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a fixed streamed chat completion, keeping connections alive."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(ANSWER)))
+        self.end_headers()
+        self.wfile.write(ANSWER)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class Context:
+    def __init__(self) -> None:
+        self.payload = {"messages": [{"role": "user", "content": "What is RedHat?"}]}
+
+    def get_json(self) -> dict:
+        return json.loads(json.dumps(self.payload))
+
+    def get_headers(self) -> dict:
+        return {}
+
+
+def _summary(label: str, samples: list[float]) -> str:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return (
+        f"{label:<34} mean {statistics.mean(samples) * 1000:7.3f} ms   "
+        f"p50 {samples[len(samples) // 2] * 1000:7.3f} ms   p99 {p99 * 1000:7.3f} ms"
+    )
+
+
+async def _bench(requests: int, base_url: str) -> None:
+    generate, generate_stream = ai_stream_service(Context(), base_url=base_url, event_loops=1)
+    agenerate, agenerate_stream = ai_stream_service_async(Context(), base_url=base_url)
+
+    async def via_agenerate() -> None:
+        await agenerate(Context())
+
+    async def via_generate() -> None:
+        await asyncio.to_thread(generate, Context())
+
+    async def via_agenerate_stream() -> None:
+        async for _ in agenerate_stream(Context()):
+            pass
+
+    async def via_generate_stream() -> None:
+        await asyncio.to_thread(lambda: list(generate_stream(Context())))
+
+    variants = (
+        ("agenerate (caller's loop)", via_agenerate),
+        ("generate (worker + loop thread)", via_generate),
+        ("agenerate_stream (caller's loop)", via_agenerate_stream),
+        ("generate_stream (worker + loop thread)", via_generate_stream),
+    )
+    # Warm up: build the per-loop clients and open their connections
+    for _, run in variants:
+        await run()
+
+    print(f"{requests} sequential requests per variant")
+    for label, run in variants:
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            await run()
+            latencies.append(time.perf_counter() - start)
+        print(_summary(label, latencies))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    asyncio.run(_bench(args.requests, base_url))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
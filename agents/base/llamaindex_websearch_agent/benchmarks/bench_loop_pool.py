@@ -0,0 +1,132 @@
+"""Throughput of examples/ai_service.py with one event loop vs a pool of loops.
+
+Hosting threads call generate() concurrently against a local stub of the
+OpenAI chat completions API (answering after --latency seconds), as the AI
+service runtime does. Each run reports requests per second and the
+utilization of every loop of the pool.
+
+Run from the agent directory (after ./init.sh):
+
+    PYTHONPATH=src:examples python benchmarks/bench_loop_pool.py --loops 1 4 --threads 32
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("API_KEY", "benchmark")
+os.environ.setdefault("BASE_URL", "http://127.0.0.1:1/v1")
+os.environ.setdefault("MODEL_ID", "benchmark-model")
+os.environ.setdefault("COMPLETION_CACHE_ENABLED", "false")
+# Every request is identical: measure the loops, not request coalescing
+os.environ.setdefault("SINGLE_FLIGHT_ENABLED", "false")
+
+from ai_service import ai_stream_service  # noqa: E402
+from llama_index_workflow_agent_base.metrics import _loop_pool_collector  # noqa: E402
+
+
+def _chunk(**fields) -> str:
+    chunk = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "benchmark-model",
+        **fields,
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+# The workflow streams its LLM calls, so the stub answers with Server-Sent Events
+ANSWER = (
+    _chunk(
+        choices=[
+            {
+                "index": 0,
+                "delta": {"role": "assistant", "content": "RedHat"},
+                "finish_reason": None,
+            }
+        ]
+    )
+    + _chunk(choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+    + _chunk(
+        choices=[],
+        usage={"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+    )
+    + "data: [DONE]\n\n"
+).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a fixed streamed chat completion after a fixed latency."""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(ANSWER)))
+        self.end_headers()
+        self.wfile.write(ANSWER)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class Context:
+    def __init__(self) -> None:
+        self.payload = {"messages": [{"role": "user", "content": "What is RedHat?"}]}
+
+    def get_json(self) -> dict:
+        return json.loads(json.dumps(self.payload))
+
+    def get_headers(self) -> dict:
+        return {}
+
+
+def bench(loops: int, threads: int, requests: int, base_url: str) -> None:
+    generate, _ = ai_stream_service(Context(), base_url=base_url, event_loops=loops)
+    # Warm up every loop's connection pool (the loops start on the first call)
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(lambda _: generate(Context()), range(threads)))
+    pool = _loop_pool_collector.pool
+
+    pool.stats()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(lambda _: generate(Context()), range(requests)))
+    elapsed = time.perf_counter() - start
+    utilization = " ".join(f"{stats['utilization']:.2f}" for stats in pool.stats())
+    print(
+        f"{loops:>3} loop(s)   {requests / elapsed:8.1f} req/s   "
+        f"loop utilization {utilization}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--loops", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--threads", type=int, default=32, help="concurrent hosting threads")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub backend latency (s)")
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    print(f"{args.requests} requests from {args.threads} hosting threads")
+    for loops in args.loops:
+        bench(loops, args.threads, args.requests, base_url)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
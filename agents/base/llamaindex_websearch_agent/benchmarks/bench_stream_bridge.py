@@ -0,0 +1,62 @@
+"""Chunks per second through the async-to-sync streaming bridge of examples/ai_service.py.
+
+Compares the previous bridge (one run_coroutine_threadsafe future per chunk,
+blocking on future.result()) with iterate_in_loop (a producer task on the loop
+feeding a bounded queue drained by the sync generator). The async generator
+yields small chunk dicts like the token deltas of a streamed answer.
+
+Run from the agent directory (after ./init.sh):
+
+    PYTHONPATH=src:examples python benchmarks/bench_stream_bridge.py --chunks 100000
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Generator
+
+from ai_service import iterate_in_loop
+
+
+async def token_stream(chunks: int) -> AsyncIterator[dict]:
+    for i in range(chunks):
+        yield {"choices": [{"index": 0, "delta": {"content": "tok"}}]}
+
+
+def future_per_chunk(agen: AsyncIterator, loop: asyncio.AbstractEventLoop) -> Generator:
+    """The bridge generate_stream used before iterate_in_loop."""
+    while True:
+        try:
+            future = asyncio.run_coroutine_threadsafe(agen.__anext__(), loop)
+            value = future.result()
+        except StopAsyncIteration:
+            break
+        yield value
+
+
+def bench(label: str, bridge, chunks: int, loop: asyncio.AbstractEventLoop, repeat: int) -> None:
+    rates = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in bridge(token_stream(chunks), loop))
+        rates.append(count / (time.perf_counter() - start))
+        assert count == chunks
+    print(f"{label:<28} {max(rates):>12,.0f} chunks/s (best of {repeat})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    bench("future per chunk", future_per_chunk, args.chunks, loop, args.repeat)
+    bench("queue (iterate_in_loop)", iterate_in_loop, args.chunks, loop, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Per-event cost of formatting the workflow stream of examples/ai_service.py over long runs.
+
+Replays the events of a run with --turns tool-calling turns (one assistant tool
+call and one tool result per turn, on top of a --history message conversation)
+through two formatters and reports the mean time per tool-result event in
+buckets of turns:
+
+- rescan: the previous stateless formatter, which got the full history in every
+  InputEvent and searched it for the last assistant message;
+- deltas: StreamFormatter given the ToolResultsEvents the workflow streams now.
+
+Run from the agent directory (after ./init.sh):
+
+    PYTHONPATH=src:examples python benchmarks/bench_stream_formatter.py --turns 200
+"""
+
+import argparse
+import time
+
+from llama_index.core.llms import ChatMessage
+
+from ai_service import StreamFormatter
+from llama_index_workflow_agent_base.workflow import InputEvent, ToolResultsEvent
+
+
+def rescan(ev: InputEvent) -> list[dict]:
+    """The InputEvent branch of the formatter used before StreamFormatter."""
+    responses = []
+    last_assistant_index = None
+    for index, message in enumerate(ev.input):
+        if message.role == "assistant":
+            last_assistant_index = index
+    if last_assistant_index is not None:
+        for message in ev.input[last_assistant_index + 1 :]:
+            if message.role == "tool":
+                tool_call_id = message.additional_kwargs["tool_call_id"]
+                responses.append(
+                    {
+                        "role": "tool",
+                        "id": f"tool_call_id_{tool_call_id}",
+                        "tool_call_id": tool_call_id,
+                        "name": message.additional_kwargs["name"],
+                        "content": message.blocks[0].text,
+                    }
+                )
+    return responses
+
+
+def tool_message(turn: int) -> ChatMessage:
+    return ChatMessage(
+        role="tool",
+        content=f"result {turn}",
+        additional_kwargs={"tool_call_id": f"call_{turn}", "name": "dummy_web_search"},
+    )
+
+
+def replay(turns: int, history: int) -> tuple[list, list]:
+    """Time every tool-result event of one run; returns per-turn seconds per formatter."""
+    messages = [
+        ChatMessage(role="user" if i % 2 == 0 else "assistant", content=f"message {i}")
+        for i in range(history)
+    ]
+    deltas = StreamFormatter()
+    rescan_times, delta_times = [], []
+    for turn in range(turns):
+        result = tool_message(turn)
+        messages += [ChatMessage(role="assistant", content=""), result]
+        # The workflow built a copy of the history for every InputEvent
+        full = InputEvent(input=list(messages))
+        delta = ToolResultsEvent(messages=[result])
+
+        start = time.perf_counter()
+        rescan(full)
+        rescan_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        list(deltas.chunks(delta))
+        delta_times.append(time.perf_counter() - start)
+    return rescan_times, delta_times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--history", type=int, default=20, help="messages before the run")
+    parser.add_argument("--buckets", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    runs = [replay(args.turns, args.history) for _ in range(args.repeat)]
+    size = args.turns // args.buckets
+    print(f"Mean microseconds per tool-result event ({args.repeat} runs of {args.turns} turns)")
+    print(f"{'turns':<12}{'rescan':>10}{'deltas':>10}")
+    for start in range(0, size * args.buckets, size):
+        means = [
+            sum(sum(run[i][start : start + size]) for run in runs) / (size * len(runs)) * 1e6
+            for i in range(2)
+        ]
+        label = f"{start + 1}-{start + size}"
+        print(f"{label:<12}" + "".join(f"{mean:>10.1f}" for mean in means))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Per-request setup cost of the LlamaIndex workflow: closure built per request vs once.
+
+Part 1 times only the setup (env lookups, FunctionTool list, OpenAILike client,
+workflow instance). Part 2 runs full requests against a local stub of the
+OpenAI chat completions API and counts the TCP connections the backend accepts:
+a closure per request opens a new connection (a TLS handshake against a real
+endpoint) every time, a shared closure keeps reusing one.
+
+Run from the agent directory (after ./init.sh):
+
+    PYTHONPATH=src python benchmarks/bench_workflow_setup.py --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("API_KEY", "benchmark")
+os.environ.setdefault("BASE_URL", "http://127.0.0.1:1/v1")
+os.environ.setdefault("MODEL_ID", "benchmark-model")
+
+from llama_index_workflow_agent_base.agent import get_workflow_closure  # noqa: E402
+
+ANSWER = json.dumps(
+    {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "benchmark-model",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "RedHat"},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+    }
+).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a fixed chat completion, keeping connections alive."""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self) -> None:
+        super().setup()
+        StubHandler.connections += 1
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(ANSWER)))
+        self.end_headers()
+        self.wfile.write(ANSWER)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _summary(label: str, samples: list[float]) -> str:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return (
+        f"{label:<28} mean {statistics.mean(samples) * 1000:8.3f} ms   "
+        f"p50 {samples[len(samples) // 2] * 1000:8.3f} ms   p99 {p99 * 1000:8.3f} ms"
+    )
+
+
+def bench_setup(iterations: int, base_url: str) -> None:
+    per_request, shared = [], []
+    get_agent = get_workflow_closure(base_url=base_url)
+    for _ in range(iterations):
+        start = time.perf_counter()
+        get_workflow_closure(base_url=base_url)()
+        per_request.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        get_agent()
+        shared.append(time.perf_counter() - start)
+
+    print(f"Setup only ({iterations} iterations)")
+    print(_summary("closure per request", per_request))
+    print(_summary("closure built once", shared))
+
+
+async def _run_requests(requests: int, base_url: str, per_request: bool) -> list[float]:
+    messages = [{"role": "user", "content": "What is RedHat?"}]
+    get_agent = get_workflow_closure(base_url=base_url)
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        if per_request:
+            get_agent = get_workflow_closure(base_url=base_url)
+        await get_agent().run(input=[dict(m) for m in messages])
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_requests(requests: int) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    print(f"\nFull requests against a local stub backend ({requests} sequential requests)")
+    for label, per_request in (("closure per request", True), ("closure built once", False)):
+        StubHandler.connections = 0
+        latencies = asyncio.run(_run_requests(requests, base_url, per_request))
+        print(f"{_summary(label, latencies)}   connections {StubHandler.connections}")
+    server.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500, help="setup-only iterations")
+    parser.add_argument("--requests", type=int, default=200, help="full requests per variant")
+    args = parser.parse_args()
+
+    bench_setup(args.iterations, os.environ["BASE_URL"])
+    bench_requests(args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,346 @@
 import asyncio
 import json
+import os
+import queue
+import selectors
 import threading
-from typing import Generator, AsyncGenerator
+import time
+import weakref
+from typing import Any, AsyncIterator, Callable, Generator, AsyncGenerator, Iterator
 
-import nest_asyncio
 from llama_index.core.base.llms.types import ChatMessage
+from llama_index.core.tools import ToolSelection
+from llama_index.core.workflow import Event
 
 from llama_index_workflow_agent_base.agent import get_workflow_closure
+from llama_index_workflow_agent_base.metrics import register_loop_pool
 from llama_index_workflow_agent_base.workflow import (
+    TextDeltaEvent,
     ToolCallEvent,
+    ToolResultsEvent,
     StopEvent,
-    InputEvent,
-    StartEvent,
 )
 
+# Event-loop threads serving requests (default: one per CPU)
+AI_SERVICE_EVENT_LOOPS = int(os.getenv("AI_SERVICE_EVENT_LOOPS", 0)) or os.cpu_count() or 1
 
-def ai_stream_service(context, base_url=None, model_id=None):
+# Events buffered between the loop producing a stream and the thread consuming it
+STREAM_QUEUE_MAX_EVENTS = int(os.getenv("STREAM_QUEUE_MAX_EVENTS", 64))
+
+_STREAM_END = object()
+
+
+class _StreamError:
+    """Exception raised by the async generator, re-raised in the consuming thread."""
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def iterate_in_loop(
+    agen: AsyncIterator,
+    loop: asyncio.AbstractEventLoop,
+    max_events: int = STREAM_QUEUE_MAX_EVENTS,
+) -> Generator:
+    """Iterate an async generator running on loop (in another thread) from sync code.
+
+    A producer task on loop drains agen into a bounded thread-safe queue and the
+    calling thread blocks on the queue, so each event costs one queue hand-off
+    instead of a cross-thread future. When the queue is full the producer waits
+    until the consumer makes room (backpressure); when the consumer stops
+    iterating, the producer task is cancelled, which closes agen.
     """
+    events: queue.Queue = queue.Queue(maxsize=max_events)
+    room = asyncio.Event()
+    # Set by the producer while it waits for room, so the consumer only wakes it then
+    producer_waiting = False
 
-    :param context:
-    :param base_url:
-    :param model_id:
-    :return:
+    async def put(item: Any) -> None:
+        nonlocal producer_waiting
+        while True:
+            try:
+                events.put_nowait(item)
+                return
+            except queue.Full:
+                room.clear()
+                producer_waiting = True
+                # Re-check: the consumer may have taken an event before seeing the flag
+                try:
+                    events.put_nowait(item)
+                    return
+                except queue.Full:
+                    await room.wait()
+                finally:
+                    producer_waiting = False
+
+    async def produce() -> None:
+        try:
+            async for event in agen:
+                await put(event)
+        except Exception as e:
+            await put(_StreamError(e))
+        else:
+            await put(_STREAM_END)
+        finally:
+            await agen.aclose()
+
+    task = asyncio.run_coroutine_threadsafe(produce(), loop)
+    try:
+        while True:
+            item = events.get()
+            if producer_waiting:
+                loop.call_soon_threadsafe(room.set)
+            if item is _STREAM_END:
+                return
+            if isinstance(item, _StreamError):
+                raise item.error
+            yield item
+    finally:
+        # Consumer stopped early (or the stream ended): make sure the producer is gone
+        task.cancel()
+
+
+class _TimedSelector(selectors.DefaultSelector):
+    """Selector adding up the time its event loop spends waiting for I/O (idle time)."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._idle_seconds = 0.0
+        # perf_counter() when the current wait started, None while the loop is running
+        self._waiting_since: float | None = None
+
+    def select(self, timeout: float | None = None) -> list:
+        self._waiting_since = time.perf_counter()
+        try:
+            return super().select(timeout)
+        finally:
+            self._idle_seconds += time.perf_counter() - self._waiting_since
+            self._waiting_since = None
+
+    def idle_seconds(self, now: float) -> float:
+        """Total idle time up to now, including a wait still in progress."""
+        waiting_since = self._waiting_since
+        idle = self._idle_seconds
+        if waiting_since is not None:
+            idle += now - waiting_since
+        return idle
+
+
+class LoopPool:
+    """Event loops, each on a daemon thread of its own, sharing the service's requests.
+
+    Every request runs on the loop with the fewest requests in flight (ties are
+    broken round-robin). Per-loop state that is bound to a loop, such as the
+    async LLM client's connections, is created with setup(index) once per loop.
     """
-    nest_asyncio.apply()  # We inject support for nested event loops
 
-    persistent_loop = asyncio.new_event_loop()  # Create a persistent event loop that will be used by generate and generate_stream
+    def __init__(self, size: int = AI_SERVICE_EVENT_LOOPS) -> None:
+        self.loops: list[asyncio.AbstractEventLoop] = []
+        self._selectors: list[_TimedSelector] = []
+        self._in_flight = [0] * size
+        self._next = 0
+        self._lock = threading.Lock()
+
+        for index in range(size):
+            selector = _TimedSelector()
+            loop = asyncio.SelectorEventLoop(selector)
+            threading.Thread(
+                target=loop.run_forever, name=f"ai-service-loop-{index}", daemon=True
+            ).start()
+            self.loops.append(loop)
+            self._selectors.append(selector)
+
+        # Wall clock and idle time at the previous stats() call, per loop
+        now = time.perf_counter()
+        self._sampled = [(now, 0.0)] * size
+
+    def __len__(self) -> int:
+        return len(self.loops)
+
+    def _acquire(self) -> int:
+        with self._lock:
+            size = len(self.loops)
+            index = min(
+                ((self._next + i) % size for i in range(size)),
+                key=self._in_flight.__getitem__,
+            )
+            self._next = (index + 1) % size
+            self._in_flight[index] += 1
+            return index
+
+    def _release(self, index: int) -> None:
+        with self._lock:
+            self._in_flight[index] -= 1
+
+    def run(self, make_coro: Callable[[int], Any]) -> Any:
+        """Run make_coro(loop index) on the least loaded loop and wait for its result."""
+        index = self._acquire()
+        try:
+            return asyncio.run_coroutine_threadsafe(make_coro(index), self.loops[index]).result()
+        finally:
+            self._release(index)
+
+    def stream(self, make_agen: Callable[[int], AsyncIterator]) -> Generator:
+        """Iterate make_agen(loop index) on the least loaded loop (see iterate_in_loop)."""
+        index = self._acquire()
+        try:
+            yield from iterate_in_loop(make_agen(index), self.loops[index])
+        finally:
+            self._release(index)
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Per loop: requests in flight and the busy fraction since the previous call."""
+        now = time.perf_counter()
+        stats = []
+        with self._lock:
+            for index, selector in enumerate(self._selectors):
+                idle = selector.idle_seconds(now)
+                sampled_at, sampled_idle = self._sampled[index]
+                self._sampled[index] = (now, idle)
+                elapsed = now - sampled_at
+                utilization = 1 - (idle - sampled_idle) / elapsed if elapsed > 0 else 0.0
+                stats.append(
+                    {
+                        "in_flight": self._in_flight[index],
+                        # A loop blocked in select() counts as idle, so this is CPU (GIL) time
+                        "utilization": min(1.0, max(0.0, utilization)),
+                    }
+                )
+        return stats
+
+
+class StreamFormatter:
+    """Turns the workflow events of one streamed run into chat completion chunks.
+
+    Create one per run. Each event is formatted from the messages it adds: the
+    workflow streams deltas (ToolCallEvent, ToolResultsEvent) rather than its full
+    history, so every event costs O(new messages) however long the conversation
+    gets.
+    """
+
+    def __init__(self, is_assistant: bool = False) -> None:
+        self.is_assistant = is_assistant
+        # Whether answer text went out as deltas (then the final event only closes the turn)
+        self.streamed_text = False
+
+    def chunks(self, ev: Event) -> Iterator[dict]:
+        """Chat completion chunks for one workflow event (none for other events)."""
+        if isinstance(ev, TextDeltaEvent):
+            self.streamed_text = True
+            yield self._chunk({"role": "assistant", "content": ev.delta})
+
+        elif isinstance(ev, ToolCallEvent):
+            for tool_call in ev.tool_calls:
+                yield self._chunk(self._tool_call(tool_call), finish_reason="tool_calls")
+
+        elif isinstance(ev, ToolResultsEvent):
+            for message in ev.messages:
+                yield self._chunk(self._tool_result(message))
+
+        elif isinstance(ev, StopEvent):
+            # Final response
+            response = ev.result["response"]
+            finish_reason = ev.result.get("finish_reason")
+            if finish_reason is None:
+                # Access finish_reason from ChatCompletion object (not dict)
+                # .raw is a ChatCompletion Pydantic model, so use attribute access
+                try:
+                    finish_reason = response.raw.choices[0].finish_reason
+                except (AttributeError, IndexError, KeyError):
+                    # Fallback if structure is different
+                    finish_reason = None
+            if self.streamed_text:
+                message = {"role": "assistant"}
+            else:
+                message = {"role": "assistant", "content": response.message.blocks[0].text}
+            yield self._chunk(message, finish_reason=finish_reason)
+
+    @staticmethod
+    def _chunk(delta: dict, **choice: Any) -> dict:
+        # Tool results are sent without a finish_reason key at all
+        return {"choices": [{"index": 0, "delta": delta, **choice}]}
+
+    def _tool_call(self, tool_call: ToolSelection) -> dict:
+        arguments_str = json.dumps(tool_call.tool_kwargs)
+        if self.is_assistant:
+            return {
+                "role": "assistant",
+                "step_details": {
+                    "type": "tool_calls",
+                    "tool_calls": [
+                        {
+                            "id": tool_call.tool_id,
+                            "name": tool_call.tool_name,
+                            "args": arguments_str,
+                        }
+                    ],
+                },
+            }
+        return {
+            "role": "assistant",
+            "tool_calls": [
+                {
+                    "id": tool_call.tool_id,
+                    "type": "function",
+                    "function": {
+                        "name": tool_call.tool_name,
+                        "arguments": arguments_str,
+                    },
+                }
+            ],
+        }
+
+    def _tool_result(self, message: ChatMessage) -> dict:
+        tool_call_id = message.additional_kwargs["tool_call_id"]
+        result = {
+            "id": f"tool_call_id_{tool_call_id}",
+            "tool_call_id": tool_call_id,
+            "name": message.additional_kwargs["name"],
+            "content": message.blocks[0].text,
+        }
+        if self.is_assistant:
+            return {"role": "assistant", "step_details": {"type": "tool_response", **result}}
+        return {"role": "tool", **result}
+
 
-    def start_loop(loop: asyncio.AbstractEventLoop) -> None:
-        asyncio.set_event_loop(loop)
-        loop.run_forever()
+def _ai_services(base_url=None, model_id=None, event_loops=None) -> tuple:
+    """
+    generate, generate_stream, agenerate, agenerate_stream sharing one workflow per event loop.
 
-    threading.Thread(
-        target=start_loop, args=(persistent_loop,), daemon=True
-    ).start()  # We run a persistent loop in a separate daemon thread
+    agenerate/agenerate_stream run on the caller's event loop; generate/generate_stream
+    wrap them for sync hosts, running them on a pool of event-loop threads started on
+    the first sync call.
+    """
+    pool: LoopPool | None = None
+    pool_lock = threading.Lock()
+
+    def loop_pool() -> LoopPool:
+        # Requests from all hosting threads are spread over a pool of persistent event loops
+        nonlocal pool
+        with pool_lock:
+            if pool is None:
+                pool = LoopPool(event_loops or AI_SERVICE_EVENT_LOOPS)
+                register_loop_pool(pool)
+            return pool
+
+    # Built once per event loop and shared by the requests of that loop: env lookups, tools and
+    # the OpenAILike client, whose async connection pool (kept alive across requests) is bound
+    # to its loop
+    workflows: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Callable] = (
+        weakref.WeakKeyDictionary()
+    )
+    workflows_lock = threading.Lock()
+
+    def workflow_for_running_loop() -> Callable:
+        loop = asyncio.get_running_loop()
+        workflow = workflows.get(loop)
+        if workflow is None:
+            with workflows_lock:
+                workflow = workflows.get(loop)
+                if workflow is None:
+                    workflow = get_workflow_closure(model_id=model_id, base_url=base_url)
+                    workflows[loop] = workflow
+        return workflow
 
     def get_formatted_message(resp: ChatMessage) -> dict | None:
         role = resp.role
@@ -66,104 +373,9 @@ def ai_stream_service(context, base_url=None, model_id=None):
                     ],
                 }
 
-    def get_formatted_message_stream(
-        resp: ChatMessage, is_assistant: bool = False
-    ) -> list | None:
-
-        if isinstance(resp, StartEvent):
-            return
-
-        elif isinstance(resp, InputEvent):
-            responses = []
-            resp_input = resp.input
-            last_assistant_index = None
-
-            for index, message in enumerate(resp_input):
-                if message.role == "assistant":
-                    last_assistant_index = index
-
-            if last_assistant_index is not None:
-                for event_input in resp_input[last_assistant_index + 1 :]:
-                    if event_input.role == "tool":
-                        tool_call_id = event_input.additional_kwargs["tool_call_id"]
-                        if is_assistant:
-                            to_queue = {
-                                "role": "assistant",
-                                "step_details": {
-                                    "type": "tool_response",
-                                    "id": f"tool_call_id_{tool_call_id}",
-                                    "tool_call_id": tool_call_id,
-                                    "name": event_input.additional_kwargs["name"],
-                                    "content": event_input.blocks[0].text,
-                                },
-                            }
-                        else:
-                            to_queue = {
-                                "role": "tool",
-                                "id": f"tool_call_id_{tool_call_id}",
-                                "tool_call_id": tool_call_id,
-                                "name": event_input.additional_kwargs["name"],
-                                "content": event_input.blocks[0].text,
-                            }
-
-                        responses.append(to_queue)
-
-            return responses
-
-        elif isinstance(resp, ToolCallEvent):
-            # Tool calls
-            responses = []
-            for tool_call in resp.tool_calls:
-                arguments_str = json.dumps(tool_call.tool_kwargs)
-
-                if is_assistant:
-                    to_queue = {
-                        "role": "assistant",
-                        "step_details": {
-                            "type": "tool_calls",
-                            "tool_calls": [
-                                {
-                                    "id": tool_call.tool_id,
-                                    "name": tool_call.tool_name,
-                                    "args": arguments_str,
-                                }
-                            ],
-                        },
-                    }
-                else:
-                    to_queue = {
-                        "role": "assistant",
-                        "tool_calls": [
-                            {
-                                "id": tool_call.tool_id,
-                                "type": "function",
-                                "function": {
-                                    "name": tool_call.tool_name,
-                                    "arguments": arguments_str,
-                                },
-                            }
-                        ],
-                    }
-
-                responses.append(to_queue)
-
-            return responses
-
-        elif isinstance(resp, StopEvent):
-            # Final response
-            resp_result = resp.result
-            resp_response = resp_result["response"]
-            to_queue = {
-                "role": "assistant",
-                "content": resp_response.message.blocks[0].text,
-            }
-
-            return [to_queue]
-
     async def generate_async(context) -> dict:
 
-        workflow = get_workflow_closure(model_id=model_id, base_url=base_url)
-
+        workflow = workflow_for_running_loop()
         payload = context.get_json()
         messages = payload.get("messages", [])
 
@@ -175,13 +387,12 @@ def ai_stream_service(context, base_url=None, model_id=None):
 
         return await agent.run(input=messages)
 
-    async def generate_async_stream(context) -> AsyncGenerator:
-
-        workflow = get_workflow_closure(model_id=model_id, base_url=base_url)
+    async def agenerate_stream(context) -> AsyncGenerator:
 
+        workflow = workflow_for_running_loop()
         payload = context.get_json()
         headers = context.get_headers()
-        is_assistant = headers.get("X-Ai-Interface") == "assistant"
+        formatter = StreamFormatter(is_assistant=headers.get("X-Ai-Interface") == "assistant")
 
         messages = payload.get("messages", [])
 
@@ -193,50 +404,20 @@ def ai_stream_service(context, base_url=None, model_id=None):
 
         handler = agent.run(input=messages)
 
-        async for ev in handler.stream_events():
-            if (messages := get_formatted_message_stream(ev, is_assistant)) is not None:
-                for message in messages:
-                    if isinstance(ev, ToolCallEvent):
-                        yield {
-                            "choices": [
-                                {
-                                    "index": 0,
-                                    "delta": message,
-                                    "finish_reason": "tool_calls",
-                                }
-                            ]
-                        }
-                    elif isinstance(ev, StopEvent):
-                        # Access finish_reason from ChatCompletion object (not dict)
-                        # .raw is a ChatCompletion Pydantic model, so use attribute access
-                        try:
-                            finish_reason = (
-                                ev.result["response"].raw.choices[0].finish_reason
-                            )
-                        except (AttributeError, IndexError, KeyError):
-                            # Fallback if structure is different
-                            finish_reason = None
-                        yield {
-                            "choices": [
-                                {
-                                    "index": 0,
-                                    "delta": message,
-                                    "finish_reason": finish_reason,
-                                }
-                            ]
-                        }
-                    else:
-                        # Tool call result
-                        yield {"choices": [{"index": 0, "delta": message}]}
+        try:
+            async for ev in handler.stream_events():
+                for chunk in formatter.chunks(ev):
+                    yield chunk
 
-        await handler
+            await handler
+        finally:
+            # Stop the run if the consumer stopped iterating mid-stream
+            if not handler.done():
+                await handler.cancel_run()
 
-    def generate(context) -> dict:
+    async def agenerate(context) -> dict:
 
-        future = asyncio.run_coroutine_threadsafe(
-            generate_async(context), persistent_loop
-        )
-        generated_response = future.result()
+        generated_response = await generate_async(context)
         message = get_formatted_message(generated_response["messages"][-1])
         choices = [{"index": 0, "message": message}]
 
@@ -245,17 +426,41 @@ def ai_stream_service(context, base_url=None, model_id=None):
             "body": {"choices": choices},
         }
 
+    def generate(context) -> dict:
+        return loop_pool().run(lambda index: agenerate(context))
+
     def generate_stream(context) -> Generator:
-        gen = generate_async_stream(context)
+        yield from loop_pool().stream(lambda index: agenerate_stream(context))
 
-        while True:
-            try:
-                future = asyncio.run_coroutine_threadsafe(
-                    gen.__anext__(), persistent_loop
-                )
-                value = future.result()
-            except StopAsyncIteration:
-                break
-            yield value
+    return generate, generate_stream, agenerate, agenerate_stream
+
+
+def ai_stream_service(context, base_url=None, model_id=None, event_loops=None):
+    """
 
+    generate/generate_stream run the workflow on a pool of event-loop threads
+    (started on the first call), for sync hosts.
+
+    :param context:
+    :param base_url:
+    :param model_id:
+    :param event_loops: number of event-loop threads (AI_SERVICE_EVENT_LOOPS if omitted)
+    :return: generate, generate_stream
+    """
+    generate, generate_stream, _, _ = _ai_services(base_url, model_id, event_loops)
     return generate, generate_stream
+
+
+def ai_stream_service_async(context, base_url=None, model_id=None):
+    """
+
+    agenerate/agenerate_stream run the workflow on the caller's event loop, for hosts
+    that are async themselves (no event-loop threads are started).
+
+    :param context:
+    :param base_url:
+    :param model_id:
+    :return: agenerate, agenerate_stream
+    """
+    _, _, agenerate, agenerate_stream = _ai_services(base_url, model_id)
+    return agenerate, agenerate_stream
@@ -40,7 +40,9 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 # Get the root directory of the repository (3 levels up from script)
 ROOT_DIR="$(cd "$SCRIPT_DIR/../../.." && pwd)"
 
-# Copy utils.py to the destination
-cp "$ROOT_DIR/utils.py" "$SCRIPT_DIR/src/llama_index_workflow_agent_base/" && echo "Utils.py copied to destination"
+# Copy shared modules to the destination
+for shared_module in utils.py serialization.py admission.py deadlines.py metrics.py completion_cache.py single_flight.py; do
+    cp "$ROOT_DIR/$shared_module" "$SCRIPT_DIR/src/llama_index_workflow_agent_base/" && echo "$shared_module copied to destination"
+done
 
 echo "Agent initialized successfully"
@@ -1,19 +1,66 @@
-import json
+import asyncio
 import os
+import time
+import uuid
 from contextlib import asynccontextmanager
+from typing import Any
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, ConfigDict, Field
 
+from llama_index_workflow_agent_base.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    admission_rejected_handler,
+)
 from llama_index_workflow_agent_base.agent import get_workflow_closure
+from llama_index_workflow_agent_base.agent_pool import AgentLease, AgentPool
+from llama_index_workflow_agent_base.completion_cache import get_completion_cache
+from llama_index_workflow_agent_base.deadlines import (
+    RequestAborted,
+    open_scope,
+    request_aborted_handler,
+    request_timeout,
+    run_cancellable,
+)
+from llama_index_workflow_agent_base.metrics import (
+    MetricsMiddleware,
+    instrument_llama_index,
+    metrics_response,
+    observe_first_token,
+    register_admission,
+    register_completion_cache,
+    register_single_flight,
+)
+from llama_index_workflow_agent_base.serialization import (
+    ORJSONResponse,
+    ReturnMode,
+    llama_index_message_content,
+    llama_index_serializer,
+    select_messages,
+    sse_event,
+)
+from llama_index_workflow_agent_base.single_flight import get_single_flight
 from llama_index_workflow_agent_base.utils import get_env_var
+from llama_index_workflow_agent_base.workflow import StopEvent, TextDeltaEvent
 
 
 # Request/Response models
 class ChatRequest(BaseModel):
-    """Incoming chat request body for the /chat endpoint."""
+    """Incoming chat request body for the /chat endpoint.
+
+    "return" selects what is sent back: "final" (only the answer), "new" (messages
+    produced by this run) or "full" (whole conversation, the default). "timeout"
+    (seconds) shortens the request's time budget, capped by REQUEST_TIMEOUT_SECONDS.
+    """
+
+    model_config = ConfigDict(populate_by_name=True)
 
     message: str
+    return_mode: ReturnMode = Field(default="full", alias="return")
+    timeout: float | None = Field(default=None, gt=0)
 
 
 class ChatResponse(BaseModel):
@@ -23,22 +70,72 @@ class ChatResponse(BaseModel):
     steps: list[str]
 
 
+class ChatCompletionMessage(BaseModel):
+    """One message of an OpenAI-style chat completion request."""
+
+    role: str
+    content: str | list[dict[str, Any]] | None = None
+    # Replayed tool calls (assistant) and tool results (tool)
+    tool_calls: list[dict[str, Any]] | None = None
+    tool_call_id: str | None = None
+    name: str | None = None
+
+
+class ChatCompletionRequest(BaseModel):
+    """OpenAI-compatible request body for the /v1/chat/completions endpoint.
+
+    Sampling parameters sent by OpenAI clients (temperature, max_tokens, ...) are
+    accepted and ignored; the agent uses the LLM configured at startup. "timeout"
+    (seconds) shortens the request's time budget, capped by REQUEST_TIMEOUT_SECONDS.
+    """
+
+    model: str | None = None
+    messages: list[ChatCompletionMessage]
+    stream: bool = False
+    timeout: float | None = Field(default=None, gt=0)
+
+
 # Global variable for workflow closure (get_agent callable)
 get_agent = None
 
+# Reused workflow instances built by get_agent, keyed by system prompt (AGENT_POOL_SIZE)
+agent_pool = None
+
+# Model id reported in /v1/chat/completions responses
+served_model_id = None
+
+message_serializer = llama_index_serializer()
+
+# Bounds concurrent workflow runs (ADMISSION_* env vars); excess requests queue, then get 429
+admission = AdmissionController.from_env()
+register_admission(admission)
+
+# Opt-in LLM response cache (COMPLETION_CACHE_* env vars), shared by every client of the agent
+completion_cache = get_completion_cache()
+register_completion_cache(completion_cache)
+
+# Identical concurrent LLM requests share one upstream call (SINGLE_FLIGHT_ENABLED)
+single_flight = get_single_flight()
+register_single_flight(single_flight)
+
+# Time workflow steps, tool calls and LLM requests from LlamaIndex instrumentation spans (served on /metrics)
+instrument_llama_index()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize the LlamaIndex workflow closure on startup and clear it on shutdown.
 
     Reads BASE_URL and MODEL_ID from the environment, builds the workflow via
-    get_workflow_closure, and sets the global get_agent for the /chat endpoint.
+    get_workflow_closure, and sets the global get_agent (and the agent_pool built on
+    it) for the /chat endpoint.
     """
-    global get_agent
+    global get_agent, agent_pool, served_model_id
 
     # Get environment variables
     base_url = get_env_var("BASE_URL")
     model_id = get_env_var("MODEL_ID")
+    served_model_id = model_id
 
     # Ensure base_url ends with /v1 if provided
     if base_url and not base_url.endswith("/v1"):
@@ -46,11 +143,14 @@ async def lifespan(app: FastAPI):
 
     # Get workflow closure (returns a callable that returns an agent)
     get_agent = get_workflow_closure(model_id=model_id, base_url=base_url)
+    agent_pool = AgentPool(get_agent)
 
     yield
 
     # Cleanup on shutdown (if needed)
     get_agent = None
+    agent_pool = None
+    served_model_id = None
 
 
 # Create FastAPI app
@@ -58,143 +158,269 @@ app = FastAPI(
     title="LlamaIndex Websearch Agent API",
     description="FastAPI service for LlamaIndex Websearch Agent",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
+app.add_exception_handler(AdmissionRejected, admission_rejected_handler)
+app.add_exception_handler(RequestAborted, request_aborted_handler)
+app.add_middleware(MetricsMiddleware)
 
 
-def _get_message_content(msg) -> str:
-    """Extract text content from a LlamaIndex ChatMessage."""
-    if hasattr(msg, "blocks") and msg.blocks:
-        # Find the first block with text content (skip ToolCallBlock)
-        for block in msg.blocks:
-            if hasattr(block, "text"):
-                return block.text or ""
-        return ""
-    if hasattr(msg, "content"):
-        if isinstance(msg.content, str):
-            return msg.content
-        if isinstance(msg.content, list) and msg.content:
-            first = msg.content[0]
-            if isinstance(first, dict) and "text" in first:
-                return first["text"] or ""
-    return ""
-
-
-def _message_to_response_dict(msg):
-    """Map a LlamaIndex ChatMessage to the same format as LangGraph (role, content, tool_calls, etc.)."""
-    role = getattr(msg, "role", "user")
-    content = _get_message_content(msg)
-
-    if role == "user":
-        return {"role": "user", "content": content}
-
-    if role == "assistant":
-        msg_data = {"role": "assistant", "content": content or ""}
-        tool_calls = getattr(msg, "tool_calls", None)
-        if not tool_calls and getattr(msg, "additional_kwargs", None):
-            tool_calls = msg.additional_kwargs.get("tool_calls")
-        if tool_calls:
-            if hasattr(tool_calls[0], "tool_id"):  # ToolSelection-like
-                msg_data["tool_calls"] = [
-                    {
-                        "id": tc.tool_id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.tool_name,
-                            "arguments": json.dumps(tc.tool_kwargs),
-                        },
-                    }
-                    for tc in tool_calls
-                ]
-            elif hasattr(tool_calls[0], "id") and hasattr(tool_calls[0], "function"):
-                # ChatCompletionMessageFunctionToolCall object
-                msg_data["tool_calls"] = []
-                for tc in tool_calls:
-                    fn = tc.function
-                    args = fn.arguments if hasattr(fn, "arguments") else ""
-                    if isinstance(args, dict):
-                        args = json.dumps(args)
-                    msg_data["tool_calls"].append(
-                        {
-                            "id": tc.id,
-                            "type": getattr(tc, "type", "function"),
-                            "function": {
-                                "name": fn.name if hasattr(fn, "name") else "",
-                                "arguments": args,
-                            },
-                        }
-                    )
-            else:  # dict format (e.g. from additional_kwargs)
-                msg_data["tool_calls"] = []
-                for tc in tool_calls:
-                    fn = tc.get("function", {}) or {}
-                    args = fn.get("arguments", "")
-                    if isinstance(args, dict):
-                        args = json.dumps(args)
-                    msg_data["tool_calls"].append(
-                        {
-                            "id": tc.get("id", ""),
-                            "type": "function",
-                            "function": {"name": fn.get("name", ""), "arguments": args},
-                        }
-                    )
-        return msg_data
-
-    if role == "tool":
-        additional = getattr(msg, "additional_kwargs", {}) or {}
-        return {
-            "role": "tool",
-            "tool_call_id": additional.get("tool_call_id", ""),
-            "name": additional.get("name", ""),
-            "content": content,
-        }
-
-    return None  # skip system or unknown
+async def _run_workflow(agent, messages: list[dict]) -> Any:
+    """Run the agent workflow to completion, stopping the run if the caller is cancelled."""
+    handler = agent.run(input=messages)
+    try:
+        return await handler
+    except asyncio.CancelledError:
+        await handler.cancel_run()
+        raise
 
 
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """
     Chat endpoint that accepts a message and returns the agent's response.
 
+    The run is cancelled when the client disconnects (499) or when the request's
+    deadline passes (504); the deadline also bounds every LLM call.
+
     Args:
         request: ChatRequest containing the user message
+        http_request: Raw request, watched for client disconnects and X-Request-Timeout
 
     Returns:
-        JSON response with full conversation history including tool calls
+        JSON response with the conversation history (including tool calls) selected by request.return_mode
     """
     global get_agent
 
     if get_agent is None:
         raise HTTPException(status_code=503, detail="Agent not initialized")
 
+    scope = open_scope(request_timeout(http_request, request.timeout))
+
+    async with admission.slot():
+        try:
+            messages = [{"role": "user", "content": request.message}]
+
+            with agent_pool.checkout(timeout=scope.remaining()) as agent:
+                result = await run_cancellable(
+                    http_request, _run_workflow(agent, messages), scope
+                )
+
+            result_messages = result["messages"] if result else []
+            # The workflow history starts with the system prompt, followed by the request message
+            n_input = len(messages)
+            if result_messages and getattr(result_messages[0], "role", None) == "system":
+                n_input += 1
+
+            # Select before serializing so "final" only pays for the last message
+            response_messages = select_messages(
+                result_messages, request.return_mode, n_input=n_input
+            )
+            return {
+                "messages": message_serializer.serialize_many(response_messages),
+                # "length" when the answer was cut off by the output token limit
+                "finish_reason": (result.get("finish_reason") if result else None) or "stop",
+            }
+
+        except RequestAborted:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error processing request: {str(e)}"
+            )
+
+
+def _lease_for_messages(
+    messages: list[ChatCompletionMessage], timeout: float
+) -> tuple[AgentLease, list[dict]]:
+    """Check out an agent for an OpenAI-style message list.
+
+    A leading system message overrides the default system prompt; the remaining
+    messages, later system messages included, are passed to the workflow as
+    dicts (role, content and any tool-call fields). timeout bounds the workflow
+    run. The caller releases the lease once the run is over.
+    """
+    if messages and messages[0].role == "system":
+        system_prompt = messages[0].content
+        if isinstance(system_prompt, list):
+            system_prompt = system_prompt[0].get("text", "") if system_prompt else ""
+        input_messages = [m.model_dump(exclude_none=True) for m in messages[1:]]
+        return agent_pool.acquire(system_prompt, timeout=timeout), input_messages
+    input_messages = [m.model_dump(exclude_none=True) for m in messages]
+    return agent_pool.acquire(timeout=timeout), input_messages
+
+
+def _checkout(
+    messages: list[ChatCompletionMessage], timeout: float
+) -> tuple[AgentLease, list[dict]]:
+    """_lease_for_messages, with failures answered as 500."""
     try:
-        agent = get_agent()
-        messages = [{"role": "user", "content": request.message}]
+        return _lease_for_messages(messages, timeout)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error processing request: {str(e)}"
+        )
 
-        result = await agent.run(input=messages)
 
-        response_messages = []
+def _completion_chunk(
+    completion_id: str, created: int, delta: dict, finish_reason: str | None = None
+) -> bytes:
+    """Encode one chat.completion.chunk as a Server-Sent Events frame."""
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": served_model_id,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return sse_event(chunk)
 
-        if result and "messages" in result and len(result["messages"]) > 0:
-            for message in result["messages"]:
-                if getattr(message, "role", None) == "system":
-                    continue
-                item = _message_to_response_dict(message)
-                if item is not None:
-                    response_messages.append(item)
 
-        return {"messages": response_messages, "finish_reason": "stop"}
+@app.post("/v1/chat/completions")
+async def chat_completions(request: ChatCompletionRequest, http_request: Request):
+    """
+    OpenAI-compatible chat completions endpoint backed by the FunctionCallingAgent.
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Error processing request: {str(e)}"
+    Tool calls are executed inside the agent workflow, so clients only receive the
+    final assistant message. With stream=true the response is a text/event-stream of
+    chat.completion.chunk objects terminated by "data: [DONE]". Runs are bounded by
+    the request's deadline and cancelled when the client disconnects.
+
+    Args:
+        request: ChatCompletionRequest with the full messages array
+        http_request: Raw request, watched for client disconnects and X-Request-Timeout
+
+    Returns:
+        chat.completion object, or a StreamingResponse of chat.completion.chunk events
+    """
+    global get_agent
+
+    if get_agent is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    timeout = request_timeout(http_request, request.timeout)
+
+    if request.stream:
+        # Admit before the response starts so an overloaded server can still answer 429,
+        # and before checking out an agent so that queued requests do not hold one
+        permit = await admission.acquire()
+        try:
+            lease, messages = _checkout(request.messages, timeout)
+        except BaseException:
+            permit.release()
+            raise
+        agent = lease.agent
+
+        def release() -> None:
+            permit.release()
+            lease.release()
+
+        async def event_stream():
+            open_scope(timeout)
+            yield _completion_chunk(
+                completion_id, created, {"role": "assistant", "content": ""}
+            )
+            handler = None
+            completed = False
+            try:
+                handler = agent.run(input=messages)
+                streamed = False
+                async for ev in handler.stream_events():
+                    if isinstance(ev, TextDeltaEvent):
+                        # Answer text, forwarded as the backend produces it
+                        streamed = True
+                        observe_first_token()
+                        yield _completion_chunk(
+                            completion_id, created, {"content": ev.delta}
+                        )
+                    elif isinstance(ev, StopEvent) and not streamed:
+                        content = llama_index_message_content(
+                            ev.result["response"].message
+                        )
+                        if content:
+                            observe_first_token()
+                            yield _completion_chunk(
+                                completion_id, created, {"content": content}
+                            )
+                result = await handler
+                completed = True
+                finish_reason = result.get("finish_reason") or "stop"
+                yield _completion_chunk(completion_id, created, {}, finish_reason)
+            except Exception as e:
+                yield sse_event(
+                    {"error": {"message": f"Error processing request: {str(e)}"}}
+                )
+            finally:
+                # Stop the run if the client went away mid-stream
+                if handler is not None and not handler.done():
+                    await handler.cancel_run()
+                permit.release()
+                # An instance whose run was cut short is not reused
+                lease.release(reusable=completed)
+            yield sse_event("[DONE]")
+
+        # The background task covers streams that are closed before they start
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=BackgroundTask(release),
         )
 
+    scope = open_scope(timeout)
+
+    async with admission.slot():
+        lease, messages = _checkout(request.messages, scope.remaining())
+        reusable = False
+        try:
+            result = await run_cancellable(
+                http_request, _run_workflow(lease.agent, messages), scope
+            )
+            reusable = True
+            message = message_serializer.serialize(result["response"].message)
+            finish_reason = result.get("finish_reason") or "stop"
+
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": served_model_id,
+                "choices": [
+                    {"index": 0, "message": message, "finish_reason": finish_reason}
+                ],
+            }
+
+        except RequestAborted:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error processing request: {str(e)}"
+            )
+        finally:
+            lease.release(reusable=reusable)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request/step/tool/LLM latency histograms, in-flight gauges and token counters."""
+    return metrics_response()
+
 
 @app.get("/health")
 async def health():
-    """Return service health and whether the workflow closure has been initialized."""
-    return {"status": "healthy", "agent_initialized": get_agent is not None}
+    """Return service health, whether the workflow closure has been initialized, admission queue, agent pool, LLM request coalescing and completion cache state."""
+    return {
+        "status": "healthy",
+        "agent_initialized": get_agent is not None,
+        "agent_pool": agent_pool.stats() if agent_pool is not None else None,
+        "admission": admission.stats(),
+        "completion_cache": (
+            completion_cache.stats() if completion_cache is not None else None
+        ),
+        "single_flight": single_flight.stats() if single_flight is not None else None,
+    }
 
 
 if __name__ == "__main__":
@@ -3,6 +3,12 @@ from typing import Callable
 from llama_index.core.tools import FunctionTool
 from llama_index.llms.openai_like import OpenAILike
 
+from llama_index_workflow_agent_base.memory import LLM_CONTEXT_WINDOW
+from llama_index_workflow_agent_base.single_flight import (
+    llm_async_http_client,
+    llm_connection_limits,
+    llm_http_client,
+)
 from llama_index_workflow_agent_base.utils import get_env_var
 from llama_index_workflow_agent_base.tools import dummy_web_search
 from llama_index_workflow_agent_base.workflow import FunctionCallingAgent
@@ -12,8 +18,19 @@ def get_workflow_closure(
     model_id: str = None,
     base_url: str = None,
     api_key: str = None,
+    max_connections: int | None = None,
+    max_keepalive_connections: int | None = None,
+    context_window: int | None = None,
+    reserved_output_tokens: int | None = None,
 ) -> Callable:
-    """Workflow generator closure."""
+    """Workflow generator closure.
+
+    Builds the tools and the OpenAILike client (with its connection pool) once;
+    call it once per process and reuse the returned get_agent for every request.
+    Pool limits left out come from LLM_MAX_CONNECTIONS / LLM_MAX_KEEPALIVE_CONNECTIONS;
+    the context window and the tokens kept free for the answer from LLM_CONTEXT_WINDOW /
+    MEMORY_RESERVED_OUTPUT_TOKENS.
+    """
 
     if not api_key:
         api_key = get_env_var("API_KEY")
@@ -29,8 +46,9 @@ def get_workflow_closure(
 
     tools = [FunctionTool.from_defaults(dummy_web_search)]
     default_system_prompt = "You are a helpful AI assistant, please respond to the user's query to the best of your ability!"
-    context_window = 4096
+    context_window = context_window or LLM_CONTEXT_WINDOW
 
+    limits = llm_connection_limits(max_connections, max_keepalive_connections)
     client = OpenAILike(
         model=model_id,
         api_key=api_key,
@@ -38,17 +56,25 @@ def get_workflow_closure(
         context_window=context_window,  # Bypass model name validation for custom models
         is_chat_model=True,  # Use chat completions endpoint instead of completions
         is_function_calling_model=True,  # Enable function calling/tools support
+        # Responses are streamed; ask for the token usage in the last chunk
+        additional_kwargs={"stream_options": {"include_usage": True}},
+        # Pooled client; coalesces identical in-flight requests and serves cached completions
+        http_client=llm_http_client(limits),
+        async_http_client=llm_async_http_client(limits),
     )
 
-    def get_agent(system_prompt: str = default_system_prompt) -> FunctionCallingAgent:
-        """Get compiled workflow with overwritten system prompt, if provided"""
+    def get_agent(
+        system_prompt: str = default_system_prompt, timeout: float | None = 120
+    ) -> FunctionCallingAgent:
+        """Get compiled workflow with overwritten system prompt and run timeout, if provided"""
 
         # Create instance of compiled workflow
         return FunctionCallingAgent(
             llm=client,
             tools=tools,
             system_prompt=system_prompt,
-            timeout=120,
+            reserved_output_tokens=reserved_output_tokens,
+            timeout=timeout,
             verbose=False,
         )
 
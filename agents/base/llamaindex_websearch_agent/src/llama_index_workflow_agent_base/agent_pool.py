@@ -0,0 +1,130 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from llama_index_workflow_agent_base.workflow import FunctionCallingAgent
+
+# Idle workflow instances kept for reuse, over all system prompts (0 disables pooling)
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", 32))
+
+
+class AgentLease:
+    """One checked-out workflow instance. release() is idempotent so it can be called from several cleanup paths."""
+
+    def __init__(
+        self, pool: "AgentPool", key: str | None, agent: FunctionCallingAgent
+    ) -> None:
+        self._pool = pool
+        self._key = key
+        self.agent = agent
+        self._released = False
+
+    def release(self, reusable: bool = True) -> None:
+        """Give the instance back; pass reusable=False if its run did not finish cleanly."""
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._key, self.agent, reusable)
+
+
+class AgentPool:
+    """Bounded pool of FunctionCallingAgent instances, keyed by system prompt.
+
+    Building a workflow instance (memory, step registry and validation) is paid
+    once per pooled instance instead of once per request. An instance is checked
+    out by exactly one run at a time and reset (memory back to its system prompt,
+    sources and run contexts cleared) when it is given back. Checkout never
+    waits: without an idle instance for the prompt a new one is built (admission
+    control bounds concurrency). At most max_idle instances are kept; beyond that
+    those of the least recently used prompts are dropped.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[..., FunctionCallingAgent],
+        max_idle: int = AGENT_POOL_SIZE,
+    ) -> None:
+        self._factory = factory
+        self.max_idle = max_idle
+        # system prompt (None for the default one) -> idle instances; least recently used first
+        self._idle: OrderedDict[str | None, list[FunctionCallingAgent]] = OrderedDict()
+        self._n_idle = 0
+        self._lock = threading.Lock()
+
+        self.created_total = 0
+        self.reused_total = 0
+        self.discarded_total = 0
+
+    def acquire(
+        self, system_prompt: str | None = None, timeout: float | None = 120
+    ) -> AgentLease:
+        """Check out an instance for system_prompt (the factory's default if None)."""
+        agent = None
+        with self._lock:
+            idle = self._idle.get(system_prompt)
+            if idle:
+                agent = idle.pop()
+                self._n_idle -= 1
+                if idle:
+                    self._idle.move_to_end(system_prompt)
+                else:
+                    del self._idle[system_prompt]
+                self.reused_total += 1
+            else:
+                self.created_total += 1
+
+        if agent is None:
+            if system_prompt is None:
+                agent = self._factory(timeout=timeout)
+            else:
+                agent = self._factory(system_prompt, timeout=timeout)
+        else:
+            agent.set_timeout(timeout)
+        return AgentLease(self, system_prompt, agent)
+
+    def _release(
+        self, key: str | None, agent: FunctionCallingAgent, reusable: bool
+    ) -> None:
+        """Reset an instance and keep it for reuse, or drop it."""
+        if not reusable or self.max_idle <= 0:
+            with self._lock:
+                self.discarded_total += 1
+            return
+        agent.reset()
+        with self._lock:
+            self._idle.setdefault(key, []).append(agent)
+            self._idle.move_to_end(key)
+            self._n_idle += 1
+            while self._n_idle > self.max_idle:
+                oldest_key, oldest = next(iter(self._idle.items()))
+                oldest.pop(0)
+                if not oldest:
+                    del self._idle[oldest_key]
+                self._n_idle -= 1
+                self.discarded_total += 1
+
+    @contextmanager
+    def checkout(
+        self, system_prompt: str | None = None, timeout: float | None = 120
+    ) -> Iterator[FunctionCallingAgent]:
+        """Context manager holding one instance; it is not reused if the block raises."""
+        lease = self.acquire(system_prompt, timeout=timeout)
+        try:
+            yield lease.agent
+        except BaseException:
+            lease.release(reusable=False)
+            raise
+        lease.release()
+
+    def stats(self) -> dict:
+        """Idle instances and counters (for /health)."""
+        return {
+            "idle": self._n_idle,
+            "max_idle": self.max_idle,
+            "prompts": len(self._idle),
+            "created_total": self.created_total,
+            "reused_total": self.reused_total,
+            "discarded_total": self.discarded_total,
+        }
@@ -0,0 +1,161 @@
+import os
+from collections import deque
+from typing import Callable
+
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.llms.llm import LLM
+from llama_index.core.utils import get_tokenizer
+
+# Context window of the LLM (tokens), shared by the prompt and the answer
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", 4096))
+
+# Part of the context window kept free for the answer (tokens)
+MEMORY_RESERVED_OUTPUT_TOKENS = int(os.getenv("MEMORY_RESERVED_OUTPUT_TOKENS", 1024))
+
+# Per-message framing added by chat templates (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenBudgetMemory:
+    """Chat memory bounded by a token budget, with token counts cached per message.
+
+    Each message is tokenized once, when it is put, and the total is kept up to
+    date, so get() never recounts the history. Once the total exceeds token_limit
+    the oldest messages are dropped for good (each message is dropped at most
+    once, so trimming is O(1) amortized per put). System messages are pinned: they
+    count against the budget but are never dropped. Messages are dropped a whole
+    turn (a user message and the assistant and tool messages answering it) at a
+    time, so the history never starts with an assistant or tool message. When the
+    last turn alone is over budget its older steps (an assistant message and the
+    tool results answering it) are dropped, keeping its user message and newest
+    step; if those still do not fit, put() raises ValueError rather than let the
+    prompt overflow the context window.
+    """
+
+    def __init__(
+        self, token_limit: int, tokenizer_fn: Callable[[str], list] | None = None
+    ) -> None:
+        if token_limit <= 0:
+            raise ValueError("token_limit must be positive")
+        self.token_limit = token_limit
+        self.tokenizer_fn = tokenizer_fn or get_tokenizer()
+        self._system: list[ChatMessage] = []
+        # Steps, oldest first: a user or assistant message with the tool results that
+        # follow it, as [tokens, [message, ...]]
+        self._steps: deque[list] = deque()
+        # Steps starting with a user message (each starts a turn)
+        self._user_steps = 0
+        self._total = 0
+
+    @classmethod
+    def from_defaults(
+        cls,
+        llm: LLM | None = None,
+        context_window: int | None = None,
+        reserved_output_tokens: int | None = None,
+        tokenizer_fn: Callable[[str], list] | None = None,
+    ) -> "TokenBudgetMemory":
+        """Memory for an LLM; arguments left out come from the LLM and the env vars.
+
+        The budget is the context window (context_window, else the LLM's, else
+        LLM_CONTEXT_WINDOW) minus the tokens reserved for the answer
+        (reserved_output_tokens, else MEMORY_RESERVED_OUTPUT_TOKENS).
+        """
+        if context_window is None:
+            context_window = (
+                llm.metadata.context_window if llm is not None else LLM_CONTEXT_WINDOW
+            )
+        if reserved_output_tokens is None:
+            reserved_output_tokens = MEMORY_RESERVED_OUTPUT_TOKENS
+        if reserved_output_tokens >= context_window:
+            raise ValueError(
+                f"reserved_output_tokens ({reserved_output_tokens}) must be smaller "
+                f"than the context window ({context_window})"
+            )
+        return cls(context_window - reserved_output_tokens, tokenizer_fn=tokenizer_fn)
+
+    @property
+    def total_tokens(self) -> int:
+        """Tokens of the messages currently in memory (system messages included)."""
+        return self._total
+
+    def count_tokens(self, message: ChatMessage) -> int:
+        """Tokens of one message: its text, tool-call arguments and framing."""
+        parts = [message.content or ""]
+        for block in message.blocks:
+            tool_kwargs = getattr(block, "tool_kwargs", None)
+            if tool_kwargs is not None:
+                parts.append(f"{getattr(block, 'tool_name', '')} {tool_kwargs}")
+        tool_calls = message.additional_kwargs.get("tool_calls")
+        if tool_calls:
+            parts.append(str(tool_calls))
+        return len(self.tokenizer_fn(" ".join(parts))) + MESSAGE_OVERHEAD_TOKENS
+
+    def put(self, message: ChatMessage) -> None:
+        """Add a message, dropping the oldest ones if the budget is exceeded."""
+        tokens = self.count_tokens(message)
+        self._total += tokens
+        if message.role == MessageRole.SYSTEM:
+            # Pinned: counted in the total, never trimmed
+            self._system.append(message)
+        elif message.role == MessageRole.TOOL and self._steps:
+            step = self._steps[-1]
+            step[0] += tokens
+            step[1].append(message)
+        else:
+            self._steps.append([tokens, [message]])
+            if message.role == MessageRole.USER:
+                self._user_steps += 1
+        self._trim()
+
+    def _is_user_step(self, step: list) -> bool:
+        return step[1][0].role == MessageRole.USER
+
+    def _pop(self) -> None:
+        step = self._steps.popleft()
+        self._total -= step[0]
+        if self._is_user_step(step):
+            self._user_steps -= 1
+
+    def _trim(self) -> None:
+        # Whole turns are dropped, oldest first, while a later turn starts past the first step
+        while self._total > self.token_limit and (
+            self._user_steps > 1
+            or (self._user_steps == 1 and not self._is_user_step(self._steps[0]))
+        ):
+            self._pop()
+            while not self._is_user_step(self._steps[0]):
+                self._pop()
+        if self._total <= self.token_limit:
+            return
+
+        # Only the last turn is left: drop its older steps, keeping its first message
+        # (the question) and its newest step
+        while self._total > self.token_limit and len(self._steps) > 2:
+            first = self._steps.popleft()
+            self._total -= self._steps.popleft()[0]
+            self._steps.appendleft(first)
+        if self._total > self.token_limit:
+            raise ValueError(
+                f"conversation needs {self._total} tokens, over the memory budget of "
+                f"{self.token_limit} even with the last turn cut down to its first "
+                "message and newest step"
+            )
+
+    def get(self) -> list[ChatMessage]:
+        """The history to send to the LLM (a new list, safe to extend)."""
+        history = list(self._system)
+        for _, messages in self._steps:
+            history.extend(messages)
+        return history
+
+    def get_all(self) -> list[ChatMessage]:
+        """Same as get(): dropped messages are not kept."""
+        return self.get()
+
+    def reset(self) -> None:
+        """Forget every message, system messages included."""
+        self._system = []
+        self._steps.clear()
+        self._user_steps = 0
+        self._total = 0
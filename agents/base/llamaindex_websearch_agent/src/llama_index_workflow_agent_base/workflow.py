@@ -1,9 +1,14 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, List
 
 from llama_index.core.llms import ChatMessage
 from llama_index.core.llms.function_calling import FunctionCallingLLM
-from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.core.tools import ToolSelection
+from llama_index.core.tools import ToolOutput, ToolSelection
 from llama_index.core.tools.types import BaseTool
 from llama_index.core.workflow import (
     Workflow,
@@ -14,6 +19,74 @@ from llama_index.core.workflow import (
     step,
 )
 
+from llama_index_workflow_agent_base.deadlines import (
+    RequestAborted,
+    check_deadline,
+    remaining_time,
+)
+from llama_index_workflow_agent_base.memory import TokenBudgetMemory
+
+# Upper bound for a single tool call (seconds); the request deadline may shorten it
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", 30))
+
+# Threads running synchronous tools, shared by all workflows of the process
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", 8))
+
+_tool_executor = ThreadPoolExecutor(
+    max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool"
+)
+
+
+# Fields of OpenAI-style input messages kept besides role and content (replayed tool calls)
+_MESSAGE_FIELDS = ("tool_calls", "tool_call_id", "name")
+
+
+def _input_message(message: dict) -> ChatMessage:
+    """ChatMessage for one OpenAI-style input message.
+
+    List content (UI payloads send content parts) keeps the text of its "text"
+    parts; other parts, such as images, are skipped. Tool-call fields go to
+    additional_kwargs, so replayed tool calls and results reach the LLM intact.
+    """
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = "\n".join(
+            part.get("text", "") for part in content if part.get("type") == "text"
+        )
+    additional_kwargs = {
+        field: message[field] for field in _MESSAGE_FIELDS if message.get(field) is not None
+    }
+    return ChatMessage(
+        role=message["role"], content=content, additional_kwargs=additional_kwargs
+    )
+
+
+async def _call_tool(tool: BaseTool, kwargs: dict) -> ToolOutput:
+    """Run a tool without blocking the event loop, bounded by the tool timeout.
+
+    Tools with a native async implementation are awaited through acall; plain
+    functions run on the bounded tool thread pool (with the caller's context, so
+    request deadlines and instrumentation spans carry over).
+    """
+    timeout = TOOL_TIMEOUT_SECONDS
+    remaining = remaining_time()
+    if remaining is not None:
+        timeout = min(timeout, remaining)
+
+    if inspect.iscoroutinefunction(getattr(tool, "real_fn", None)):
+        call = tool.acall(**kwargs)
+    else:
+        context = contextvars.copy_context()
+        call = asyncio.get_running_loop().run_in_executor(
+            _tool_executor, functools.partial(context.run, tool, **kwargs)
+        )
+    try:
+        return await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        # Out of request time rather than tool time: stop the run
+        check_deadline()
+        raise TimeoutError(f"timed out after {timeout:g}s") from None
+
 
 class InputEvent(Event):
     input: list[ChatMessage]
@@ -23,6 +96,23 @@ class ToolCallEvent(Event):
     tool_calls: list[ToolSelection]
 
 
+# Stream-only events carrying just what a step added to the history, so streaming a
+# long conversation does not copy (and rescan) the whole history at every step;
+# InputEvent, with the full history, only goes to the LLM step.
+
+
+class TextDeltaEvent(Event):
+    delta: str
+
+
+class AssistantMessageEvent(Event):
+    message: ChatMessage
+
+
+class ToolResultsEvent(Event):
+    messages: list[ChatMessage]
+
+
 class FunctionCallingAgent(Workflow):
     def __init__(
         self,
@@ -30,20 +120,42 @@ class FunctionCallingAgent(Workflow):
         llm: FunctionCallingLLM | None = None,
         tools: List[BaseTool] | None = None,
         system_prompt: str | None = None,
+        context_window: int | None = None,
+        reserved_output_tokens: int | None = None,
         **kwargs: Any,
     ) -> None:
         super().__init__(*args, **kwargs)
         self.tools = tools or []
 
         self.llm = llm
-        self.memory = ChatMemoryBuffer.from_defaults(llm=self.llm)
+        # Token counts are cached per message, so long sessions do not slow down each turn
+        self.memory = TokenBudgetMemory.from_defaults(
+            llm=self.llm,
+            context_window=context_window,
+            reserved_output_tokens=reserved_output_tokens,
+        )
 
-        if system_prompt:
-            system_msg = ChatMessage(role="system", content=system_prompt)
+        self.system_prompt = system_prompt
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget previous runs: memory back to the system prompt, no sources, no run contexts."""
+        self.memory.reset()
+        if self.system_prompt:
+            system_msg = ChatMessage(role="system", content=self.system_prompt)
             self.memory.put(system_msg)
 
         self.sources = []
 
+        # Some Workflow versions keep a reference to the context of every run
+        contexts = getattr(self, "_contexts", None)
+        if contexts is not None:
+            contexts.clear()
+
+    def set_timeout(self, timeout: float | None) -> None:
+        """Change the timeout of the next runs (read by Workflow.run)."""
+        self._timeout = timeout
+
     @step
     async def prepare_chat_history(self, ctx: Context, ev: StartEvent) -> InputEvent:
 
@@ -54,12 +166,7 @@ class FunctionCallingAgent(Workflow):
         user_input_messages = ev.input
 
         for user_input in user_input_messages:
-            content = (
-                user_input["content"][0]["text"]
-                if isinstance(user_input["content"], list)
-                else user_input["content"]
-            )  # Ensures compatibility with UI payloads, which may send content as a list of dictionaries containing 'type' and 'text' keys.
-            self.memory.put(ChatMessage(role=user_input["role"], content=content))
+            self.memory.put(_input_message(user_input))
 
         chat_history = self.memory.get()
         return InputEvent(input=chat_history)
@@ -69,13 +176,32 @@ class FunctionCallingAgent(Workflow):
         self, ctx: Context, ev: InputEvent
     ) -> ToolCallEvent | StopEvent:
 
-        ctx.write_event_to_stream(ev)
-
         chat_history = ev.input
-        response = await self.llm.achat_with_tools(
-            self.tools, chat_history=chat_history
+
+        # Bound the LLM call by the remaining time of the current request (if any)
+        check_deadline()
+        remaining = remaining_time()
+        llm_kwargs = {"timeout": remaining} if remaining is not None else {}
+
+        # Streamed, so answer text reaches the event stream as the backend produces it; the
+        # last response holds the whole message, with the tool-call fragments accumulated
+        response = None
+        finish_reason = None
+        stream = await self.llm.astream_chat_with_tools(
+            self.tools, chat_history=chat_history, **llm_kwargs
         )
+        async for response in stream:
+            if response.delta:
+                ctx.write_event_to_stream(TextDeltaEvent(delta=response.delta))
+            # The last chunk may carry only the token usage
+            choices = getattr(response.raw, "choices", None)
+            if choices and choices[0].finish_reason:
+                finish_reason = choices[0].finish_reason
+        if response is None:
+            raise ValueError("LLM returned an empty stream")
+
         self.memory.put(response.message)
+        ctx.write_event_to_stream(AssistantMessageEvent(message=response.message))
 
         tool_calls = self.llm.get_tool_calls_from_response(
             response, error_on_no_tool_call=False
@@ -84,7 +210,13 @@ class FunctionCallingAgent(Workflow):
         chat_history.append(response.message)
 
         if not tool_calls:
-            return StopEvent(result={"response": response, "messages": chat_history})
+            return StopEvent(
+                result={
+                    "response": response,
+                    "messages": chat_history,
+                    "finish_reason": finish_reason,
+                }
+            )
         else:
             return ToolCallEvent(tool_calls=tool_calls)
 
@@ -96,9 +228,9 @@ class FunctionCallingAgent(Workflow):
         tool_calls = ev.tool_calls
         tools_by_name = {tool.metadata.get_name(): tool for tool in self.tools}
 
-        tool_msgs = []
+        check_deadline()
 
-        for tool_call in tool_calls:
+        async def run(tool_call: ToolSelection) -> tuple[ChatMessage, ToolOutput | None]:
             tool = tools_by_name.get(tool_call.tool_name)
             if not tool:
                 # Tool doesn't exist - use tool_call name for additional_kwargs
@@ -106,14 +238,14 @@ class FunctionCallingAgent(Workflow):
                     "tool_call_id": tool_call.tool_id,
                     "name": tool_call.tool_name,
                 }
-                tool_msgs.append(
+                return (
                     ChatMessage(
                         role="tool",
                         content=f"Tool {tool_call.tool_name} does not exist",
                         additional_kwargs=additional_kwargs,
-                    )
+                    ),
+                    None,
                 )
-                continue
 
             # Tool exists - use tool metadata for additional_kwargs
             additional_kwargs = {
@@ -122,26 +254,39 @@ class FunctionCallingAgent(Workflow):
             }
 
             try:
-                tool_output = tool(**tool_call.tool_kwargs)
-                self.sources.append(tool_output)
-                tool_msgs.append(
-                    ChatMessage(
-                        role="tool",
-                        content=tool_output.content,
-                        additional_kwargs=additional_kwargs,
-                    )
-                )
+                tool_output = await _call_tool(tool, tool_call.tool_kwargs)
+            except RequestAborted:
+                raise
             except Exception as e:
-                tool_msgs.append(
+                return (
                     ChatMessage(
                         role="tool",
                         content=f"Encountered error in tool call: {e}",
                         additional_kwargs=additional_kwargs,
-                    )
+                    ),
+                    None,
                 )
+            return (
+                ChatMessage(
+                    role="tool",
+                    content=tool_output.content,
+                    additional_kwargs=additional_kwargs,
+                ),
+                tool_output,
+            )
+
+        # All tool calls of the turn run concurrently; results keep the call order
+        results = await asyncio.gather(*(run(tool_call) for tool_call in tool_calls))
+
+        tool_msgs = []
+        for msg, tool_output in results:
+            tool_msgs.append(msg)
+            if tool_output is not None:
+                self.sources.append(tool_output)
 
         for msg in tool_msgs:
             self.memory.put(msg)
+        ctx.write_event_to_stream(ToolResultsEvent(messages=tool_msgs))
 
         chat_history = self.memory.get()
         return InputEvent(input=chat_history)
@@ -0,0 +1,122 @@
+import sys
+import os
+import asyncio
+import random
+
+import pytest
+from llama_index.core.base.llms.types import ToolCallBlock
+from llama_index.core.llms import ChatMessage
+from llama_index.core.llms.mock import MockFunctionCallingLLM
+from llama_index.core.tools import FunctionTool
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.llama_index_workflow_agent_base.agent_pool import AgentPool
+from src.llama_index_workflow_agent_base.workflow import FunctionCallingAgent
+
+
+async def lookup(query: str) -> str:
+    """Async lookup answering after a random delay, so concurrent runs interleave."""
+    await asyncio.sleep(random.uniform(0, 0.02))
+    return f"result {query}"
+
+
+def _respond(messages, **kwargs) -> ChatMessage:
+    """Look the user's question up, then answer with everything seen in the history."""
+    if messages[-1].role == "tool":
+        seen = [m.content for m in messages if m.role in ("user", "tool")]
+        return ChatMessage(role="assistant", content=" | ".join(seen))
+    block = ToolCallBlock(
+        tool_call_id="call_0", tool_name="lookup", tool_kwargs={"query": messages[-1].content}
+    )
+    return ChatMessage(role="assistant", blocks=[block])
+
+
+def _pool(max_idle: int = 4) -> AgentPool:
+    llm = MockFunctionCallingLLM(response_generator=_respond, is_chat_model=True)
+    tools = [FunctionTool.from_defaults(lookup)]
+
+    def get_agent(system_prompt: str = "default prompt", timeout: float | None = 120):
+        return FunctionCallingAgent(
+            llm=llm, tools=tools, system_prompt=system_prompt, timeout=timeout
+        )
+
+    return AgentPool(get_agent, max_idle=max_idle)
+
+
+def test_concurrent_runs_do_not_share_state():
+    """Stress test: many overlapping runs on few pooled instances see only their own messages."""
+    pool = _pool(max_idle=4)
+    prompts = [None, "prompt a", "prompt b"]
+
+    async def one_run(i: int) -> None:
+        system_prompt = prompts[i % len(prompts)]
+        question = f"question {i}"
+        with pool.checkout(system_prompt) as agent:
+            result = await agent.run(input=[{"role": "user", "content": question}])
+            sources = [source.content for source in agent.sources]
+
+        history = result["messages"]
+        assert history[0].role == "system"
+        assert history[0].content == (system_prompt or "default prompt")
+        assert [m.content for m in history if m.role == "user"] == [question]
+        assert history[-1].content == f"{question} | result {question}"
+        assert sources == [f"result {question}"]
+
+    async def run_all() -> None:
+        for _ in range(5):
+            await asyncio.gather(*(one_run(i) for i in range(60)))
+
+    asyncio.run(run_all())
+
+    stats = pool.stats()
+    assert stats["reused_total"] > 0
+    assert stats["idle"] <= 4
+    assert stats["created_total"] + stats["reused_total"] == 300
+
+
+def test_released_instance_is_reset_and_reused():
+    """Test that an instance comes back with only its system prompt, for the same prompt only."""
+    pool = _pool()
+
+    async def run(agent: FunctionCallingAgent) -> None:
+        await agent.run(input=[{"role": "user", "content": "question"}])
+
+    with pool.checkout("prompt a", timeout=10) as agent:
+        asyncio.run(run(agent))
+        assert len(agent.memory.get()) > 1
+
+    assert [m.content for m in agent.memory.get()] == ["prompt a"]
+    assert agent.sources == []
+
+    with pool.checkout("prompt b") as other:
+        assert other is not agent
+    with pool.checkout("prompt a") as again:
+        assert again is agent
+
+
+def test_failed_run_is_not_reused_and_idle_is_bounded():
+    """Test that an instance is dropped when its block raises, and that idle instances are capped."""
+    pool = _pool(max_idle=2)
+
+    with pytest.raises(RuntimeError):
+        with pool.checkout() as agent:
+            raise RuntimeError("run failed")
+    with pool.checkout() as other:
+        assert other is not agent
+
+    leases = [pool.acquire(f"prompt {i}") for i in range(4)]
+    for lease in leases:
+        lease.release()
+        lease.release()  # idempotent
+
+    stats = pool.stats()
+    assert stats["idle"] == 2
+    assert stats["prompts"] == 2
+    # The two least recently used prompts were dropped
+    assert pool.acquire("prompt 3").agent is leases[3].agent
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,136 @@
+import sys
+import os
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from llama_index.llms.openai_like import OpenAILike
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import main
+from llama_index_workflow_agent_base.agent_pool import AgentPool
+from llama_index_workflow_agent_base.workflow import FunctionCallingAgent
+
+
+def _chunk(delta: dict, finish_reason: str | None = None) -> str:
+    chunk = {
+        "id": "chatcmpl-test",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "test-model",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+def _truncating_llm(bodies: list) -> OpenAILike:
+    """LLM whose answer is cut off by the output token limit (finish_reason "length").
+
+    The body of every request it sends upstream is recorded in bodies.
+    """
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(json.loads(request.content))
+        body = _chunk({"role": "assistant", "content": "A Lenovo laptop costs"})
+        body += _chunk({}, finish_reason="length") + "data: [DONE]\n\n"
+        return httpx.Response(
+            200, headers={"Content-Type": "text/event-stream"}, content=body.encode()
+        )
+
+    return OpenAILike(
+        model="test-model",
+        api_key="test",
+        api_base="http://llm/v1",
+        context_window=4096,
+        is_chat_model=True,
+        is_function_calling_model=True,
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+        async_http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+
+@pytest.fixture
+def bodies() -> list:
+    return []
+
+
+@pytest.fixture
+def client(monkeypatch, bodies) -> TestClient:
+    llm = _truncating_llm(bodies)
+
+    def get_agent(system_prompt: str | None = None, timeout: float | None = 120):
+        return FunctionCallingAgent(
+            llm=llm, tools=[], system_prompt=system_prompt, timeout=timeout
+        )
+
+    monkeypatch.setattr(main, "get_agent", get_agent)
+    monkeypatch.setattr(main, "agent_pool", AgentPool(get_agent))
+    monkeypatch.setattr(main, "served_model_id", "test-model")
+    return TestClient(main.app)
+
+
+def test_chat_reports_truncated_answer(client):
+    """Test that /chat passes on the upstream finish_reason instead of always "stop"."""
+    response = client.post("/chat", json={"message": "How much is a Lenovo laptop?"})
+
+    assert response.status_code == 200
+    assert response.json()["finish_reason"] == "length"
+
+
+def test_chat_completions_report_truncated_answer(client):
+    """Test that /v1/chat/completions passes on finish_reason "length", streamed or not."""
+    request = {"messages": [{"role": "user", "content": "How much is a Lenovo laptop?"}]}
+
+    response = client.post("/v1/chat/completions", json=request)
+    assert response.status_code == 200
+    choice = response.json()["choices"][0]
+    assert choice["finish_reason"] == "length"
+    assert choice["message"]["content"] == "A Lenovo laptop costs"
+
+    response = client.post("/v1/chat/completions", json={**request, "stream": True})
+    frames = [
+        json.loads(line.removeprefix("data: "))
+        for line in response.text.splitlines()
+        if line.startswith("data: {")
+    ]
+    assert frames[-1]["choices"][0]["finish_reason"] == "length"
+
+
+def test_chat_completions_replay_tool_calls_and_content_parts(client, bodies):
+    """Test that replayed tool calls keep their ids and that only text content parts are sent."""
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": "http://images/laptop.png"}},
+                {"type": "text", "text": "Which laptop is this?"},
+            ],
+        },
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": "call_1",
+                    "type": "function",
+                    "function": {"name": "dummy_web_search", "arguments": '{"query": "laptop"}'},
+                }
+            ],
+        },
+        {"role": "tool", "tool_call_id": "call_1", "name": "dummy_web_search", "content": "Lenovo"},
+    ]
+
+    response = client.post("/v1/chat/completions", json={"messages": messages})
+
+    assert response.status_code == 200
+    sent = [m for m in bodies[0]["messages"] if m["role"] != "system"]
+    assert sent[0]["content"] == "Which laptop is this?"
+    assert sent[1]["tool_calls"][0]["id"] == "call_1"
+    assert sent[2]["tool_call_id"] == "call_1"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,118 @@
+import sys
+import os
+
+import pytest
+from llama_index.core.llms import ChatMessage
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.llama_index_workflow_agent_base.memory import (
+    MESSAGE_OVERHEAD_TOKENS,
+    TokenBudgetMemory,
+)
+
+
+class CountingTokenizer:
+    """Whitespace tokenizer counting how many times it is called."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text: str) -> list[str]:
+        self.calls += 1
+        return text.split()
+
+
+def _tokens(words: int) -> int:
+    return words + MESSAGE_OVERHEAD_TOKENS
+
+
+def test_messages_are_tokenized_once():
+    """Test that get() reuses the token counts cached by put()."""
+    tokenizer = CountingTokenizer()
+    memory = TokenBudgetMemory(token_limit=1000, tokenizer_fn=tokenizer)
+    for i in range(10):
+        memory.put(ChatMessage(role="user", content=f"message {i}"))
+
+    for _ in range(5):
+        assert len(memory.get()) == 10
+    assert tokenizer.calls == 10
+    assert memory.total_tokens == 10 * _tokens(2)
+
+
+def test_oldest_messages_are_dropped_and_system_prompt_kept():
+    """Test that the budget drops the oldest messages but never the system prompt."""
+    memory = TokenBudgetMemory(token_limit=4 * _tokens(2), tokenizer_fn=str.split)
+    memory.put(ChatMessage(role="system", content="be helpful"))
+    for i in range(6):
+        memory.put(ChatMessage(role="user", content=f"question {i}"))
+
+    history = memory.get()
+    assert history[0].content == "be helpful"
+    assert [m.content for m in history[1:]] == ["question 3", "question 4", "question 5"]
+    assert memory.total_tokens == 4 * _tokens(2)
+
+
+def test_trimmed_history_does_not_start_with_tool_results():
+    """Test that a trim does not leave tool results without their assistant turn."""
+    memory = TokenBudgetMemory(token_limit=3 * _tokens(2), tokenizer_fn=str.split)
+    memory.put(ChatMessage(role="user", content="first question"))
+    memory.put(ChatMessage(role="assistant", content="calling tool"))
+    memory.put(ChatMessage(role="tool", content="tool result"))
+    memory.put(ChatMessage(role="user", content="second question"))
+
+    assert [m.role for m in memory.get()] == ["user"]
+    assert memory.total_tokens == _tokens(2)
+
+
+def test_over_budget_turn_drops_its_older_steps():
+    """Test that a last turn over budget keeps its question and newest step whole."""
+    memory = TokenBudgetMemory(token_limit=7 * _tokens(2), tokenizer_fn=str.split)
+    memory.put(ChatMessage(role="system", content="be helpful"))
+    memory.put(ChatMessage(role="user", content="first question"))
+    memory.put(ChatMessage(role="assistant", content="first answer"))
+    memory.put(ChatMessage(role="user", content="second question"))
+    memory.put(ChatMessage(role="assistant", content="calling tools"))
+    memory.put(ChatMessage(role="tool", content="first result"))
+    memory.put(ChatMessage(role="assistant", content="calling again"))
+    memory.put(ChatMessage(role="tool", content="small result"))
+    memory.put(ChatMessage(role="tool", content=" ".join(["word"] * 10)))
+
+    # The older turn and the first tool call of the current one are gone
+    history = memory.get()
+    assert [m.content for m in history[:3]] == ["be helpful", "second question", "calling again"]
+    assert [m.role for m in history[3:]] == ["tool", "tool"]
+    assert memory.total_tokens == 4 * _tokens(2) + _tokens(10)
+
+
+def test_turn_that_cannot_fit_raises():
+    """Test that a question with a step too large for the budget raises instead of overflowing."""
+    memory = TokenBudgetMemory(token_limit=4 * _tokens(2), tokenizer_fn=str.split)
+    memory.put(ChatMessage(role="user", content="a question"))
+    memory.put(ChatMessage(role="assistant", content="calling tools"))
+
+    with pytest.raises(ValueError, match="memory budget"):
+        memory.put(ChatMessage(role="tool", content=" ".join(["word"] * 50)))
+
+
+def test_get_returns_a_new_list():
+    """Test that extending the returned history does not change the memory."""
+    memory = TokenBudgetMemory(token_limit=100, tokenizer_fn=str.split)
+    memory.put(ChatMessage(role="user", content="hello"))
+
+    memory.get().append(ChatMessage(role="assistant", content="hi"))
+    assert len(memory.get()) == 1
+
+
+def test_from_defaults_reserves_output_tokens():
+    """Test that the budget is the context window minus the reserved output tokens."""
+    memory = TokenBudgetMemory.from_defaults(context_window=8192, reserved_output_tokens=1024)
+    assert memory.token_limit == 7168
+
+    with pytest.raises(ValueError):
+        TokenBudgetMemory.from_defaults(context_window=1024, reserved_output_tokens=1024)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
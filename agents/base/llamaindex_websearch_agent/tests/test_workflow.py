@@ -0,0 +1,129 @@
+import sys
+import os
+import asyncio
+import time
+
+import pytest
+from llama_index.core.base.llms.types import ToolCallBlock
+from llama_index.core.llms import ChatMessage
+from llama_index.core.llms.mock import MockFunctionCallingLLM
+from llama_index.core.tools import FunctionTool
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.llama_index_workflow_agent_base import workflow
+from src.llama_index_workflow_agent_base.workflow import (
+    AssistantMessageEvent,
+    FunctionCallingAgent,
+    InputEvent,
+    TextDeltaEvent,
+    ToolResultsEvent,
+)
+
+
+def slow_sync_search(query: str) -> str:
+    """Blocking search taking 0.3s."""
+    time.sleep(0.3)
+    return f"sync {query}"
+
+
+async def slow_async_search(query: str) -> str:
+    """Async search taking 0.3s."""
+    await asyncio.sleep(0.3)
+    return f"async {query}"
+
+
+def hanging_search(query: str) -> str:
+    """Search that never answers in time."""
+    time.sleep(2)
+    return "too late"
+
+
+TOOL_NAMES = ["slow_sync_search", "slow_async_search", "hanging_search", "missing", "slow_sync_search"]
+
+
+def _llm() -> MockFunctionCallingLLM:
+    """LLM requesting all tools in one turn, then answering."""
+
+    def respond(messages, **kwargs) -> ChatMessage:
+        if messages[-1].role == "tool":
+            return ChatMessage(role="assistant", content="done")
+        blocks = [
+            ToolCallBlock(tool_call_id=f"call_{i}", tool_name=name, tool_kwargs={"query": str(i)})
+            for i, name in enumerate(TOOL_NAMES)
+        ]
+        return ChatMessage(role="assistant", blocks=blocks)
+
+    return MockFunctionCallingLLM(response_generator=respond, is_chat_model=True)
+
+
+def test_tool_calls_of_a_turn_run_concurrently_in_order(monkeypatch):
+    """Test that one turn's tool calls overlap, time out individually and keep their order."""
+    monkeypatch.setattr(workflow, "TOOL_TIMEOUT_SECONDS", 0.6)
+    tools = [
+        FunctionTool.from_defaults(fn)
+        for fn in (slow_sync_search, slow_async_search, hanging_search)
+    ]
+    agent = FunctionCallingAgent(llm=_llm(), tools=tools, timeout=10)
+
+    async def run():
+        return await agent.run(input=[{"role": "user", "content": "search"}])
+
+    start = time.perf_counter()
+    result = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    tool_msgs = [m for m in result["messages"] if m.role == "tool"]
+    assert [m.additional_kwargs["tool_call_id"] for m in tool_msgs] == [
+        f"call_{i}" for i in range(len(TOOL_NAMES))
+    ]
+    assert [m.content for m in tool_msgs] == [
+        "sync 0",
+        "async 1",
+        "Encountered error in tool call: timed out after 0.6s",
+        "Tool missing does not exist",
+        "sync 4",
+    ]
+    # Sequential execution would take 0.3 * 3 + 0.6
+    assert elapsed < 1.2
+
+
+def test_stream_carries_only_new_messages():
+    """Test that the event stream gets history deltas instead of full InputEvent copies."""
+    tools = [FunctionTool.from_defaults(slow_async_search)]
+
+    def respond(messages, **kwargs) -> ChatMessage:
+        if messages[-1].role == "tool":
+            return ChatMessage(role="assistant", content="done")
+        block = ToolCallBlock(
+            tool_call_id="call_0", tool_name="slow_async_search", tool_kwargs={"query": "q"}
+        )
+        return ChatMessage(role="assistant", blocks=[block])
+
+    llm = MockFunctionCallingLLM(response_generator=respond, is_chat_model=True)
+    agent = FunctionCallingAgent(llm=llm, tools=tools, timeout=10)
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": str(i)} for i in range(50)]
+    history.append({"role": "user", "content": "search"})
+
+    async def run():
+        handler = agent.run(input=history)
+        events = [ev async for ev in handler.stream_events()]
+        await handler
+        return events
+
+    events = asyncio.run(run())
+
+    assert not any(isinstance(ev, InputEvent) for ev in events)
+    results = [ev for ev in events if isinstance(ev, ToolResultsEvent)]
+    assert [[m.content for m in ev.messages] for ev in results] == [["async q"]]
+    assistant = [ev.message for ev in events if isinstance(ev, AssistantMessageEvent)]
+    assert len(assistant) == 2
+    assert assistant[-1].content == "done"
+    # The answer text arrives as deltas before the run stops
+    deltas = [ev.delta for ev in events if isinstance(ev, TextDeltaEvent)]
+    assert "".join(deltas) == "done"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,213 @@
+"""Query latency of the Responses agent with slow tools: tool started after the turn vs from its Action line.
+
+Runs AIAgent.query against a local stub of the OpenAI Responses API that
+streams one token (word) every --token-ms; after its Action line the stub model
+goes on with a sentence, PAUSE and an invented Observation, like real models
+do. Every tool sleeps --tool-ms, like an external lookup. Compared are:
+RESPONSES_STOP_MODE=off (whole turn, then the tool), stream (turn closed once
+the model writes past PAUSE, then the tool) and stream with early tool dispatch
+(tool started as soon as the Action line is complete, rest of the turn
+cancelled). The stub also counts the tokens it decoded per query.
+
+Run from the agent directory (after ./init.sh):
+
+    PYTHONPATH=src python benchmarks/bench_early_dispatch.py --queries 20 --token-ms 5 --tool-ms 100
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("API_KEY", "benchmark")
+os.environ.setdefault("BASE_URL", "http://127.0.0.1:1/v1")
+os.environ.setdefault("MODEL_ID", "benchmark-model")
+os.environ.setdefault("COMPLETION_CACHE_ENABLED", "false")
+os.environ.setdefault("SINGLE_FLIGHT_ENABLED", "false")
+# The stub does not store responses: every turn sends the full history in all variants
+os.environ.setdefault("RESPONSES_CHAIN_TURNS", "false")
+
+from openai import OpenAI  # noqa: E402
+
+from openai_responses_agent_base.agent import AIAgent  # noqa: E402
+from openai_responses_agent_base.single_flight import llm_http_client  # noqa: E402
+
+QUESTION = "How much does a Lenovo laptop cost and what are the reviews?"
+ACTIONS = ('search_price("Lenovo")', 'search_reviews("Lenovo")')
+# What the model writes after its Action line
+TAIL = (
+    "\nI will wait for the result of this lookup before I answer the question."
+    "\nPAUSE"
+    "\nObservation: A Lenovo laptop costs about $650 according to several stores."
+)
+ANSWER = "Answer: A Lenovo laptop costs $400 and the reviews are good."
+
+
+def _tokens(text: str) -> list[str]:
+    return re.findall(r"\s*\S+", text)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Decodes a turn one word per token_seconds; streamed until done or the client goes away."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    token_seconds = 0.005
+    generated = 0
+    lock = threading.Lock()
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        observations = sum(
+            1
+            for item in body["input"]
+            if item["content"][0]["text"].startswith("Observation:")
+        )
+        if observations < len(ACTIONS):
+            text = f"Thought: I need to look this up.\nAction: {ACTIONS[observations]}" + TAIL
+        else:
+            text = ANSWER
+        tokens = _tokens(text)
+
+        if body.get("stream"):
+            self._stream(text, tokens)
+        else:
+            self._respond(text, tokens)
+
+    def _respond(self, text: str, tokens: list[str]) -> None:
+        time.sleep(self.token_seconds * len(tokens))
+        with StubHandler.lock:
+            StubHandler.generated += len(tokens)
+        payload = json.dumps(self._response(text)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, text: str, tokens: list[str]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        generated = 0
+        try:
+            for token in tokens:
+                time.sleep(self.token_seconds)
+                generated += 1
+                self._event(
+                    {
+                        "type": "response.output_text.delta",
+                        "item_id": "msg-bench",
+                        "output_index": 0,
+                        "content_index": 0,
+                        "delta": token,
+                    }
+                )
+            self._event({"type": "response.completed", "response": self._response(text)})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream: a real backend stops decoding here
+            pass
+        finally:
+            with StubHandler.lock:
+                StubHandler.generated += generated
+
+    @staticmethod
+    def _response(text: str) -> dict:
+        return {
+            "id": "resp-bench",
+            "object": "response",
+            "created_at": 0,
+            "model": "benchmark-model",
+            "status": "completed",
+            "output": [
+                {
+                    "id": "msg-bench",
+                    "type": "message",
+                    "role": "assistant",
+                    "status": "completed",
+                    "content": [{"type": "output_text", "text": text, "annotations": []}],
+                }
+            ],
+        }
+
+    def _event(self, event: dict) -> None:
+        self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+        self.wfile.flush()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _tools(tool_seconds: float) -> list[tuple]:
+    def search_price(brand: str) -> str:
+        """Search the price of a laptop brand."""
+        time.sleep(tool_seconds)
+        return f"Price of {brand} is $400"
+
+    def search_reviews(brand: str) -> str:
+        """Search the reviews of a laptop brand."""
+        time.sleep(tool_seconds)
+        return f"Reviews of {brand} are good"
+
+    return [("search_price", search_price), ("search_reviews", search_reviews)]
+
+
+def _summary(label: str, samples: list[float], tokens: float) -> str:
+    samples = sorted(samples)
+    return (
+        f"{label:<16} mean {statistics.mean(samples) * 1000:8.2f} ms   "
+        f"p50 {samples[len(samples) // 2] * 1000:8.2f} ms   output tokens/query {tokens:6.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--token-ms", type=float, default=5.0, help="stub decode time per token")
+    parser.add_argument("--tool-ms", type=float, default=100.0, help="latency of every tool call")
+    args = parser.parse_args()
+
+    StubHandler.token_seconds = args.token_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OpenAI(
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        api_key="benchmark",
+        http_client=llm_http_client(),
+    )
+    tools = _tools(args.tool_ms / 1000)
+
+    print(
+        f"{args.queries} queries per variant, {args.token_ms} ms per output token, "
+        f"{args.tool_ms} ms per tool call"
+    )
+    variants = (
+        ("off", {"stop_mode": "off", "early_tool_dispatch": False}),
+        ("stream", {"stop_mode": "stream", "early_tool_dispatch": False}),
+        ("early dispatch", {"stop_mode": "stream", "early_tool_dispatch": True}),
+    )
+    for label, options in variants:
+        agent = AIAgent(model="benchmark-model", client=client, **options)
+        for name, func in tools:
+            agent.register_tool(name, func)
+
+        StubHandler.generated = 0
+        latencies = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            agent.query(QUESTION)
+            latencies.append(time.perf_counter() - start)
+        # Let the stub notice streams closed by the last query
+        time.sleep(args.token_ms / 1000 * 4)
+        print(_summary(label, latencies, StubHandler.generated / args.queries))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Per-request connection setup of the Responses agent: OpenAI client per agent vs shared.
+
+Runs /chat-like requests (agent.run) against a local stub of the OpenAI
+Responses API and counts the TCP connections the backend accepts. With a
+client per agent (what every request used to build) each request opens new
+connections (TLS handshakes against a real endpoint) and re-reads .env; with
+the client shared by get_agent_closure they are kept alive and reused.
+Requests run from --concurrency tasks at once, like concurrent /chat calls.
+
+Run from the agent directory (after ./init.sh):
+
+    PYTHONPATH=src python benchmarks/bench_shared_client.py --requests 300 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("API_KEY", "benchmark")
+os.environ.setdefault("BASE_URL", "http://127.0.0.1:1/v1")
+os.environ.setdefault("MODEL_ID", "benchmark-model")
+os.environ.setdefault("COMPLETION_CACHE_ENABLED", "false")
+# Every request is identical: measure connection setup, not request coalescing
+os.environ.setdefault("SINGLE_FLIGHT_ENABLED", "false")
+
+from openai_responses_agent_base import agent as agent_module  # noqa: E402
+from openai_responses_agent_base.agent import AIAgent, get_agent_closure  # noqa: E402
+
+ANSWER = json.dumps(
+    {
+        "id": "resp-bench",
+        "object": "response",
+        "created_at": 0,
+        "model": "benchmark-model",
+        "status": "completed",
+        "output": [
+            {
+                "id": "msg-bench",
+                "type": "message",
+                "role": "assistant",
+                "status": "completed",
+                "content": [
+                    {"type": "output_text", "text": "Answer: $400", "annotations": []}
+                ],
+            }
+        ],
+        "usage": {"input_tokens": 10, "output_tokens": 3, "total_tokens": 13},
+    }
+).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a fixed final answer, keeping connections alive."""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self) -> None:
+        super().setup()
+        with StubHandler.lock:
+            StubHandler.connections += 1
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(ANSWER)))
+        self.end_headers()
+        self.wfile.write(ANSWER)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class _ClientPerAgentAdapter(agent_module._AIAgentAdapter):
+    """The adapter as it was before the shared client: every agent builds a client of its own."""
+
+    def __init__(self, base_url: str, model_id: str, tools: list) -> None:
+        client = AIAgent(model=model_id, base_url=base_url).client
+        super().__init__(client=client, model_id=model_id, tools=tools)
+
+
+def _summary(label: str, samples: list[float], connections: int) -> str:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return (
+        f"{label:<20} mean {statistics.mean(samples) * 1000:7.3f} ms   "
+        f"p50 {samples[len(samples) // 2] * 1000:7.3f} ms   p99 {p99 * 1000:7.3f} ms   "
+        f"connections {connections}"
+    )
+
+
+async def _run(get_agent, requests: int, concurrency: int) -> list[float]:
+    messages = [{"role": "user", "content": "How much does a Lenovo laptop cost?"}]
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            # get_agent() is timed too: that is where a client per agent is built
+            start = time.perf_counter()
+            await get_agent().run(input=list(messages))
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    shared = get_agent_closure(base_url=base_url)
+    tools = shared()._tools
+    variants = (
+        ("client per agent", lambda: _ClientPerAgentAdapter(base_url, "benchmark-model", tools)),
+        ("shared client", shared),
+    )
+
+    print(f"{args.requests} requests, {args.concurrency} at a time")
+    for label, get_agent in variants:
+        StubHandler.connections = 0
+        latencies = asyncio.run(_run(get_agent, args.requests, args.concurrency))
+        print(_summary(label, latencies, StubHandler.connections))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Output tokens per query of the Responses agent: turns ended at PAUSE vs left to run on.
+
+Runs AIAgent.query against a local stub of the OpenAI Responses API whose
+model, like many real ones, does not stop after "Action: ...\\nPAUSE" but goes
+on to invent an Observation, more thoughts and an answer. The stub decodes one
+token (word) every --token-ms and counts the tokens it generated before the
+response was complete or the client went away. Compared are RESPONSES_STOP_MODE
+"off" (every turn runs to its end), "stream" (the agent closes the stream once
+the model writes past PAUSE) and "backend" (the stub honours the stop sequences
+in the request, like backends accepting a stop parameter).
+
+Run from the agent directory (after ./init.sh):
+
+    PYTHONPATH=src python benchmarks/bench_stop_sequences.py --queries 20 --token-ms 2
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("API_KEY", "benchmark")
+os.environ.setdefault("BASE_URL", "http://127.0.0.1:1/v1")
+os.environ.setdefault("MODEL_ID", "benchmark-model")
+os.environ.setdefault("COMPLETION_CACHE_ENABLED", "false")
+os.environ.setdefault("SINGLE_FLIGHT_ENABLED", "false")
+# The stub does not store responses: every turn sends the full history in all variants
+os.environ.setdefault("RESPONSES_CHAIN_TURNS", "false")
+# Turns end at PAUSE here, not at the Action line (see bench_early_dispatch.py)
+os.environ.setdefault("RESPONSES_EARLY_TOOL_DISPATCH", "false")
+
+from openai import OpenAI  # noqa: E402
+
+from openai_responses_agent_base.agent import AIAgent  # noqa: E402
+from openai_responses_agent_base.single_flight import llm_http_client  # noqa: E402
+from openai_responses_agent_base.tools import search_price, search_reviews  # noqa: E402
+
+QUESTION = "How much does a Lenovo laptop cost and what are the reviews?"
+ACTIONS = ('search_price("Lenovo")', 'search_reviews("Lenovo")')
+# What the model writes after PAUSE when nothing stops it
+OVERRUN = (
+    "\nObservation: A Lenovo laptop costs about $650 according to several stores."
+    "\nThought: I should also check what people say about it before answering."
+    "\nAction: search_reviews(\"Lenovo\")\nPAUSE"
+    "\nObservation: Reviews of Lenovo laptops are mostly positive, praising the keyboard."
+    "\nAnswer: A Lenovo laptop costs about $650 and the reviews are mostly positive."
+)
+ANSWER = "Answer: A Lenovo laptop costs $400 and the reviews are good."
+
+
+def _tokens(text: str) -> list[str]:
+    return re.findall(r"\s*\S+", text)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """A model that runs on past PAUSE; decodes one word per token_seconds."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    token_seconds = 0.002
+    generated = 0
+    lock = threading.Lock()
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        observations = sum(
+            1
+            for item in body["input"]
+            if item["content"][0]["text"].startswith("Observation:")
+        )
+        if observations < len(ACTIONS):
+            text = f"Thought: I need to look this up.\nAction: {ACTIONS[observations]}\nPAUSE"
+            text += OVERRUN
+        else:
+            text = ANSWER
+        for stop in body.get("stop", []):
+            text = text.split(stop)[0]
+        tokens = _tokens(text)
+
+        if body.get("stream"):
+            self._stream(tokens)
+        else:
+            self._respond(tokens)
+
+    def _generated(self, count: int) -> None:
+        with StubHandler.lock:
+            StubHandler.generated += count
+
+    def _response(self, tokens: list[str]) -> dict:
+        return {
+            "id": "resp-bench",
+            "object": "response",
+            "created_at": 0,
+            "model": "benchmark-model",
+            "status": "completed",
+            "output": [
+                {
+                    "id": "msg-bench",
+                    "type": "message",
+                    "role": "assistant",
+                    "status": "completed",
+                    "content": [
+                        {"type": "output_text", "text": "".join(tokens), "annotations": []}
+                    ],
+                }
+            ],
+            "usage": {"input_tokens": 0, "output_tokens": len(tokens), "total_tokens": len(tokens)},
+        }
+
+    def _respond(self, tokens: list[str]) -> None:
+        time.sleep(self.token_seconds * len(tokens))
+        self._generated(len(tokens))
+        payload = json.dumps(self._response(tokens)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _event(self, event: dict) -> None:
+        self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+        self.wfile.flush()
+
+    def _stream(self, tokens: list[str]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        generated = 0
+        try:
+            for token in tokens:
+                time.sleep(self.token_seconds)
+                generated += 1
+                self._event(
+                    {
+                        "type": "response.output_text.delta",
+                        "item_id": "msg-bench",
+                        "output_index": 0,
+                        "content_index": 0,
+                        "delta": token,
+                    }
+                )
+            self._event({"type": "response.completed", "response": self._response(tokens)})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream: a real backend stops decoding here
+            pass
+        finally:
+            self._generated(generated)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _summary(label: str, samples: list[float], tokens: float, baseline: float) -> str:
+    samples = sorted(samples)
+    return (
+        f"{label:<8} mean {statistics.mean(samples) * 1000:8.2f} ms   "
+        f"p50 {samples[len(samples) // 2] * 1000:8.2f} ms   "
+        f"output tokens/query {tokens:6.1f}   saved/query {baseline - tokens:6.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--token-ms", type=float, default=2.0, help="stub decode time per token")
+    args = parser.parse_args()
+
+    StubHandler.token_seconds = args.token_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OpenAI(
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        api_key="benchmark",
+        http_client=llm_http_client(),
+    )
+
+    print(f"{args.queries} queries per stop mode, {args.token_ms} ms per output token")
+    baseline = None
+    for stop_mode in ("off", "stream", "backend"):
+        agent = AIAgent(model="benchmark-model", client=client, stop_mode=stop_mode)
+        agent.register_tool("search_price", search_price)
+        agent.register_tool("search_reviews", search_reviews)
+
+        StubHandler.generated = 0
+        latencies = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            agent.query(QUESTION)
+            latencies.append(time.perf_counter() - start)
+        # Let the stub notice streams closed by the last query
+        time.sleep(args.token_ms / 1000 * 4)
+
+        tokens = StubHandler.generated / args.queries
+        baseline = tokens if baseline is None else baseline
+        print(_summary(stop_mode, latencies, tokens, baseline))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,6 @@ AI service for OpenAI Responses Agent: run the agent on request payload and retu
 Uses OpenAI client and Responses API. Both generate and generate_stream accept a context
 whose get_json() returns the request payload (e.g. {"messages": [...]}).
 """
-import asyncio
 from typing import Generator
 
 from openai_responses_agent_base.agent import get_agent_closure
@@ -34,7 +33,7 @@ def ai_stream_service(context, base_url=None, model_id=None):
         payload = context.get_json()
         messages = payload.get("messages", [])
         agent = get_agent()
-        result = asyncio.run(agent.run(input=messages))
+        result = agent.run_sync(input=messages)
         # result["messages"] includes history + last assistant message
         last_msg = result["messages"][-1] if result["messages"] else {"role": "assistant", "content": ""}
         content = last_msg.get("content", "")
@@ -55,7 +54,7 @@ def ai_stream_service(context, base_url=None, model_id=None):
         payload = context.get_json()
         messages = payload.get("messages", [])
         agent = get_agent()
-        result = asyncio.run(agent.run(input=messages))
+        result = agent.run_sync(input=messages)
         last_msg = result["messages"][-1] if result["messages"] else {"role": "assistant", "content": ""}
         content = last_msg.get("content", "")
         yield {
@@ -40,9 +40,11 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 # Get the root directory of the repository (3 levels up from script)
 ROOT_DIR="$(cd "$SCRIPT_DIR/../../.." && pwd)"
 
-# Copy utils.py to the destination (if present at repo root)
-if [ -f "$ROOT_DIR/utils.py" ]; then
-    cp "$ROOT_DIR/utils.py" "$SCRIPT_DIR/src/openai_responses_agent_base/" && echo "utils.py copied to destination"
-fi
+# Copy shared modules to the destination (if present at repo root)
+for shared_module in utils.py serialization.py admission.py deadlines.py metrics.py completion_cache.py single_flight.py; do
+    if [ -f "$ROOT_DIR/$shared_module" ]; then
+        cp "$ROOT_DIR/$shared_module" "$SCRIPT_DIR/src/openai_responses_agent_base/" && echo "$shared_module copied to destination"
+    fi
+done
 
 echo "Agent initialized successfully"
@@ -1,17 +1,52 @@
 import os
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from openai_responses_agent_base.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    admission_rejected_handler,
+)
 from openai_responses_agent_base.agent import get_agent_closure
+from openai_responses_agent_base.completion_cache import get_completion_cache
+from openai_responses_agent_base.deadlines import (
+    RequestAborted,
+    open_scope,
+    request_aborted_handler,
+    request_timeout,
+    run_cancellable,
+)
+from openai_responses_agent_base.metrics import (
+    MetricsMiddleware,
+    metrics_response,
+    register_admission,
+    register_completion_cache,
+    register_single_flight,
+)
+from openai_responses_agent_base.serialization import (
+    ORJSONResponse,
+    ReturnMode,
+    select_messages,
+)
+from openai_responses_agent_base.single_flight import get_single_flight
 from openai_responses_agent_base.utils import get_env_var
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 
 
 # Request/Response models
 class ChatRequest(BaseModel):
-    """Incoming chat request body for the /chat endpoint."""
+    """Incoming chat request body for the /chat endpoint.
+
+    "return" selects what is sent back: "final" (only the answer), "new" (messages
+    produced by this run) or "full" (whole conversation, the default). "timeout"
+    (seconds) shortens the request's time budget, capped by REQUEST_TIMEOUT_SECONDS.
+    """
+
+    model_config = ConfigDict(populate_by_name=True)
 
     message: str
+    return_mode: ReturnMode = Field(default="full", alias="return")
+    timeout: float | None = Field(default=None, gt=0)
 
 
 class ChatResponse(BaseModel):
@@ -24,6 +59,18 @@ class ChatResponse(BaseModel):
 # Global variable for agent factory (get_agent callable)
 get_agent = None
 
+# Bounds concurrent agent runs (ADMISSION_* env vars); excess requests queue, then get 429
+admission = AdmissionController.from_env()
+register_admission(admission)
+
+# Opt-in LLM response cache (COMPLETION_CACHE_* env vars), shared by every client of the agent
+completion_cache = get_completion_cache()
+register_completion_cache(completion_cache)
+
+# Identical concurrent LLM requests share one upstream call (SINGLE_FLIGHT_ENABLED)
+single_flight = get_single_flight()
+register_single_flight(single_flight)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -52,40 +99,75 @@ app = FastAPI(
     title="OpenAI Responses Agent API",
     description="FastAPI service for agent (OpenAI client + pure Python, Responses API, no agentic framework)",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
+app.add_exception_handler(AdmissionRejected, admission_rejected_handler)
+app.add_exception_handler(RequestAborted, request_aborted_handler)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """
     Chat endpoint that accepts a message and returns the agent's response.
 
+    The run is stopped when the client disconnects (499) or when the request's
+    deadline passes (504); the deadline also bounds every Responses API call.
+
     Returns:
-        JSON response with full conversation history (same format as LangGraph/LlamaIndex agents).
+        JSON response with the conversation history selected by request.return_mode
+        (same format as LangGraph/LlamaIndex agents).
     """
     global get_agent
 
     if get_agent is None:
         raise HTTPException(status_code=503, detail="Agent not initialized")
 
-    try:
-        agent = get_agent()
-        messages = [{"role": "user", "content": request.message}]
+    scope = open_scope(request_timeout(http_request, request.timeout))
+
+    async with admission.slot():
+        try:
+            agent = get_agent()
+            messages = [{"role": "user", "content": request.message}]
+
+            result = await run_cancellable(
+                http_request, agent.run(input=messages), scope
+            )
+
+            # Messages are already plain dicts, only the selection is needed
+            return {
+                "messages": select_messages(
+                    result["messages"], request.return_mode, n_input=len(messages)
+                ),
+                "finish_reason": result.get("finish_reason", "stop"),
+            }
 
-        result = await agent.run(input=messages)
+        except RequestAborted:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error processing request: {str(e)}"
+            )
 
-        return result["messages"]
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Error processing request: {str(e)}"
-        )
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request/tool/LLM latency histograms, in-flight gauges and token counters."""
+    return metrics_response()
 
 
 @app.get("/health")
 async def health():
-    """Return service health and whether the agent has been initialized."""
-    return {"status": "healthy", "agent_initialized": get_agent is not None}
+    """Return service health, whether the agent has been initialized, admission queue, LLM request coalescing and completion cache state."""
+    return {
+        "status": "healthy",
+        "agent_initialized": get_agent is not None,
+        "admission": admission.stats(),
+        "completion_cache": (
+            completion_cache.stats() if completion_cache is not None else None
+        ),
+        "single_flight": single_flight.stats() if single_flight is not None else None,
+    }
 
 
 if __name__ == "__main__":
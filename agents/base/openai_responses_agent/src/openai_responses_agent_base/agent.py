@@ -7,26 +7,139 @@ Compatible with OpenAI API and any OpenAI-compatible endpoint (e.g. base_url ove
 """
 
 import asyncio
+import contextvars
 import csv
 import inspect
+import os
 import re
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from io import StringIO
 from typing import Any, Callable, Dict, List, Optional
 
 from dotenv import load_dotenv
-from openai import OpenAI
-
+from openai import APIStatusError, AsyncOpenAI, BadRequestError, NotFoundError, OpenAI
+
+from openai_responses_agent_base.deadlines import (
+    RequestAborted,
+    check_deadline,
+    remaining_time,
+)
+from openai_responses_agent_base.metrics import observe_llm_request, observe_tool
+from openai_responses_agent_base.single_flight import (
+    llm_async_http_client,
+    llm_connection_limits,
+    llm_http_client,
+)
 from openai_responses_agent_base.utils import get_env_var
 from openai_responses_agent_base.tools import search_price, search_reviews
 
+# Chain the turns of a query with previous_response_id, sending only each new message
+# (opt-in: the backend then stores every turn with store=true; falls back to the full
+# history for backends that do not store responses)
+RESPONSES_CHAIN_TURNS = os.getenv("RESPONSES_CHAIN_TURNS", "false").lower() == "true"
+
+# Base URLs of backends found not to store responses; later agents send the full history
+_stateless_backends: set[str] = set()
+
+# A rejected chained call is only about chaining when it names one of its parameters
+_CHAINING_ERROR_RE = re.compile(r"\b(?:previous_response_id|store)\b")
+# ... and the backend does not store responses at all when it says so
+_CHAINING_UNSUPPORTED_RE = re.compile(
+    r"not supported|unsupported|not implemented|does not support", re.IGNORECASE
+)
+
+# How a turn is ended at the protocol boundary (after PAUSE, before an invented Observation:):
+# "off" (default) lets the model finish the turn, "stream" streams the output and closes the
+# stream once the model writes past it (such turns are resent instead of chained on),
+# "backend" sends STOP_SEQUENCES as extra_body "stop", which only some OpenAI-compatible
+# backends accept: the OpenAI Responses API rejects it with 400
+RESPONSES_STOP_MODE = os.getenv("RESPONSES_STOP_MODE", "off").lower()
+STOP_MODES = ("stream", "backend", "off")
+STOP_SEQUENCES = ["PAUSE", "Observation:"]
+
+# Cap on the output tokens of one turn (0 = no cap)
+RESPONSES_MAX_OUTPUT_TOKENS = int(os.getenv("RESPONSES_MAX_OUTPUT_TOKENS", "0"))
+
+# Start the tool of a streamed turn as soon as its Action line is complete, instead of
+# after the whole turn arrived (RESPONSES_STOP_MODE=stream only)
+RESPONSES_EARLY_TOOL_DISPATCH = (
+    os.getenv("RESPONSES_EARLY_TOOL_DISPATCH", "true").lower() == "true"
+)
+
+# Upper bound for waiting on a tool started while its turn streamed (seconds); the
+# request deadline may shorten it
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", 30))
+
+# Threads running tools started while their turn streamed (query()), shared by all agents
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", 8))
+
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+
+# Output past the end of a turn: more text after a PAUSE line, or an Observation: line
+_OVERRUN_RE = re.compile(r"^[ \t]*(?:(PAUSE)[ \t]*\n\s*\S|Observation:)", re.MULTILINE)
+
+
+def _openai_client(
+    base_url: Optional[str], api_key: Optional[str], http_client: Any
+) -> OpenAI:
+    """OpenAI client for api.openai.com or any OpenAI-compatible API (base_url)."""
+    client_kwargs: Dict[str, Any] = {"http_client": http_client}
+    if base_url:
+        client_kwargs["base_url"] = base_url.rstrip("/")
+    if api_key:
+        client_kwargs["api_key"] = api_key
+    return OpenAI(**client_kwargs)
+
+
+def _async_openai_client(client: OpenAI, http_client: Any) -> AsyncOpenAI:
+    """AsyncOpenAI client for the same endpoint and credentials as client."""
+    return AsyncOpenAI(
+        base_url=client.base_url, api_key=client.api_key, http_client=http_client
+    )
+
+
+# AsyncOpenAI clients of agents built without one, per event loop (their connections belong
+# to it) and endpoint, so those agents share one connection pool and transport stack
+_async_clients: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, Dict[tuple, AsyncOpenAI]
+] = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+
+
+def _shared_async_client(client: OpenAI) -> AsyncOpenAI:
+    """The AsyncOpenAI client for the endpoint of client on the running event loop (built on first use)."""
+    loop = asyncio.get_running_loop()
+    key = (str(client.base_url), client.api_key)
+    with _async_clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        async_client = clients.get(key)
+        if async_client is None:
+            async_client = clients[key] = _async_openai_client(
+                client, llm_async_http_client()
+            )
+    return async_client
+
 
 def get_agent_closure(
     base_url: Optional[str] = None,
     model_id: Optional[str] = None,
     api_key: Optional[str] = None,
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    keepalive_expiry: Optional[float] = None,
 ) -> Callable:
     """
     Return a callable that creates an agent instance (adapter with async run() for main.py).
+
+    Builds one OpenAI client (with its connection pool) and shares it across all
+    agents created by the returned callable, so connections to the LLM backend
+    are kept alive across requests; async runs share one AsyncOpenAI client per
+    event loop the same way. Pool limits left out come from
+    LLM_MAX_CONNECTIONS / LLM_MAX_KEEPALIVE_CONNECTIONS / LLM_KEEPALIVE_EXPIRY_SECONDS.
     """
     if not base_url:
         base_url = get_env_var("BASE_URL")
@@ -38,11 +151,37 @@ def get_agent_closure(
         except (EnvironmentError, ValueError):
             api_key = None
 
+    # Pooled client; coalesces identical in-flight requests and serves cached completions
+    limits = llm_connection_limits(
+        max_connections, max_keepalive_connections, keepalive_expiry
+    )
+    client = _openai_client(base_url, api_key, llm_http_client(limits))
+
+    # The async client's connections belong to the event loop that first uses it
+    async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI] = (
+        weakref.WeakKeyDictionary()
+    )
+    async_clients_lock = threading.Lock()
+
+    def get_async_client() -> AsyncOpenAI:
+        """The AsyncOpenAI client of the running event loop (built on first use)."""
+        loop = asyncio.get_running_loop()
+        async_client = async_clients.get(loop)
+        if async_client is None:
+            with async_clients_lock:
+                async_client = async_clients.get(loop)
+                if async_client is None:
+                    async_client = _async_openai_client(
+                        client, llm_async_http_client(limits)
+                    )
+                    async_clients[loop] = async_client
+        return async_client
+
     def get_agent() -> "_AIAgentAdapter":
         return _AIAgentAdapter(
-            base_url=base_url,
+            client=client,
+            get_async_client=get_async_client,
             model_id=model_id,
-            api_key=api_key,
             tools=[("search_price", search_price), ("search_reviews", search_reviews)],
         )
 
@@ -51,53 +190,70 @@ def get_agent_closure(
 
 class _AIAgentAdapter:
     """
-    Adapter that exposes async run(input) for main.py, delegating to AIAgent.query().
+    Adapter that exposes async run(input) for main.py, delegating to AIAgent.aquery(),
+    and run_sync(input) for sync callers, delegating to AIAgent.query().
     """
 
     def __init__(
         self,
-        base_url: str,
+        client: OpenAI,
         model_id: str,
-        api_key: Optional[str] = None,
         tools: Optional[List[tuple]] = None,
+        get_async_client: Optional[Callable[[], AsyncOpenAI]] = None,
     ):
-        self._base_url = base_url
+        self._client = client
+        self._get_async_client = get_async_client
         self._model_id = model_id
-        self._api_key = api_key
         self._tools = tools or []
 
-    async def run(self, input: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """
-        Run the agent on the given messages; uses AIAgent.query() with the last user message.
-        """
-        question = ""
-        if input:
-            last = input[-1]
-            question = last.get("content", "") if isinstance(last, dict) else str(last)
-
+    def _agent(self, async_client: Optional[AsyncOpenAI] = None) -> "AIAgent":
         agent = AIAgent(
-            model=self._model_id,
-            base_url=self._base_url,
-            api_key=self._api_key,
+            model=self._model_id, client=self._client, async_client=async_client
         )
-
         for name, func in self._tools:
             agent.register_tool(name, func)
-
-        answer = await asyncio.to_thread(agent.query, question)
-        if answer is None:
-            answer = ""
-
+        return agent
+
+    @staticmethod
+    def _question(input: List[Dict[str, Any]]) -> str:
+        """The last message of input, which the agent answers."""
+        if not input:
+            return ""
+        last = input[-1]
+        return last.get("content", "") if isinstance(last, dict) else str(last)
+
+    @staticmethod
+    def _result(input: List[Dict[str, Any]], answer: Optional[str]) -> Dict[str, Any]:
         response_messages = list(input)
-        response_messages.append({"role": "assistant", "content": answer})
+        response_messages.append({"role": "assistant", "content": answer or ""})
         return {"messages": response_messages, "finish_reason": "stop"}
 
+    async def run(self, input: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Run the agent on the given messages; uses AIAgent.aquery() with the last user message.
+
+        The run stays on the caller's event loop (no thread per request), so cancelling
+        it stops the pending Responses API call.
+        """
+        async_client = self._get_async_client() if self._get_async_client else None
+        answer = await self._agent(async_client).aquery(self._question(input))
+        return self._result(input, answer)
+
+    def run_sync(self, input: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Blocking variant of run() using AIAgent.query(), for callers without an event loop."""
+        answer = self._agent().query(self._question(input))
+        return self._result(input, answer)
 
-def _messages_to_responses_input(messages: List[Dict]) -> tuple[str, List[Dict]]:
+
+def _messages_to_responses_input(
+    messages: List[Dict], system_as_input: bool = False
+) -> tuple[str, List[Dict]]:
     """
     Convert chat-style messages to Responses API format.
     Returns (instructions, input_items) where instructions is the system content
     and input_items is a list of {role, content} with content as [{type: 'input_text', text: '...'}].
+    With system_as_input the system message stays an input item instead (instructions
+    are not carried over to responses chained with previous_response_id, input items are).
     """
     instructions = ""
     input_items: List[Dict] = []
@@ -105,13 +261,93 @@ def _messages_to_responses_input(messages: List[Dict]) -> tuple[str, List[Dict]]
         role = m.get("role", "user")
         content = m.get("content", "") or ""
         text_content = [{"type": "input_text", "text": content}]
-        if role == "system":
+        if role == "system" and not system_as_input:
             instructions = content
             continue
         input_items.append({"role": role, "content": text_content})
     return instructions, input_items
 
 
+def _find_overrun(text: str, pos: int = 0) -> Optional[int]:
+    """Index where text runs past the end of its turn (searching from line start pos), if it does."""
+    match = _OVERRUN_RE.search(text, pos)
+    if match is None:
+        return None
+    return match.end(1) if match.group(1) else match.start()
+
+
+def _truncate_at_stop(text: str) -> tuple[str, bool]:
+    """Text of a turn without what the model wrote past PAUSE, and whether anything was cut."""
+    end = _find_overrun(text)
+    if end is None:
+        return text, False
+    return text[:end].rstrip(), True
+
+
+class _StreamedTurn:
+    """
+    Output of a streamed turn, collected event by event until the model writes past the turn.
+
+    With action_re, the first Action line is picked up as soon as the line is complete
+    (action), so its tool can start before the rest of the turn arrives.
+    """
+
+    def __init__(self, action_re: Optional[re.Pattern] = None) -> None:
+        self.text = ""
+        self.response: Optional[Any] = None
+        self.action_re = action_re
+        self.action: Optional[re.Match] = None
+        self._action_end = 0
+
+    def add(self, event: Any) -> bool:
+        """Take one stream event; True once the text ran past the end of the turn."""
+        event_type = getattr(event, "type", None)
+        if event_type == "response.output_text.delta":
+            # Lines before the last non-blank one were searched with the earlier deltas
+            pos = self.text.rstrip().rfind("\n") + 1
+            self.text += event.delta or ""
+            if self.action_re is not None and self.action is None:
+                self._find_action(pos)
+            return _find_overrun(self.text, pos) is not None
+        if event_type in ("response.completed", "response.incomplete", "response.failed"):
+            self.response = event.response
+        return False
+
+    def _find_action(self, pos: int) -> None:
+        """Look for an Action line among the complete lines from pos on, as _next_step reads them."""
+        end = self.text.rfind("\n")
+        if end < pos or self.text.lower().startswith("answer:"):
+            return
+        start = pos
+        for line in self.text[pos:end].split("\n"):
+            match = self.action_re.match(line)
+            if match:
+                self.action = match
+                self._action_end = start + len(line)
+                return
+            start += len(line) + 1
+
+    def cut_at_action(self) -> None:
+        """Drop everything after the Action line: the rest of the turn is not read."""
+        self.text = self.text[: self._action_end]
+
+
+def _chaining_error(exc: APIStatusError) -> Optional[str]:
+    """
+    What a 4xx on a chained call says about chaining.
+
+    Returns None when the error is about something else (context length, content
+    filter, tool schema...), "backend" when the backend reports that it does not
+    support stored responses, and "agent" otherwise (e.g. our stored response is gone).
+    """
+    message = str(getattr(exc, "message", None) or exc)
+    if getattr(exc, "param", None) not in ("previous_response_id", "store") and not (
+        _CHAINING_ERROR_RE.search(message)
+    ):
+        return None
+    return "backend" if _CHAINING_UNSUPPORTED_RE.search(message) else "agent"
+
+
 def _get_output_text_from_response(response: Any) -> str:
     """Extract assistant text from Responses API response (response.output[].content[])."""
     if not getattr(response, "output", None) or not response.output:
@@ -138,6 +374,12 @@ class AIAgent:
         temperature: float = 0,
         base_url: Optional[str] = None,
         api_key: Optional[str] = None,
+        client: Optional[OpenAI] = None,
+        async_client: Optional[AsyncOpenAI] = None,
+        chain_turns: Optional[bool] = None,
+        stop_mode: Optional[str] = None,
+        max_output_tokens: Optional[int] = None,
+        early_tool_dispatch: Optional[bool] = None,
     ):
         """
         Initialize the agent with tools and OpenAI client configuration.
@@ -147,27 +389,57 @@ class AIAgent:
             temperature: Sampling temperature (0 = deterministic).
             base_url: Optional API base URL (for OpenAI-compatible endpoints).
             api_key: Optional API key (required for OpenAI; can be None for some local endpoints).
+            client: Optional shared OpenAI client; base_url and api_key are then ignored.
+                Without it the agent builds a client (and connection pool) of its own.
+            async_client: Optional shared AsyncOpenAI client for aquery(); without it
+                aquery() uses the one shared by all such agents for the endpoint of
+                client on the running event loop.
+            chain_turns: Chain turns with previous_response_id, sending only the new
+                messages; the backend then stores the conversation (RESPONSES_CHAIN_TURNS
+                if omitted, default off).
+            stop_mode: How a turn is ended once the model writes past PAUSE: "off",
+                "stream" or "backend" (RESPONSES_STOP_MODE if omitted, default "off").
+            max_output_tokens: Cap on the output tokens of one turn; 0 for none
+                (RESPONSES_MAX_OUTPUT_TOKENS if omitted).
+            early_tool_dispatch: Start a tool while its turn is still streaming, as soon
+                as the Action line is complete (RESPONSES_EARLY_TOOL_DISPATCH if omitted).
         """
-        load_dotenv()
-
-        if base_url is None:
-            base_url = get_env_var("BASE_URL")
         if model is None:
             model = get_env_var("MODEL_ID")
-        if api_key is None:
-            try:
-                api_key = get_env_var("API_KEY")
-            except (EnvironmentError, ValueError):
-                api_key = None
-
-        # OpenAI client: works with api.openai.com or any OpenAI-compatible API (base_url)
-        client_kwargs: Dict[str, Any] = {}
-        if base_url:
-            client_kwargs["base_url"] = base_url.rstrip("/")
-        if api_key:
-            client_kwargs["api_key"] = api_key
-
-        self.client = OpenAI(**client_kwargs)
+
+        if client is None:
+            load_dotenv()
+
+            if base_url is None:
+                base_url = get_env_var("BASE_URL")
+            if api_key is None:
+                try:
+                    api_key = get_env_var("API_KEY")
+                except (EnvironmentError, ValueError):
+                    api_key = None
+
+            # Pooled client; coalesces identical in-flight requests and serves cached completions
+            client = _openai_client(base_url, api_key, llm_http_client())
+
+        self.client = client
+        self.async_client = async_client
+        self.chain_turns = RESPONSES_CHAIN_TURNS if chain_turns is None else chain_turns
+        if str(client.base_url) in _stateless_backends:
+            self.chain_turns = False
+        # Id of the last stored response and how many of self.messages it already holds
+        self._previous_response_id: Optional[str] = None
+        self._stored_messages = 0
+        self.stop_mode = RESPONSES_STOP_MODE if stop_mode is None else stop_mode
+        if self.stop_mode not in STOP_MODES:
+            raise ValueError(f"Unknown stop mode: {self.stop_mode}")
+        self.max_output_tokens = (
+            RESPONSES_MAX_OUTPUT_TOKENS if max_output_tokens is None else max_output_tokens
+        )
+        self.early_tool_dispatch = (
+            RESPONSES_EARLY_TOOL_DISPATCH if early_tool_dispatch is None else early_tool_dispatch
+        )
+        # Tool call started by the last streamed turn (a Future, or a Task for aquery)
+        self._dispatched: Optional[Any] = None
         self.model = model
         self.temperature = temperature
         self.tools: Dict[str, Callable] = {}
@@ -192,12 +464,130 @@ class AIAgent:
         args = next(reader)
         return [arg.strip().strip("'\"") for arg in args]
 
+    def _responses_kwargs(
+        self,
+        messages: Optional[List[Dict]] = None,
+        temperature: Optional[float] = None,
+        model: Optional[str] = None,
+        store: bool = False,
+        previous_response_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Arguments of one responses.create call (see _responses_create)."""
+        msg_list = messages if messages is not None else self.messages
+        temp = temperature if temperature is not None else self.temperature
+        model_id = model if model is not None else self.model
+
+        instructions, input_items = _messages_to_responses_input(
+            msg_list, system_as_input=store
+        )
+        kwargs: Dict[str, Any] = {"model": model_id, "input": input_items}
+        if store:
+            kwargs["store"] = True
+        else:
+            kwargs["instructions"] = instructions
+        if previous_response_id is not None:
+            kwargs["previous_response_id"] = previous_response_id
+        if temp != 0:
+            kwargs["temperature"] = temp
+        if self.max_output_tokens:
+            kwargs["max_output_tokens"] = self.max_output_tokens
+        if self.stop_mode == "backend":
+            # Not a Responses API parameter (OpenAI rejects it): only for backends that accept it
+            kwargs["extra_body"] = {"stop": STOP_SEQUENCES}
+
+        # Never wait on the model longer than the current request has left
+        remaining = remaining_time()
+        if remaining is not None:
+            kwargs["timeout"] = remaining
+        return kwargs
+
+    @staticmethod
+    def _observe_response(model_id: str, start: float, response: Any) -> None:
+        usage = getattr(response, "usage", None)
+        observe_llm_request(
+            model_id,
+            time.perf_counter() - start,
+            getattr(usage, "input_tokens", 0) or 0,
+            getattr(usage, "output_tokens", 0) or 0,
+        )
+
+    def _streamed_turn(self) -> _StreamedTurn:
+        return _StreamedTurn(self.action_re if self.early_tool_dispatch else None)
+
+    def _early_action(self, match: re.Match) -> Optional[tuple]:
+        """(tool name, tool, arguments) of an Action line read while streaming; None for unknown tools."""
+        name, args_str = match.groups()
+        tool = self.tools.get(name)
+        if not tool:
+            return None
+        return name, tool, self._parse_arguments(args_str)
+
+    def _read_stream(self, stream: Any, keep_turn: bool = False) -> tuple[str, Optional[Any]]:
+        """
+        Text and final response of a streamed turn; closes the stream once it runs past the turn.
+
+        With early tool dispatch the tool of the Action line starts as soon as the line
+        is complete (self._dispatched). The rest of the generation is then cancelled,
+        unless keep_turn: a turn stored for chaining is read on to its end (while the
+        tool runs) so that the next turn can chain on it, which means that with
+        chaining on, early dispatch overlaps the tool with the rest of the turn but
+        does not save its tokens.
+        """
+        turn = self._streamed_turn()
+        dispatched = False
+        try:
+            for event in stream:
+                if turn.add(event):
+                    break
+                if turn.action is not None and not dispatched:
+                    dispatched = True
+                    action = self._early_action(turn.action)
+                    if action is not None:
+                        self._dispatched = self._start_tool(*action)
+                    if not keep_turn:
+                        turn.cut_at_action()
+                        break
+        finally:
+            stream.close()
+        return turn.text, turn.response
+
+    async def _aread_stream(
+        self, stream: Any, keep_turn: bool = False
+    ) -> tuple[str, Optional[Any]]:
+        """Async variant of _read_stream; the dispatched tool runs as a task on the running loop."""
+        turn = self._streamed_turn()
+        dispatched = False
+        try:
+            async for event in stream:
+                if turn.add(event):
+                    break
+                if turn.action is not None and not dispatched:
+                    dispatched = True
+                    action = self._early_action(turn.action)
+                    if action is not None:
+                        self._dispatched = asyncio.create_task(self._acall_tool(*action))
+                    if not keep_turn:
+                        turn.cut_at_action()
+                        break
+        finally:
+            await stream.close()
+        return turn.text, turn.response
+
+    def _end_turn(self, text: str, response: Optional[Any]) -> tuple[str, Optional[Any]]:
+        """Drop what the model wrote past the turn; a turn cut short has no response to chain on."""
+        if self.stop_mode == "off":
+            return text, response
+        text, cut = _truncate_at_stop(text)
+        return text, None if cut else response
+
     def _responses_create(
         self,
         messages: Optional[List[Dict]] = None,
         temperature: Optional[float] = None,
         model: Optional[str] = None,
-    ):
+        store: bool = False,
+        previous_response_id: Optional[str] = None,
+    ) -> tuple[str, Optional[Any]]:
         """
         Single Responses API call via OpenAI client.
 
@@ -205,33 +595,219 @@ class AIAgent:
             messages: List of messages; if None, self.messages is used.
             temperature: Override temperature for this call.
             model: Override model for this call.
+            store: Ask the backend to store the response, so a later call can chain on it.
+            previous_response_id: Continue from this stored response; messages then
+                only holds what was added since.
 
         Returns:
-            Response from client.responses.create (object with .output etc.).
+            (text, response): the assistant text of the turn, ended at the protocol
+            boundary, and the response from client.responses.create, or None when
+            the turn was cut short (its stored response holds more than text).
         """
-        msg_list = messages if messages is not None else self.messages
-        temp = temperature if temperature is not None else self.temperature
-        model_id = model if model is not None else self.model
-
-        instructions, input_items = _messages_to_responses_input(msg_list)
-        kwargs: Dict[str, Any] = {
-            "model": model_id,
-            "instructions": instructions,
-            "input": input_items,
+        kwargs = self._responses_kwargs(
+            messages, temperature, model, store, previous_response_id
+        )
+        start = time.perf_counter()
+        response = None
+        try:
+            if self.stop_mode == "stream":
+                stream = self.client.responses.create(stream=True, **kwargs)
+                text, response = self._read_stream(stream, keep_turn=store)
+            else:
+                response = self.client.responses.create(**kwargs)
+                text = _get_output_text_from_response(response)
+        finally:
+            self._observe_response(kwargs["model"], start, response)
+        return self._end_turn(text, response)
+
+    async def _aresponses_create(
+        self,
+        messages: Optional[List[Dict]] = None,
+        temperature: Optional[float] = None,
+        model: Optional[str] = None,
+        store: bool = False,
+        previous_response_id: Optional[str] = None,
+    ) -> tuple[str, Optional[Any]]:
+        """Async variant of _responses_create, via the AsyncOpenAI client."""
+        async_client = self.async_client or _shared_async_client(self.client)
+
+        kwargs = self._responses_kwargs(
+            messages, temperature, model, store, previous_response_id
+        )
+        start = time.perf_counter()
+        response = None
+        try:
+            if self.stop_mode == "stream":
+                stream = await async_client.responses.create(stream=True, **kwargs)
+                text, response = await self._aread_stream(stream, keep_turn=store)
+            else:
+                response = await async_client.responses.create(**kwargs)
+                text = _get_output_text_from_response(response)
+        finally:
+            self._observe_response(kwargs["model"], start, response)
+        return self._end_turn(text, response)
+
+    def _chained_request(self) -> Dict[str, Any]:
+        """Arguments of the next chained call: only the messages the backend does not hold yet."""
+        if self._previous_response_id is None:
+            return {"messages": self.messages, "store": True}
+        return {
+            "messages": self.messages[self._stored_messages :],
+            "store": True,
+            "previous_response_id": self._previous_response_id,
         }
-        if temp != 0:
-            kwargs["temperature"] = temp
 
-        return self.client.responses.create(**kwargs)
+    def _chained_response(self, response: Optional[Any]) -> None:
+        """
+        Remember a stored response; the caller appends its output to self.messages next.
+
+        response is None for a turn cut short at the protocol boundary: the next call
+        then chains on the response before it and resends that turn as sent and kept.
+        """
+        if response is None:
+            return
+        response_id = getattr(response, "id", None)
+        if not response_id or getattr(response, "store", True) is False:
+            # Echoed store=false: the backend does not keep responses
+            self._stop_chaining(backend=True)
+            return
+        self._previous_response_id = response_id
+        self._stored_messages = len(self.messages) + 1
+
+    def _stop_chaining(self, backend: bool = False) -> None:
+        """Send the full history from now on; with backend, in later agents for this backend too."""
+        self.chain_turns = False
+        self._previous_response_id = None
+        if backend:
+            _stateless_backends.add(str(self.client.base_url))
+
+    def _chaining_failed(self, exc: APIStatusError) -> None:
+        """Fall back to the full history after a chained call failed because of chaining; re-raise otherwise."""
+        scope = _chaining_error(exc)
+        if scope is None:
+            raise exc
+        self._stop_chaining(backend=scope == "backend")
 
     def _execute(self) -> str:
         """Execute a Responses API request."""
-        response = self._responses_create(
+        if self.chain_turns:
+            try:
+                text, response = self._responses_create(
+                    temperature=self.temperature,
+                    model=self.model,
+                    **self._chained_request(),
+                )
+            except (BadRequestError, NotFoundError) as exc:
+                # The backend does not store responses (or lost ours): resend everything
+                self._chaining_failed(exc)
+            else:
+                self._chained_response(response)
+                return text
+
+        text, _ = self._responses_create(
             messages=self.messages,
             temperature=self.temperature,
             model=self.model,
         )
-        return _get_output_text_from_response(response)
+        return text
+
+    async def _aexecute(self) -> str:
+        """Execute a Responses API request without blocking the event loop."""
+        if self.chain_turns:
+            try:
+                text, response = await self._aresponses_create(
+                    temperature=self.temperature,
+                    model=self.model,
+                    **self._chained_request(),
+                )
+            except (BadRequestError, NotFoundError) as exc:
+                # The backend does not store responses (or lost ours): resend everything
+                self._chaining_failed(exc)
+            else:
+                self._chained_response(response)
+                return text
+
+        text, _ = await self._aresponses_create(
+            messages=self.messages,
+            temperature=self.temperature,
+            model=self.model,
+        )
+        return text
+
+    def _next_step(self, result: str) -> tuple[Optional[str], Optional[tuple]]:
+        """
+        Interpret one model turn.
+
+        Returns:
+            (answer, None) when the turn ends the loop (answer may be None), or
+            (None, (tool name, tool, arguments)) when it asks for an action.
+        """
+        if result.lower().startswith("answer:"):
+            idx = result.lower().find("answer:")
+            return result[idx + len("answer:") :].strip(), None
+
+        actions = [
+            m for line in result.split("\n") for m in [self.action_re.match(line)] if m
+        ]
+        if not actions:
+            # No Action: line – treat the whole response as the final answer
+            return (result.strip() if result else None), None
+
+        action, args_str = actions[0].groups()
+        action_inputs = self._parse_arguments(args_str)
+
+        tool = self.tools.get(action)
+        if not tool:
+            raise ValueError(f"Unknown action: {action}")
+        return None, (action, tool, action_inputs)
+
+    @staticmethod
+    def _call_tool(name: str, tool: Callable, action_inputs: List[str]) -> Any:
+        start = time.perf_counter()
+        try:
+            return tool(*action_inputs)
+        finally:
+            observe_tool(name, time.perf_counter() - start)
+
+    @staticmethod
+    async def _acall_tool(name: str, tool: Callable, action_inputs: List[str]) -> Any:
+        start = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(tool):
+                return await tool(*action_inputs)
+            return await asyncio.to_thread(tool, *action_inputs)
+        finally:
+            observe_tool(name, time.perf_counter() - start)
+
+    def _start_tool(self, name: str, tool: Callable, action_inputs: List[str]) -> Future:
+        """Run a tool on the bounded tool thread pool (in the request's context), while its turn is closed."""
+        context = contextvars.copy_context()
+        return _tool_executor.submit(context.run, self._call_tool, name, tool, action_inputs)
+
+    @staticmethod
+    def _tool_timeout() -> float:
+        """How long to wait on a started tool: TOOL_TIMEOUT_SECONDS, or less if the request runs out first."""
+        remaining = remaining_time()
+        if remaining is None:
+            return TOOL_TIMEOUT_SECONDS
+        return min(TOOL_TIMEOUT_SECONDS, remaining)
+
+    def _dispatched_result(self, dispatched: Future) -> Any:
+        timeout = self._tool_timeout()
+        try:
+            return dispatched.result(timeout)
+        except FutureTimeoutError:
+            # Out of request time rather than tool time: stop the run
+            check_deadline()
+            raise TimeoutError(f"timed out after {timeout:g}s") from None
+
+    async def _adispatched_result(self, dispatched: "asyncio.Task") -> Any:
+        timeout = self._tool_timeout()
+        try:
+            return await asyncio.wait_for(dispatched, timeout)
+        except asyncio.TimeoutError:
+            check_deadline()
+            raise TimeoutError(f"timed out after {timeout:g}s") from None
 
     def query(self, question: str, max_turns: int = 10) -> Optional[str]:
         """
@@ -249,37 +825,82 @@ class AIAgent:
 
         try:
             for _ in range(max_turns):
+                # Stop between turns once the request was cancelled or timed out
+                check_deadline()
                 self.messages.append({"role": "user", "content": next_prompt})
                 result = self._execute()
                 self.messages.append({"role": "assistant", "content": result})
 
-                if result.lower().startswith("answer:"):
-                    idx = result.lower().find("answer:")
-                    return result[idx + len("answer:") :].strip()
+                answer, action = self._next_step(result)
+                if action is None:
+                    return answer
+
+                # Started while the turn was still streaming, or run now
+                dispatched, self._dispatched = self._dispatched, None
+                if dispatched is not None:
+                    observation = self._dispatched_result(dispatched)
+                else:
+                    observation = self._call_tool(*action)
+                next_prompt = f"Observation: {observation}"
+
+        except RequestAborted:
+            raise
+        except Exception:
+            return None
+        finally:
+            # A tool started by a turn that failed afterwards must not be picked up later
+            if self._dispatched is not None:
+                self._dispatched.cancel()
+                self._dispatched = None
+
+        return None
+
+    async def aquery(self, question: str, max_turns: int = 10) -> Optional[str]:
+        """
+        Async variant of query() built on AsyncOpenAI.responses.create.
 
-                actions = [
-                    m
-                    for line in result.split("\n")
-                    for m in [self.action_re.match(line)]
-                    if m
-                ]
+        The whole loop runs on the caller's event loop: async tools are awaited,
+        plain functions run in a worker thread only for the duration of the call.
 
-                if actions:
-                    action, args_str = actions[0].groups()
-                    action_inputs = self._parse_arguments(args_str)
+        Args:
+            question: The input question to process.
+            max_turns: Maximum number of turns before timing out.
+
+        Returns:
+            The final answer or None if no answer found.
+        """
+        self.setup_system_prompt()
+        next_prompt = question
+
+        try:
+            for _ in range(max_turns):
+                # Stop between turns once the request was cancelled or timed out
+                check_deadline()
+                self.messages.append({"role": "user", "content": next_prompt})
+                result = await self._aexecute()
+                self.messages.append({"role": "assistant", "content": result})
 
-                    tool = self.tools.get(action)
-                    if not tool:
-                        raise ValueError(f"Unknown action: {action}")
+                answer, action = self._next_step(result)
+                if action is None:
+                    return answer
 
-                    observation = tool(*action_inputs)
-                    next_prompt = f"Observation: {observation}"
+                # Started while the turn was still streaming, or run now
+                dispatched, self._dispatched = self._dispatched, None
+                if dispatched is not None:
+                    observation = await self._adispatched_result(dispatched)
                 else:
-                    # No Action: line – treat the whole response as the final answer
-                    return result.strip() if result else None
+                    observation = await self._acall_tool(*action)
+                next_prompt = f"Observation: {observation}"
 
+        except RequestAborted:
+            raise
         except Exception:
             return None
+        finally:
+            # A tool started by a turn that failed afterwards has nobody left to wait for it
+            if self._dispatched is not None:
+                self._dispatched.cancel()
+                self._dispatched = None
 
         return None
 
@@ -331,3 +952,7 @@ class AIAgent:
         actions_str = [self._function_to_string(func) for func in self.tools.values()]
         system = prompt.format("\n\n".join(actions_str))
         self.messages = [{"role": "system", "content": system}]
+        # A new conversation: nothing is stored on the backend yet
+        self._previous_response_id = None
+        self._stored_messages = 0
+        self._dispatched = None
@@ -0,0 +1,392 @@
+import sys
+import os
+import asyncio
+import itertools
+import json
+import re
+import threading
+
+import httpx
+import pytest
+from openai import AsyncOpenAI, BadRequestError, OpenAI
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.openai_responses_agent_base import agent as agent_module
+from src.openai_responses_agent_base.agent import STOP_SEQUENCES, AIAgent
+from src.openai_responses_agent_base.tools import search_price
+
+QUESTION = "How much does a Lenovo laptop cost?"
+TOOL_TURNS = 3
+ACTION = 'Thought: I need the price.\nAction: search_price("Lenovo")\nPAUSE'
+# What a model that does not stop at PAUSE goes on with
+OVERRUN = "\nObservation: Price of Lenovo is $1\nAnswer: A Lenovo laptop costs $1"
+
+
+class MockResponsesBackend:
+    """Responses API mock: calls the tool TOOL_TURNS times, then answers.
+
+    A stateful backend stores every response, so previous_response_id chains on
+    it; a stateless one rejects previous_response_id with 400. Every request body
+    is recorded, to compare the bytes sent per turn. With overrun the model writes
+    on past PAUSE unless the request has stop sequences; streamed requests are
+    answered with Server-Sent Events. chained_error, a (status, error) pair, is
+    the answer to every chained request instead.
+    """
+
+    def __init__(
+        self, stateful: bool, overrun: bool = False, chained_error: tuple | None = None
+    ) -> None:
+        self.stateful = stateful
+        self.overrun = overrun
+        self.chained_error = chained_error
+        self.bodies: list[dict] = []
+        self.sizes: list[int] = []
+        self._stored: dict[str, list] = {}
+        self._ids = itertools.count()
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.bodies.append(body)
+        self.sizes.append(len(request.content))
+
+        conversation = list(body["input"])
+        previous = body.get("previous_response_id")
+        if previous is not None:
+            if self.chained_error is not None:
+                status, error = self.chained_error
+                return httpx.Response(status, json={"error": error})
+            if not self.stateful:
+                error = {
+                    "message": "previous_response_id is not supported",
+                    "type": "invalid_request_error",
+                }
+                return httpx.Response(400, json={"error": error})
+            conversation = self._stored[previous] + conversation
+
+        observations = sum(
+            1
+            for item in conversation
+            if item["content"][0]["text"].startswith("Observation:")
+        )
+        if observations < TOOL_TURNS:
+            text = ACTION + OVERRUN if self.overrun else ACTION
+        else:
+            text = "Answer: A Lenovo laptop costs $400"
+        for stop in body.get("stop", []):
+            text = text.split(stop)[0]
+
+        response_id = f"resp_{next(self._ids)}"
+        if self.stateful and body.get("store"):
+            output = {"role": "assistant", "content": [{"type": "input_text", "text": text}]}
+            self._stored[response_id] = conversation + [output]
+        response = {
+            "id": response_id,
+            "object": "response",
+            "created_at": 0,
+            "model": body["model"],
+            "status": "completed",
+            # Like some OpenAI-compatible servers, a stateless backend echoes store without storing
+            "store": bool(body.get("store")),
+            "output": [
+                {
+                    "id": f"msg_{response_id}",
+                    "type": "message",
+                    "role": "assistant",
+                    "status": "completed",
+                    "content": [{"type": "output_text", "text": text, "annotations": []}],
+                }
+            ],
+        }
+        if body.get("stream"):
+            return httpx.Response(
+                200,
+                headers={"Content-Type": "text/event-stream"},
+                content=self._events(response, text),
+            )
+        return httpx.Response(200, json=response)
+
+    @staticmethod
+    def _events(response: dict, text: str) -> bytes:
+        """The response as a stream: one output_text delta per word, then response.completed."""
+        events = [
+            {
+                "type": "response.output_text.delta",
+                "item_id": f"msg_{response['id']}",
+                "output_index": 0,
+                "content_index": 0,
+                "delta": word,
+            }
+            for word in re.findall(r"\s*\S+", text)
+        ]
+        events.append({"type": "response.completed", "response": response})
+        return "".join(
+            f"event: {event['type']}\ndata: {json.dumps(event)}\n\n" for event in events
+        ).encode()
+
+    def client(self) -> OpenAI:
+        return OpenAI(
+            base_url="http://llm/v1",
+            api_key="test",
+            http_client=httpx.Client(transport=httpx.MockTransport(self.handler)),
+        )
+
+    def async_client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            base_url="http://llm/v1",
+            api_key="test",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handler)),
+        )
+
+
+@pytest.fixture(autouse=True)
+def _no_stateless_backends(monkeypatch):
+    monkeypatch.setattr(agent_module, "_stateless_backends", set())
+
+
+def _agent(backend: MockResponsesBackend, chain_turns: bool, **kwargs) -> AIAgent:
+    agent = AIAgent(
+        model="test-model",
+        client=backend.client(),
+        async_client=backend.async_client(),
+        chain_turns=chain_turns,
+        **kwargs,
+    )
+    agent.register_tool("search_price", search_price)
+    return agent
+
+
+def test_chained_turns_send_only_the_new_observation():
+    """Test that chained turns send a constant number of bytes, unlike the full history."""
+    chained = MockResponsesBackend(stateful=True)
+    full = MockResponsesBackend(stateful=True)
+
+    assert _agent(chained, chain_turns=True).query(QUESTION) == "A Lenovo laptop costs $400"
+    assert _agent(full, chain_turns=False).query(QUESTION) == "A Lenovo laptop costs $400"
+
+    assert len(chained.bodies) == len(full.bodies) == TOOL_TURNS + 1
+    # First turn: everything, stored, with the system prompt as an input item
+    first = chained.bodies[0]
+    assert first["store"] is True
+    assert "instructions" not in first
+    assert first["input"][0]["role"] == "system"
+    # Later turns: only the observation, chained on the previous response
+    for turn, body in enumerate(chained.bodies[1:], start=1):
+        assert body["previous_response_id"] == f"resp_{turn - 1}"
+        assert len(body["input"]) == 1
+        assert body["input"][0]["content"][0]["text"].startswith("Observation:")
+
+    # Bytes per turn: constant and far below the first when chained, growing with full history
+    assert max(chained.sizes[1:]) < chained.sizes[0] / 4
+    assert max(chained.sizes[1:]) - min(chained.sizes[1:]) < 16
+    assert all(later > earlier for earlier, later in zip(full.sizes, full.sizes[1:]))
+    assert sum(chained.sizes) < sum(full.sizes) / 2
+
+
+def test_stateless_backend_falls_back_to_full_history():
+    """Test that a backend rejecting previous_response_id gets the full history instead."""
+    backend = MockResponsesBackend(stateful=False)
+
+    assert _agent(backend, chain_turns=True).query(QUESTION) == "A Lenovo laptop costs $400"
+
+    # Turn 2 was rejected once, then resent in full; later turns are not chained at all
+    assert "previous_response_id" in backend.bodies[1]
+    assert all("previous_response_id" not in body for body in backend.bodies[2:])
+    assert backend.bodies[-1]["input"][-1]["content"][0]["text"].startswith("Observation:")
+    assert len(backend.bodies[-1]["input"]) == 2 * TOOL_TURNS + 1
+
+    # Later agents for the same backend start with the full history
+    backend.bodies.clear()
+    _agent(backend, chain_turns=True).query(QUESTION)
+    assert all("previous_response_id" not in body for body in backend.bodies)
+
+
+def test_unrelated_4xx_is_raised_and_lost_response_falls_back_per_agent():
+    """Test that only errors about chaining fall back, and only for this agent unless unsupported."""
+    too_long = {
+        "message": "This model's maximum context length is 8192 tokens.",
+        "type": "invalid_request_error",
+        "param": "input",
+        "code": "context_length_exceeded",
+    }
+    backend = MockResponsesBackend(stateful=True, chained_error=(400, too_long))
+    agent = _agent(backend, chain_turns=True)
+    agent.setup_system_prompt()
+    agent.messages.append({"role": "user", "content": QUESTION})
+    agent._execute()
+    agent.messages.append({"role": "assistant", "content": ACTION})
+    agent.messages.append({"role": "user", "content": "Observation: Price of Lenovo is $400"})
+    with pytest.raises(BadRequestError):
+        agent._execute()
+    assert agent.chain_turns is True
+    assert agent_module._stateless_backends == set()
+
+    lost = {
+        "message": "Previous response with id 'resp_0' not found.",
+        "type": "invalid_request_error",
+        "param": "previous_response_id",
+    }
+    backend = MockResponsesBackend(stateful=True, chained_error=(404, lost))
+    assert _agent(backend, chain_turns=True).query(QUESTION) == "A Lenovo laptop costs $400"
+    assert "previous_response_id" in backend.bodies[1]
+    assert all("previous_response_id" not in body for body in backend.bodies[2:])
+    # The backend does store responses: later agents still chain
+    assert agent_module._stateless_backends == set()
+    assert _agent(backend, chain_turns=True).chain_turns is True
+
+
+def test_agents_without_async_client_share_one():
+    """Test that agents built without an async client share one per endpoint and event loop."""
+    backend = MockResponsesBackend(stateful=False)
+
+    async def shared() -> bool:
+        first = AIAgent(model="test-model", client=backend.client())
+        second = AIAgent(model="test-model", client=backend.client())
+        return agent_module._shared_async_client(first.client) is (
+            agent_module._shared_async_client(second.client)
+        )
+
+    assert asyncio.run(shared())
+
+
+def test_aquery_chains_turns():
+    """Test that the async path chains turns the same way."""
+    backend = MockResponsesBackend(stateful=True)
+
+    answer = asyncio.run(_agent(backend, chain_turns=True).aquery(QUESTION))
+
+    assert answer == "A Lenovo laptop costs $400"
+    assert [len(body["input"]) for body in backend.bodies[1:]] == [1] * TOOL_TURNS
+
+
+def test_streamed_turn_is_cut_at_the_protocol_boundary():
+    """Test that output past PAUSE is dropped, and that a cut turn is resent instead of chained on."""
+    backend = MockResponsesBackend(stateful=True, overrun=True)
+    agent = _agent(backend, chain_turns=True, stop_mode="stream")
+
+    assert agent.query(QUESTION) == "A Lenovo laptop costs $400"
+
+    assert all(body["stream"] is True for body in backend.bodies)
+    turns = [m["content"] for m in agent.messages if m["role"] == "assistant"]
+    assert turns[:TOOL_TURNS] == [ACTION] * TOOL_TURNS
+    # The backend stored more than the agent kept: nothing was chained on it
+    assert all("previous_response_id" not in body for body in backend.bodies)
+
+    # Without a stop mode the invented observation and answer stay in the history
+    backend = MockResponsesBackend(stateful=True, overrun=True)
+    agent = _agent(backend, chain_turns=True, stop_mode="off")
+    agent.query(QUESTION)
+    assert agent.messages[2]["content"] == ACTION + OVERRUN
+
+
+def test_backend_stop_sequences_and_output_cap():
+    """Test that the backend stop mode sends stop sequences and max_output_tokens, and keeps chaining."""
+    backend = MockResponsesBackend(stateful=True, overrun=True)
+    agent = _agent(backend, chain_turns=True, stop_mode="backend", max_output_tokens=256)
+
+    answer = asyncio.run(agent.aquery(QUESTION))
+
+    assert answer == "A Lenovo laptop costs $400"
+    for body in backend.bodies:
+        assert body["stop"] == STOP_SEQUENCES
+        assert body["max_output_tokens"] == 256
+        assert "stream" not in body
+    assert [len(body["input"]) for body in backend.bodies[1:]] == [1] * TOOL_TURNS
+
+    with pytest.raises(ValueError):
+        _agent(backend, chain_turns=True, stop_mode="never")
+
+
+def test_rejected_stop_parameter_is_raised_and_keeps_chaining():
+    """Test that a backend rejecting the stop parameter fails the call without turning chaining off."""
+    unknown = {
+        "message": "Unknown parameter: 'stop'.",
+        "type": "invalid_request_error",
+        "param": "stop",
+    }
+    backend = MockResponsesBackend(stateful=True, chained_error=(400, unknown))
+    agent = _agent(backend, chain_turns=True, stop_mode="backend")
+    agent.setup_system_prompt()
+    agent.messages.append({"role": "user", "content": QUESTION})
+    agent._execute()
+    agent.messages.append({"role": "assistant", "content": ACTION})
+    agent.messages.append({"role": "user", "content": "Observation: Price of Lenovo is $400"})
+    with pytest.raises(BadRequestError):
+        agent._execute()
+    assert backend.bodies[0]["stop"] == STOP_SEQUENCES
+    assert agent.chain_turns is True
+    assert agent_module._stateless_backends == set()
+
+
+def test_tool_is_dispatched_once_its_action_line_is_complete():
+    """Test that the tool starts from the streamed Action line and the rest of the turn is dropped."""
+    backend = MockResponsesBackend(stateful=False, overrun=True)
+    agent = _agent(backend, chain_turns=False, stop_mode="stream")
+    callers = []
+
+    def search_price(brand: str) -> str:
+        callers.append(threading.current_thread())
+        return f"Price of {brand} is $400"
+
+    agent.register_tool("search_price", search_price)
+
+    assert agent.query(QUESTION) == "A Lenovo laptop costs $400"
+
+    turns = [m["content"] for m in agent.messages if m["role"] == "assistant"]
+    assert turns[:TOOL_TURNS] == [ACTION.removesuffix("\nPAUSE")] * TOOL_TURNS
+    # Started from the stream reader, on the tool thread pool
+    assert len(callers) == TOOL_TURNS
+    assert all(caller.name.startswith("tool") for caller in callers)
+
+    # Without early dispatch the tool runs after the turn, in the caller's thread
+    callers.clear()
+    agent.early_tool_dispatch = False
+    agent.query(QUESTION)
+    assert callers == [threading.current_thread()] * TOOL_TURNS
+
+
+def test_dispatched_tool_wait_is_bounded(monkeypatch):
+    """Test that query() gives up on a started tool after TOOL_TIMEOUT_SECONDS and forgets it."""
+    monkeypatch.setattr(agent_module, "TOOL_TIMEOUT_SECONDS", 0.05)
+    backend = MockResponsesBackend(stateful=False, overrun=True)
+    agent = _agent(backend, chain_turns=False, stop_mode="stream")
+    release = threading.Event()
+
+    def search_price(brand: str) -> str:
+        release.wait(5)
+        return f"Price of {brand} is $400"
+
+    agent.register_tool("search_price", search_price)
+
+    try:
+        assert agent.query(QUESTION) is None
+    finally:
+        release.set()
+    assert len(backend.bodies) == 1
+    assert agent._dispatched is None
+
+
+def test_aquery_dispatches_tools_early_and_keeps_chaining():
+    """Test that async early dispatch awaits the started tool, and a stored turn is still chained on."""
+    backend = MockResponsesBackend(stateful=True)
+    agent = _agent(backend, chain_turns=True, stop_mode="stream", early_tool_dispatch=True)
+    calls = []
+
+    async def search_price(brand: str) -> str:
+        calls.append(brand)
+        await asyncio.sleep(0.01)
+        return f"Price of {brand} is $400"
+
+    agent.register_tool("search_price", search_price)
+
+    assert asyncio.run(agent.aquery(QUESTION)) == "A Lenovo laptop costs $400"
+
+    assert calls == ["Lenovo"] * TOOL_TURNS
+    # The stored turns were read to their end (PAUSE), so each later turn only sends the observation
+    assert [len(body["input"]) for body in backend.bodies[1:]] == [1] * TOOL_TURNS
+    assert agent._dispatched is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
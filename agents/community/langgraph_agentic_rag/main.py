@@ -1,20 +1,67 @@
-import json
 import os
-from contextlib import asynccontextmanager
+import uuid
+from contextlib import asynccontextmanager, nullcontext
 
-from fastapi import FastAPI, HTTPException
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel, ConfigDict, Field
 
+from langgraph_agentic_rag.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    admission_rejected_handler,
+)
 from langgraph_agentic_rag.agent import get_graph_closure
+from langgraph_agentic_rag.completion_cache import get_completion_cache
+from langgraph_agentic_rag.deadlines import (
+    RequestAborted,
+    open_scope,
+    request_aborted_handler,
+    request_timeout,
+    run_cancellable,
+)
+from langgraph_agentic_rag.metrics import (
+    MetricsMiddleware,
+    langchain_metrics_callback,
+    metrics_response,
+    register_admission,
+    register_completion_cache,
+    register_single_flight,
+)
+from langgraph_agentic_rag.serialization import (
+    ORJSONResponse,
+    ReturnMode,
+    langchain_serializer,
+    select_messages,
+)
+from langgraph_agentic_rag.single_flight import get_single_flight
+from langgraph_agentic_rag.threads import (
+    THREAD_DB_PATH,
+    ThreadStore,
+    new_messages_start,
+    run_options,
+    thread_config,
+)
 from langgraph_agentic_rag.utils import get_env_var
 
 
 # Request/Response models
 class ChatRequest(BaseModel):
-    """Incoming chat request body for the /chat endpoint."""
+    """Incoming chat request body for the /chat endpoint.
+
+    "return" selects what is sent back: "final" (only the answer), "new" (messages
+    produced by this run) or "full" (whole conversation, the default). "timeout"
+    (seconds) shortens the request's time budget, capped by REQUEST_TIMEOUT_SECONDS.
+    With "thread_id" the conversation is kept on the server: only the new message is
+    sent and earlier turns are restored from the thread.
+    """
+
+    model_config = ConfigDict(populate_by_name=True)
 
     message: str
+    return_mode: ReturnMode = Field(default="full", alias="return")
+    timeout: float | None = Field(default=None, gt=0)
+    thread_id: str | None = Field(default=None, min_length=1, max_length=256)
 
 
 class ChatResponse(BaseModel):
@@ -27,6 +74,27 @@ class ChatResponse(BaseModel):
 # Global variable for agent graph
 agent_graph = None
 
+# Same graph with a checkpointer, used for requests carrying a thread_id
+thread_graph = None
+thread_store: ThreadStore | None = None
+
+message_serializer = langchain_serializer()
+
+# Bounds concurrent graph runs (ADMISSION_* env vars); excess requests queue, then get 429
+admission = AdmissionController.from_env()
+register_admission(admission)
+
+# Opt-in LLM response cache (COMPLETION_CACHE_* env vars), shared by every client of the agent
+completion_cache = get_completion_cache()
+register_completion_cache(completion_cache)
+
+# Identical concurrent LLM requests share one upstream call (SINGLE_FLIGHT_ENABLED)
+single_flight = get_single_flight()
+register_single_flight(single_flight)
+
+# Feeds the per-node (agent, retrieve, generate), per-tool and per-LLM-call histograms served on /metrics
+metrics_callback = langchain_metrics_callback()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -34,8 +102,10 @@ async def lifespan(app: FastAPI):
 
     Reads BASE_URL, MODEL_ID, and RAG-specific configuration from the environment,
     builds the graph via get_graph_closure, and sets the global agent_graph for the /chat endpoint.
+    Unless THREAD_DB_PATH is empty, also opens the thread store and derives
+    thread_graph, the same graph checkpointed to it.
     """
-    global agent_graph
+    global agent_graph, thread_graph, thread_store
 
     # Get environment variables
     base_url = get_env_var("BASE_URL")
@@ -59,10 +129,21 @@ async def lifespan(app: FastAPI):
     )
     agent_graph = graph_closure()
 
+    if THREAD_DB_PATH:
+        thread_store = await ThreadStore().open()
+        thread_store.start_eviction()
+        thread_graph = agent_graph.copy(
+            update={"checkpointer": thread_store.checkpointer}
+        )
+
     yield
 
     # Cleanup on shutdown (if needed)
     agent_graph = None
+    thread_graph = None
+    if thread_store is not None:
+        await thread_store.close()
+        thread_store = None
 
 
 # Create FastAPI app
@@ -70,89 +151,113 @@ app = FastAPI(
     title="LangGraph Agentic RAG API",
     description="FastAPI service for LangGraph Agentic RAG Agent",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
+app.add_exception_handler(AdmissionRejected, admission_rejected_handler)
+app.add_exception_handler(RequestAborted, request_aborted_handler)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """
     Chat endpoint that accepts a message and returns the agent's response.
 
+    The run is cancelled when the client disconnects (499) or when the request's
+    deadline passes (504); the deadline also bounds every LLM and retrieval call.
+
     Args:
         request: ChatRequest containing the user message
+        http_request: Raw request, watched for client disconnects and X-Request-Timeout
 
     Returns:
-        JSON response with full conversation history including tool calls
+        JSON response with the conversation history (including tool calls) selected by request.return_mode
     """
     global agent_graph
 
     if agent_graph is None:
         raise HTTPException(status_code=503, detail="Agent not initialized")
 
-    try:
-        messages = [HumanMessage(content=request.message)]
-
-        # Use invoke to get the agent's response
-        result = await agent_graph.ainvoke(
-            {"messages": messages}, config={"recursion_limit": 15}
-        )
+    graph = agent_graph
+    if request.thread_id is not None:
+        if thread_graph is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Conversation threads are disabled (THREAD_DB_PATH is empty)",
+            )
+        graph = thread_graph
+
+    scope = open_scope(request_timeout(http_request, request.timeout))
+    thread_turn = (
+        thread_store.turn(request.thread_id)
+        if request.thread_id is not None
+        else nullcontext()
+    )
 
-        response_messages = []
-
-        if "messages" in result and len(result["messages"]) > 0:
-            for message in result["messages"]:
-                # 1. User message (HumanMessage)
-                if isinstance(message, HumanMessage):
-                    response_messages.append(
-                        {
-                            "role": "user",
-                            "content": message.content,
-                        }
-                    )
-
-                # 2. AI message (AIMessage)
-                elif isinstance(message, AIMessage):
-                    msg_data = {
-                        "role": "assistant",
-                        "content": message.content or "",
-                    }
-                    if message.tool_calls:
-                        msg_data["tool_calls"] = [
-                            {
-                                "id": tc["id"],
-                                "type": "function",
-                                "function": {
-                                    "name": tc["name"],
-                                    "arguments": json.dumps(tc["args"]),
-                                },
-                            }
-                            for tc in message.tool_calls
-                        ]
-                    response_messages.append(msg_data)
-
-                # 3. Tool response (ToolMessage)
-                elif isinstance(message, ToolMessage):
-                    response_messages.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": message.tool_call_id,
-                            "name": message.name,
-                            "content": message.content,
-                        }
-                    )
-
-        return {"messages": response_messages, "finish_reason": "stop"}
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Error processing request: {str(e)}"
-        )
+    # Turns of one thread wait for each other before taking an admission slot
+    async with thread_turn, admission.slot():
+        try:
+            message = HumanMessage(content=request.message)
+            if request.thread_id is not None:
+                # Lets the request's message be found in the restored history
+                message.id = str(uuid.uuid4())
+
+            # Use invoke to get the agent's response
+            result = await run_cancellable(
+                http_request,
+                graph.ainvoke(
+                    {"messages": [message]},
+                    config=thread_config(
+                        {"recursion_limit": 15, "callbacks": [metrics_callback]},
+                        request.thread_id,
+                    ),
+                    **run_options(request.thread_id),
+                ),
+                scope,
+            )
+
+            # Select before serializing so "final" only pays for the last message
+            result_messages = result.get("messages", [])
+            n_input = (
+                new_messages_start(result_messages, message.id)
+                if request.thread_id is not None
+                else 1
+            )
+            response_messages = select_messages(
+                result_messages, request.return_mode, n_input=n_input
+            )
+            return {
+                "messages": message_serializer.serialize_many(response_messages),
+                "finish_reason": "stop",
+            }
+
+        except RequestAborted:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error processing request: {str(e)}"
+            )
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request/node/tool/LLM latency histograms, in-flight gauges and token counters."""
+    return metrics_response()
 
 
 @app.get("/health")
 async def health():
-    """Return service health and whether the agent graph has been initialized."""
-    return {"status": "healthy", "agent_initialized": agent_graph is not None}
+    """Return service health, whether the agent graph has been initialized, admission queue, LLM request coalescing, completion cache and thread store state."""
+    return {
+        "status": "healthy",
+        "agent_initialized": agent_graph is not None,
+        "admission": admission.stats(),
+        "completion_cache": (
+            completion_cache.stats() if completion_cache is not None else None
+        ),
+        "single_flight": single_flight.stats() if single_flight is not None else None,
+        "threads": thread_store.stats() if thread_store is not None else None,
+    }
 
 
 if __name__ == "__main__":
@@ -6,6 +6,8 @@ from langgraph.graph import END, StateGraph, START
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
 from .tools import retriever_tool
+from langgraph_agentic_rag.deadlines import check_deadline, remaining_time
+from langgraph_agentic_rag.single_flight import llm_async_http_client, llm_http_client
 from langgraph_agentic_rag.utils import get_env_var
 from typing_extensions import TypedDict
 
@@ -52,10 +54,19 @@ def get_graph_closure(
         temperature=0.3,  # Higher temperature for better rephrasing
         api_key=api_key or "not-needed",
         base_url=base_url,
+        # Pooled client; coalesces identical in-flight requests and serves cached completions
+        http_client=llm_http_client(),
+        http_async_client=llm_async_http_client(),
     )
 
     TOOLS = [retriever_tool]
 
+    def call_options() -> dict:
+        """Per-call LLM options bounding the call by the current request's remaining time."""
+        check_deadline()
+        remaining = remaining_time()
+        return {"timeout": remaining} if remaining is not None else {}
+
     # Define system prompt
     default_system_prompt = (
         "You are a helpful AI assistant that can retrieve information from a knowledge base."
@@ -89,7 +100,7 @@ def get_graph_closure(
             system_prompt = SystemMessage(
                 default_system_prompt + "\n" + (instruction_prompt or "")
             )
-            response = model.invoke([system_prompt] + list(messages))
+            response = model.invoke([system_prompt] + list(messages), **call_options())
             return {"messages": [response]}
 
         return agent
@@ -152,9 +163,10 @@ Question: {question}
 
 Answer[start response with 'based on provided documents]:"""
 
-        # Generate response
+        # Generate response (outside the try so an expired deadline is not turned into an answer)
+        options = call_options()
         try:
-            response = chat.invoke([HumanMessage(content=rag_prompt_text)])
+            response = chat.invoke([HumanMessage(content=rag_prompt_text)], **options)
 
             if not response.content or not response.content.strip():
                 return {
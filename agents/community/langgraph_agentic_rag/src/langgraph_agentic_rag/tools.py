@@ -4,6 +4,7 @@ from langchain_core.tools import tool
 from llama_stack_client import LlamaStackClient
 from pydantic import BaseModel, Field
 
+from langgraph_agentic_rag.deadlines import check_deadline, remaining_time
 from langgraph_agentic_rag.utils import get_env_var
 
 # Cache to avoid re-initializing on every tool call
@@ -87,6 +88,11 @@ def retriever_tool(query: str) -> str:
     client = components["client"]
     vector_store_id = components["vector_store_id"]
 
+    # Bound the query by the remaining time of the current request (if any)
+    check_deadline()
+    remaining = remaining_time()
+    request_options = {"timeout": remaining} if remaining is not None else {}
+
     # Query the vector store using LlamaStack client
     # The query parameter takes the text string, and the server handles embedding generation
     response = client.vector_io.query(
@@ -95,6 +101,7 @@ def retriever_tool(query: str) -> str:
         params={
             "max_chunks": 2  # Retrieve only the most relevant document (max_chunks not top_k or K)
         },
+        **request_options,
     )
 
     # Format the retrieved documents
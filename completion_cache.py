@@ -0,0 +1,420 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator
+
+import httpx
+import orjson
+
+# Set to true to serve repeated LLM requests from the cache (opt-in)
+COMPLETION_CACHE_ENABLED = os.getenv("COMPLETION_CACHE_ENABLED", "false").lower() == "true"
+
+# SQLite file of the persistent tier; set it to an empty value to keep the cache in memory only
+COMPLETION_CACHE_PATH = os.getenv("COMPLETION_CACHE_PATH", "completion_cache.sqlite")
+
+# Cached completions older than this are never served (seconds)
+COMPLETION_CACHE_TTL_SECONDS = float(os.getenv("COMPLETION_CACHE_TTL_SECONDS", 24 * 3600))
+
+# Bounds of the in-process LRU tier
+COMPLETION_CACHE_MEMORY_ENTRIES = int(os.getenv("COMPLETION_CACHE_MEMORY_ENTRIES", 1024))
+COMPLETION_CACHE_MEMORY_MB = float(os.getenv("COMPLETION_CACHE_MEMORY_MB", 64))
+
+# Upper bound for the bodies stored in COMPLETION_CACHE_PATH; least recently used go first
+COMPLETION_CACHE_DISK_MB = float(os.getenv("COMPLETION_CACHE_DISK_MB", 1024))
+
+# A disk hit only rewrites the entry's last_used when it is older than this (seconds), so
+# repeated hits do not each pay for a write and a commit on the request path
+COMPLETION_CACHE_TOUCH_SECONDS = float(os.getenv("COMPLETION_CACHE_TOUCH_SECONDS", 60))
+
+# Endpoints whose responses depend only on the request body
+CACHED_ENDPOINTS = ("/chat/completions", "/completions", "/responses")
+
+
+def _normalize(value: Any) -> Any:
+    """Drop null fields recursively, so absent and null parameters share a key."""
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def completion_key(request: httpx.Request) -> str | None:
+    """Cache key of an LLM request, or None when the request is not cacheable.
+
+    The key covers the backend host, the endpoint and the normalized JSON body:
+    model id, messages/input, bound tool schemas and sampling parameters. Whether
+    the response is streamed is part of the body too, so SSE and JSON responses
+    never mix. So are the caller and storage fields (user, safety_identifier,
+    metadata, prompt_cache_key, store): a response is only replayed to requests
+    made on behalf of the same end user, with the same storage options.
+    """
+    if request.method != "POST" or not request.url.path.endswith(CACHED_ENDPOINTS):
+        return None
+    try:
+        body = orjson.loads(request.content)
+    except (orjson.JSONDecodeError, httpx.RequestNotRead):
+        return None
+    if not isinstance(body, dict):
+        return None
+    canonical = orjson.dumps(
+        [request.url.host, request.url.port, request.url.path, _normalize(body)],
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return hashlib.sha256(canonical).hexdigest()
+
+
+class CompletionCache:
+    """Two-tier cache of raw LLM responses: an in-process LRU in front of SQLite.
+
+    Entries are the upstream status, headers and body bytes of successful
+    responses, so a hit replays exactly what the backend sent (including SSE
+    streams) without any upstream call. Both tiers expire entries after ttl;
+    the memory tier is bounded by entry count and bytes, the SQLite tier by
+    max_disk_bytes, evicting least recently used entries first (recency on disk
+    is kept to within touch_interval seconds). Disk hits are promoted to the
+    memory tier.
+    """
+
+    def __init__(
+        self,
+        path: str = COMPLETION_CACHE_PATH,
+        ttl: float = COMPLETION_CACHE_TTL_SECONDS,
+        touch_interval: float = COMPLETION_CACHE_TOUCH_SECONDS,
+        max_entries: int = COMPLETION_CACHE_MEMORY_ENTRIES,
+        max_memory_bytes: int = int(COMPLETION_CACHE_MEMORY_MB * 1024 * 1024),
+        max_disk_bytes: int = int(COMPLETION_CACHE_DISK_MB * 1024 * 1024),
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        # key -> (expires_at, status, headers, body); most recently used last
+        self._memory: OrderedDict[str, tuple] = OrderedDict()
+        self._memory_bytes = 0
+        # Guards both tiers: sync clients call in from worker threads
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._disk_bytes = 0
+        if path:
+            self._open()
+
+        self.memory_hits_total = 0
+        self.disk_hits_total = 0
+        self.misses_total = 0
+        self.stores_total = 0
+        self.evictions_total = 0
+
+    def _open(self) -> None:
+        """Open the database and create the table."""
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, last_used REAL NOT NULL, "
+            "status INTEGER NOT NULL, headers BLOB NOT NULL, body BLOB NOT NULL, "
+            "size INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)"
+        )
+        self._conn.execute("DELETE FROM completions WHERE expires_at < ?", (time.time(),))
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()
+        self._disk_bytes = row[0]
+
+    def close(self) -> None:
+        """Close the database; the memory tier keeps working."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_memory(self, key: str) -> tuple | None:
+        """Look the key up in the LRU tier only; returns (status, headers, body) or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._drop_memory(key)
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits_total += 1
+            return entry[1:]
+
+    def get_disk(self, key: str) -> tuple | None:
+        """Look the key up in the SQLite tier and promote a hit to memory.
+
+        Counts a miss when the entry is not found, so call it after get_memory().
+        """
+        with self._lock:
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT expires_at, last_used, status, headers, body FROM completions "
+                    "WHERE key = ? AND expires_at >= ?",
+                    (key, time.time()),
+                ).fetchone()
+            if row is None:
+                self.misses_total += 1
+                return None
+            expires_at, last_used, status, headers, body = row
+            now = time.time()
+            if now - last_used >= self.touch_interval:
+                self._conn.execute(
+                    "UPDATE completions SET last_used = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+            headers = orjson.loads(headers)
+            self._put_memory(key, (expires_at, status, headers, body))
+            self.disk_hits_total += 1
+            return status, headers, body
+
+    def get(self, key: str) -> tuple | None:
+        """Look the key up in both tiers; returns (status, headers, body) or None."""
+        return self.get_memory(key) or self.get_disk(key)
+
+    def put(self, key: str, status: int, headers: list, body: bytes) -> None:
+        """Store a response in both tiers and enforce the size bounds."""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._put_memory(key, (expires_at, status, headers, body))
+            if self._conn is not None:
+                self._put_disk(key, expires_at, status, headers, body)
+            self.stores_total += 1
+
+    def _put_memory(self, key: str, entry: tuple) -> None:
+        """Insert into the LRU tier, evicting least recently used entries over the bounds."""
+        size = len(entry[3])
+        if size > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._drop_memory(key)
+        self._memory[key] = entry
+        self._memory_bytes += size
+        while (
+            len(self._memory) > self.max_entries
+            or self._memory_bytes > self.max_memory_bytes
+        ):
+            self._drop_memory(next(iter(self._memory)))
+            self.evictions_total += 1
+
+    def _drop_memory(self, key: str) -> None:
+        entry = self._memory.pop(key)
+        self._memory_bytes -= len(entry[3])
+
+    def _put_disk(
+        self, key: str, expires_at: float, status: int, headers: list, body: bytes
+    ) -> None:
+        """Insert into the SQLite tier, then delete expired and LRU entries over max_disk_bytes."""
+        size = len(body)
+        if size > self.max_disk_bytes:
+            return
+        old = self._conn.execute(
+            "SELECT size FROM completions WHERE key = ?", (key,)
+        ).fetchone()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO completions "
+            "(key, expires_at, last_used, status, headers, body, size) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, expires_at, time.time(), status, orjson.dumps(headers), body, size),
+        )
+        self._disk_bytes += size - (old[0] if old else 0)
+        if self._disk_bytes > self.max_disk_bytes:
+            cursor = self._conn.execute(
+                "DELETE FROM completions WHERE expires_at < ?", (time.time(),)
+            )
+            self.evictions_total += cursor.rowcount
+            self._disk_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM completions"
+            ).fetchone()[0]
+        while self._disk_bytes > self.max_disk_bytes:
+            key, size = self._conn.execute(
+                "SELECT key, size FROM completions ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+            self._disk_bytes -= size
+            self.evictions_total += 1
+        self._conn.commit()
+
+    def stats(self) -> dict[str, Any]:
+        """Counters for /health and /metrics."""
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": self._disk_bytes,
+            "memory_hits_total": self.memory_hits_total,
+            "disk_hits_total": self.disk_hits_total,
+            "misses_total": self.misses_total,
+            "stores_total": self.stores_total,
+            "evictions_total": self.evictions_total,
+        }
+
+
+def _cached_response(request: httpx.Request, entry: tuple) -> httpx.Response:
+    """Rebuild the upstream response from a cache entry."""
+    status, headers, body = entry
+    return httpx.Response(
+        status,
+        headers=[(name, value) for name, value in headers],
+        stream=httpx.ByteStream(body),
+        request=request,
+    )
+
+
+def _cacheable_headers(response: httpx.Response) -> list:
+    """Upstream headers worth replaying (hop-by-hop ones describe the old connection)."""
+    return [
+        [name, value]
+        for name, value in response.headers.multi_items()
+        if name.lower() not in ("connection", "keep-alive", "date", "set-cookie")
+    ]
+
+
+def _read_body(response: httpx.Response) -> bytes | None:
+    """Body of a response the inner transport already read in full, else None."""
+    try:
+        return response.content
+    except httpx.ResponseNotRead:
+        return None
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """Pass the upstream body through and store it once it was read completely.
+
+    Streams cut short (client disconnect, error) are never stored.
+    """
+
+    def __init__(self, cache: CompletionCache, key: str, response: httpx.Response) -> None:
+        self.cache = cache
+        self.key = key
+        self.response = response
+        self.upstream = response.stream
+
+    def __iter__(self) -> Iterator[bytes]:
+        chunks = []
+        for chunk in self.upstream:
+            chunks.append(chunk)
+            yield chunk
+        self.cache.put(
+            self.key,
+            self.response.status_code,
+            _cacheable_headers(self.response),
+            b"".join(chunks),
+        )
+
+    def close(self) -> None:
+        self.upstream.close()
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    """Async counterpart of _RecordingStream; the SQLite write runs in a worker thread."""
+
+    def __init__(self, cache: CompletionCache, key: str, response: httpx.Response) -> None:
+        self.cache = cache
+        self.key = key
+        self.response = response
+        self.upstream = response.stream
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        chunks = []
+        async for chunk in self.upstream:
+            chunks.append(chunk)
+            yield chunk
+        await asyncio.to_thread(
+            self.cache.put,
+            self.key,
+            self.response.status_code,
+            _cacheable_headers(self.response),
+            b"".join(chunks),
+        )
+
+    async def aclose(self) -> None:
+        await self.upstream.aclose()
+
+
+class CachingTransport(httpx.BaseTransport):
+    """httpx transport serving repeated LLM requests from a CompletionCache.
+
+    Sits under the OpenAI SDK client, so it works the same for ChatOpenAI,
+    LlamaIndex's OpenAILike and a plain OpenAI client (see
+    single_flight.llm_http_client). Only 200 responses are stored.
+    """
+
+    def __init__(
+        self, cache: CompletionCache, transport: httpx.BaseTransport | None = None
+    ) -> None:
+        self.cache = cache
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = completion_key(request)
+        if key is None:
+            return self.transport.handle_request(request)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return _cached_response(request, entry)
+        response = self.transport.handle_request(request)
+        if response.status_code == 200:
+            body = _read_body(response)
+            if body is None:
+                response.stream = _RecordingStream(self.cache, key, response)
+            else:
+                self.cache.put(key, 200, _cacheable_headers(response), body)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncCachingTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of CachingTransport; SQLite lookups run in a worker thread."""
+
+    def __init__(
+        self, cache: CompletionCache, transport: httpx.AsyncBaseTransport | None = None
+    ) -> None:
+        self.cache = cache
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = completion_key(request)
+        if key is None:
+            return await self.transport.handle_async_request(request)
+        entry = self.cache.get_memory(key)
+        if entry is None:
+            entry = await asyncio.to_thread(self.cache.get_disk, key)
+        if entry is not None:
+            return _cached_response(request, entry)
+        response = await self.transport.handle_async_request(request)
+        if response.status_code == 200:
+            body = _read_body(response)
+            if body is None:
+                response.stream = _AsyncRecordingStream(self.cache, key, response)
+            else:
+                await asyncio.to_thread(
+                    self.cache.put, key, 200, _cacheable_headers(response), body
+                )
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+_completion_cache: CompletionCache | None = None
+
+
+def get_completion_cache() -> CompletionCache | None:
+    """Process-wide cache configured from the environment (None unless enabled)."""
+    global _completion_cache
+    if _completion_cache is None and COMPLETION_CACHE_ENABLED:
+        _completion_cache = CompletionCache()
+    return _completion_cache
+
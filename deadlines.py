@@ -0,0 +1,164 @@
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+# Default and upper bound for a request's time budget (seconds)
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", 120))
+
+# Header clients can use to shorten the budget (seconds, e.g. "X-Request-Timeout: 20")
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+
+class RequestAborted(Exception):
+    """Base class for runs stopped before they finished."""
+
+    status_code = 500
+
+
+class DeadlineExceeded(RequestAborted):
+    """The request's deadline passed before the agent produced an answer."""
+
+    status_code = 504
+
+
+class ClientDisconnected(RequestAborted):
+    """The client closed the connection while the agent was still running."""
+
+    # Non-standard "client closed request" code (nobody is left to read it anyway)
+    status_code = 499
+
+
+class RequestScope:
+    """Deadline and cancellation flag of one request.
+
+    The scope travels in a ContextVar, so it is visible to every coroutine and to
+    worker threads started with asyncio.to_thread/run_in_executor from the request.
+    Sync code that cannot be cancelled (thread pools) polls check() between steps.
+    """
+
+    def __init__(self, timeout: float | None) -> None:
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.cancelled = False
+        # Set once the run was stopped for its deadline, so check() reports the right reason
+        self.expired = False
+
+    def remaining(self) -> float | None:
+        """Seconds left until the deadline (never negative), or None without a deadline."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        """Raise if the request was cancelled or its deadline has passed."""
+        if self.cancelled:
+            raise ClientDisconnected("Client disconnected")
+        if self.expired or (self.deadline is not None and time.monotonic() >= self.deadline):
+            raise DeadlineExceeded("Request deadline exceeded")
+
+
+_current_scope: ContextVar[RequestScope | None] = ContextVar(
+    "request_scope", default=None
+)
+
+
+def request_timeout(request: Request, body_timeout: float | None = None) -> float:
+    """Resolve a request's time budget from the X-Request-Timeout header or the body field.
+
+    The smaller of the client values wins and the result is capped by REQUEST_TIMEOUT_SECONDS.
+    """
+    candidates = [REQUEST_TIMEOUT_SECONDS]
+    if body_timeout is not None:
+        candidates.append(body_timeout)
+    header = request.headers.get(TIMEOUT_HEADER)
+    if header:
+        try:
+            candidates.append(float(header))
+        except ValueError:
+            pass
+    return max(0.0, min(candidates))
+
+
+def open_scope(timeout: float | None) -> RequestScope:
+    """Start a RequestScope for the current context (request task)."""
+    scope = RequestScope(timeout)
+    _current_scope.set(scope)
+    return scope
+
+
+def current_scope() -> RequestScope | None:
+    """RequestScope of the request being served, if any."""
+    return _current_scope.get()
+
+
+def remaining_time() -> float | None:
+    """Seconds left for the current request, or None outside a request scope.
+
+    Pass it as the per-call timeout of LLM and tool calls so they never outlive the request.
+    """
+    scope = _current_scope.get()
+    return scope.remaining() if scope is not None else None
+
+
+def check_deadline() -> None:
+    """Raise DeadlineExceeded/ClientDisconnected if the current request should stop."""
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.check()
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    """Return once the client has disconnected."""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_cancellable(
+    request: Request, awaitable: Awaitable[Any], scope: RequestScope
+) -> Any:
+    """Await an agent run, cancelling it when the client disconnects or the deadline passes.
+
+    Cancelling the task aborts in-flight async LLM/HTTP calls immediately; sync work
+    running in threads sees scope.cancelled (disconnect) or scope.expired (deadline)
+    on its next check().
+
+    Raises:
+        ClientDisconnected: the client went away first.
+        DeadlineExceeded: the scope's deadline passed first.
+    """
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait(
+            {task, watcher},
+            timeout=scope.remaining(),
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        if task in done:
+            return task.result()
+
+        if watcher in done:
+            scope.cancelled = True
+        else:
+            scope.expired = True
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if watcher in done:
+            raise ClientDisconnected("Client disconnected")
+        raise DeadlineExceeded("Request deadline exceeded")
+    finally:
+        watcher.cancel()
+        if not task.done():
+            scope.cancelled = True
+            task.cancel()
+
+
+async def request_aborted_handler(request: Request, exc: RequestAborted) -> JSONResponse:
+    """FastAPI exception handler for DeadlineExceeded (504) and ClientDisconnected (499)."""
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
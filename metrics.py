@@ -0,0 +1,538 @@
+import inspect
+import time
+from contextvars import ContextVar
+from typing import Any
+
+from fastapi.responses import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Own registry, so importing the module twice (e.g. in tests) never registers duplicates
+REGISTRY = CollectorRegistry()
+
+# Seconds; covers fast tools as well as long LLM calls and whole agent runs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "agent_request_duration_seconds",
+    "End-to-end HTTP request latency (until the last byte of the response is sent).",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+REQUESTS = Counter(
+    "agent_requests",
+    "HTTP requests by route and status code.",
+    ["route", "status"],
+    registry=REGISTRY,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "agent_requests_in_flight",
+    "HTTP requests currently being served.",
+    ["route"],
+    registry=REGISTRY,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "agent_time_to_first_token_seconds",
+    "Time from request arrival to the first answer token sent on a streaming route.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+STEP_LATENCY = Histogram(
+    "agent_step_duration_seconds",
+    "Duration of each graph node / workflow step.",
+    ["step"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+TOOL_LATENCY = Histogram(
+    "agent_tool_duration_seconds",
+    "Duration of each tool invocation.",
+    ["tool"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_LATENCY = Histogram(
+    "agent_llm_request_duration_seconds",
+    "Duration of each upstream LLM request.",
+    ["model"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_TOKENS = Counter(
+    "agent_llm_tokens",
+    "Tokens reported by the LLM backend, by kind (prompt or completion).",
+    ["model", "kind"],
+    registry=REGISTRY,
+)
+
+# Label children are resolved once and cached, so an event costs one dict lookup + observe()
+_children: dict[tuple, Any] = {}
+
+
+def _child(metric: Any, *labels: str) -> Any:
+    """Cached metric.labels(*labels)."""
+    key = (metric, labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+
+def observe_step(step: str, seconds: float) -> None:
+    """Record the duration of a graph node / workflow step."""
+    _child(STEP_LATENCY, step).observe(seconds)
+
+
+def observe_tool(tool: str, seconds: float) -> None:
+    """Record the duration of a tool invocation."""
+    _child(TOOL_LATENCY, tool).observe(seconds)
+
+
+def observe_llm_request(
+    model: str, seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0
+) -> None:
+    """Record the duration and token usage of an upstream LLM request."""
+    _child(LLM_LATENCY, model).observe(seconds)
+    if prompt_tokens:
+        _child(LLM_TOKENS, model, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        _child(LLM_TOKENS, model, "completion").inc(completion_tokens)
+
+
+class _RequestTiming:
+    """Start time of the request being served, shared with the stream generators."""
+
+    __slots__ = ("route", "start", "first_token_seen")
+
+    def __init__(self, route: str, start: float) -> None:
+        self.route = route
+        self.start = start
+        self.first_token_seen = False
+
+
+_current_timing: ContextVar[_RequestTiming | None] = ContextVar(
+    "request_timing", default=None
+)
+
+
+def observe_first_token() -> None:
+    """Record time-to-first-token for the current request (only the first call counts).
+
+    Streaming routes call this right before sending the first frame that carries
+    answer content.
+    """
+    timing = _current_timing.get()
+    if timing is None or timing.first_token_seen:
+        return
+    timing.first_token_seen = True
+    _child(TIME_TO_FIRST_TOKEN, timing.route).observe(
+        time.perf_counter() - timing.start
+    )
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency, status codes and in-flight requests.
+
+    Latency is measured until the response is fully sent, so streaming routes are
+    covered end to end. Paths that are not routes of the app are grouped under
+    "other" to keep label cardinality bounded.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+        self._routes: set[str] | None = None
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self._routes is None:
+            self._routes = {
+                getattr(route, "path", "") for route in scope["app"].routes
+            }
+        route = scope["path"] if scope["path"] in self._routes else "other"
+
+        start = time.perf_counter()
+        _current_timing.set(_RequestTiming(route, start))
+        status = 500
+
+        async def send_with_status(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = _child(REQUESTS_IN_FLIGHT, route)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            _child(REQUEST_LATENCY, route).observe(time.perf_counter() - start)
+            _child(REQUESTS, route, str(status)).inc()
+
+
+class _AdmissionCollector:
+    """Expose the admission controller's state at scrape time (no per-request cost)."""
+
+    def __init__(self) -> None:
+        self.admission = None
+
+    def collect(self):
+        if self.admission is None:
+            return
+        stats = self.admission.stats()
+        for name, help_text in (
+            ("in_flight", "Admitted agent runs currently executing."),
+            ("max_in_flight", "Configured limit of concurrent agent runs."),
+            ("queue_depth", "Requests waiting for an admission slot."),
+            ("oldest_wait_seconds", "Wait time of the oldest queued request."),
+        ):
+            yield GaugeMetricFamily(f"agent_admission_{name}", help_text, value=stats[name])
+        for name, help_text in (
+            ("admitted", "Requests admitted."),
+            ("rejected", "Requests rejected because the wait queue was full."),
+            ("timed_out", "Requests rejected after waiting max_wait."),
+        ):
+            yield CounterMetricFamily(
+                f"agent_admission_{name}", help_text, value=stats[f"{name}_total"]
+            )
+
+
+_admission_collector = _AdmissionCollector()
+REGISTRY.register(_admission_collector)
+
+
+def register_admission(admission: Any) -> None:
+    """Export an AdmissionController's in-flight/queue state on /metrics."""
+    _admission_collector.admission = admission
+
+
+class _CompletionCacheCollector:
+    """Expose the completion cache's hit/miss counters and sizes at scrape time."""
+
+    def __init__(self) -> None:
+        self.cache = None
+
+    def collect(self):
+        if self.cache is None:
+            return
+        stats = self.cache.stats()
+        lookups = CounterMetricFamily(
+            "agent_completion_cache_lookups",
+            "LLM requests looked up in the completion cache, by result.",
+            labels=["result"],
+        )
+        for result, counter in (
+            ("memory_hit", "memory_hits_total"),
+            ("disk_hit", "disk_hits_total"),
+            ("miss", "misses_total"),
+        ):
+            lookups.add_metric([result], stats[counter])
+        yield lookups
+        for name, help_text in (
+            ("stores", "LLM responses stored in the completion cache."),
+            ("evictions", "Completion cache entries evicted by the size bounds."),
+        ):
+            yield CounterMetricFamily(
+                f"agent_completion_cache_{name}", help_text, value=stats[f"{name}_total"]
+            )
+        for name, help_text in (
+            ("memory_entries", "Entries in the in-process completion cache tier."),
+            ("memory_bytes", "Body bytes held by the in-process completion cache tier."),
+            ("disk_bytes", "Body bytes held by the SQLite completion cache tier."),
+        ):
+            yield GaugeMetricFamily(
+                f"agent_completion_cache_{name}", help_text, value=stats[name]
+            )
+
+
+_completion_cache_collector = _CompletionCacheCollector()
+REGISTRY.register(_completion_cache_collector)
+
+
+def register_completion_cache(cache: Any) -> None:
+    """Export a CompletionCache's hit/miss counters on /metrics (no-op for None)."""
+    _completion_cache_collector.cache = cache
+
+
+class _SingleFlightCollector:
+    """Expose how many LLM requests were coalesced onto another request's upstream call."""
+
+    def __init__(self) -> None:
+        self.single_flight = None
+
+    def collect(self):
+        if self.single_flight is None:
+            return
+        stats = self.single_flight.stats()
+        for name, help_text in (
+            ("in_flight", "Distinct upstream LLM requests currently in flight."),
+            ("waiters", "LLM requests currently waiting on an identical in-flight request."),
+        ):
+            yield GaugeMetricFamily(f"agent_llm_single_flight_{name}", help_text, value=stats[name])
+        for name, help_text in (
+            ("upstream", "LLM requests sent upstream by the single-flight layer."),
+            ("coalesced", "LLM requests served by an identical in-flight request."),
+        ):
+            yield CounterMetricFamily(
+                f"agent_llm_single_flight_{name}", help_text, value=stats[f"{name}_total"]
+            )
+
+
+_single_flight_collector = _SingleFlightCollector()
+REGISTRY.register(_single_flight_collector)
+
+
+def register_single_flight(single_flight: Any) -> None:
+    """Export a SingleFlight registry's waiter and coalescing counts on /metrics (no-op for None)."""
+    _single_flight_collector.single_flight = single_flight
+
+
+class _LoopPoolCollector:
+    """Expose the per-loop load of an event-loop pool (LlamaIndex AI service)."""
+
+    def __init__(self) -> None:
+        self.pool = None
+
+    def collect(self):
+        if self.pool is None:
+            return
+        in_flight = GaugeMetricFamily(
+            "agent_event_loop_in_flight",
+            "Requests in flight on each event loop of the pool.",
+            labels=["loop"],
+        )
+        utilization = GaugeMetricFamily(
+            "agent_event_loop_utilization",
+            "Fraction of time each event loop was busy (not waiting for I/O) since the previous scrape.",
+            labels=["loop"],
+        )
+        for index, stats in enumerate(self.pool.stats()):
+            in_flight.add_metric([str(index)], stats["in_flight"])
+            utilization.add_metric([str(index)], stats["utilization"])
+        yield in_flight
+        yield utilization
+
+
+_loop_pool_collector = _LoopPoolCollector()
+REGISTRY.register(_loop_pool_collector)
+
+
+def register_loop_pool(pool: Any) -> None:
+    """Export a LoopPool's per-loop requests in flight and utilization on /metrics."""
+    _loop_pool_collector.pool = pool
+
+
+def metrics_response() -> Response:
+    """Render all metrics in the Prometheus text format (body of GET /metrics)."""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+def langchain_metrics_callback() -> Any:
+    """LangChain callback handler feeding the step, tool and LLM metrics.
+
+    Pass it in the run config ({"callbacks": [handler]}); one instance serves all
+    requests. Graph nodes are recognised by their langgraph_node metadata.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class MetricsCallbackHandler(BaseCallbackHandler):
+        # Called directly on the event loop instead of through a thread pool
+        run_inline = True
+
+        def __init__(self) -> None:
+            self._runs: dict[Any, tuple[Any, str, float]] = {}
+
+        def _finish(self, run_id: Any) -> tuple[str, float] | None:
+            run = self._runs.pop(run_id, None)
+            if run is None:
+                return None
+            observe, label, start = run
+            seconds = time.perf_counter() - start
+            if observe is not None:
+                observe(label, seconds)
+            return label, seconds
+
+        def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+            name = kwargs.get("name")
+            if metadata and name is not None and name == metadata.get("langgraph_node"):
+                self._runs[run_id] = (observe_step, name, time.perf_counter())
+
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            self._finish(run_id)
+
+        def on_chain_error(self, error, *, run_id, **kwargs):
+            self._finish(run_id)
+
+        def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+            name = kwargs.get("name") or (serialized or {}).get("name", "unknown")
+            self._runs[run_id] = (observe_tool, name, time.perf_counter())
+
+        def on_tool_end(self, output, *, run_id, **kwargs):
+            self._finish(run_id)
+
+        def on_tool_error(self, error, *, run_id, **kwargs):
+            self._finish(run_id)
+
+        def _llm_start(self, run_id, metadata) -> None:
+            model = (metadata or {}).get("ls_model_name") or "unknown"
+            # Observed in on_llm_end, once the token usage is known
+            self._runs[run_id] = (None, model, time.perf_counter())
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+            self._llm_start(run_id, metadata)
+
+        def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+            self._llm_start(run_id, metadata)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            finished = self._finish(run_id)
+            if finished is None:
+                return
+            model, seconds = finished
+            prompt_tokens = completion_tokens = 0
+            try:
+                usage = response.generations[0][0].message.usage_metadata or {}
+                prompt_tokens = usage.get("input_tokens", 0)
+                completion_tokens = usage.get("output_tokens", 0)
+            except (AttributeError, IndexError):
+                pass
+            observe_llm_request(model, seconds, prompt_tokens, completion_tokens)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            finished = self._finish(run_id)
+            if finished is not None:
+                observe_llm_request(*finished)
+
+    return MetricsCallbackHandler()
+
+
+_llama_index_instrumented = False
+
+
+def instrument_llama_index() -> None:
+    """Register span/event handlers on the LlamaIndex root dispatcher (idempotent).
+
+    Workflow steps, tool calls (BaseTool.__call__ / acall) and LLM chat calls are timed from
+    their instrumentation spans; token usage is read from LLMChatEndEvent.
+    """
+    global _llama_index_instrumented
+    if _llama_index_instrumented:
+        return
+
+    from llama_index.core.instrumentation import get_dispatcher
+    from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+    from llama_index.core.instrumentation.events.llm import LLMChatEndEvent
+    from llama_index.core.instrumentation.span_handlers import BaseSpanHandler
+    from llama_index.core.llms import LLM
+    from llama_index.core.tools.types import BaseTool
+    from llama_index.core.workflow import Workflow
+
+    llm_methods = {"chat", "achat", "stream_chat", "astream_chat"}
+    # span id -> (kind, observe, label, start, parent span id); nested spans are kept with
+    # observe=None, so steps can find their workflow run and token usage can find its model
+    open_spans: dict[str, tuple[str, Any, str, float, str | None]] = {}
+    # LLM spans whose call returned a stream: timed until the stream ends (LLMChatEndEvent).
+    # Bounded, since a stream abandoned by its consumer never ends.
+    streaming_spans: dict[str, tuple[str, Any, str, float, str | None]] = {}
+    max_streaming_spans = 1024
+
+    class MetricsSpanHandler(BaseSpanHandler[Any]):
+        def new_span(self, id_, bound_args, instance=None, parent_span_id=None, tags=None, **kwargs):
+            # Span ids look like "FunctionCallingAgent.handle_llm_input-<uuid>"
+            method = id_.partition("-")[0].rpartition(".")[2]
+            parent = open_spans.get(parent_span_id)
+            if isinstance(instance, Workflow):
+                if method == "run":
+                    open_spans[id_] = ("run", None, method, 0.0, parent_span_id)
+            elif instance is None:
+                # Step spans carry no instance; their parent is the workflow run
+                if parent is not None and parent[0] == "run":
+                    open_spans[id_] = (
+                        "step", observe_step, method, time.perf_counter(), parent_span_id
+                    )
+            elif isinstance(instance, BaseTool):
+                if method in ("__call__", "acall"):
+                    name = instance.metadata.get_name()
+                    open_spans[id_] = (
+                        "tool", observe_tool, name, time.perf_counter(), parent_span_id
+                    )
+            elif isinstance(instance, LLM) and method in llm_methods:
+                model = getattr(instance, "model", None) or "unknown"
+                # Only the outermost call is timed (e.g. achat, not the achat/chat it delegates to)
+                nested = parent is not None and parent[0] == "llm"
+                observe = None if nested else observe_llm_request
+                open_spans[id_] = ("llm", observe, model, time.perf_counter(), parent_span_id)
+            return None
+
+        def _finish(self, id_):
+            span = open_spans.pop(id_, None)
+            if span is not None and span[1] is not None:
+                _, observe, label, start, _ = span
+                observe(label, time.perf_counter() - start)
+
+        def prepare_to_exit_span(self, id_, bound_args, instance=None, result=None, **kwargs):
+            span = open_spans.get(id_)
+            if span is not None and span[0] == "llm" and (
+                inspect.isasyncgen(result) or inspect.isgenerator(result)
+            ):
+                streaming_spans[id_] = open_spans.pop(id_)
+                if len(streaming_spans) > max_streaming_spans:
+                    del streaming_spans[next(iter(streaming_spans))]
+                return
+            self._finish(id_)
+
+        def prepare_to_drop_span(self, id_, bound_args, instance=None, err=None, **kwargs):
+            self._finish(id_)
+
+    class MetricsEventHandler(BaseEventHandler):
+        # Wrapping LLM calls may each emit an end event for the same response
+        last_response_id: int = 0
+
+        @classmethod
+        def class_name(cls) -> str:
+            return "MetricsEventHandler"
+
+        def handle(self, event, **kwargs):
+            if not isinstance(event, LLMChatEndEvent):
+                return
+            span = open_spans.get(event.span_id) or streaming_spans.get(event.span_id)
+            if span is None:
+                return
+            self._end_stream(event.span_id)
+            usage = getattr(getattr(event.response, "raw", None), "usage", None)
+            if usage is None or id(event.response) == self.last_response_id:
+                return
+            self.last_response_id = id(event.response)
+            model = span[2]
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            if prompt_tokens:
+                _child(LLM_TOKENS, model, "prompt").inc(prompt_tokens)
+            if completion_tokens:
+                _child(LLM_TOKENS, model, "completion").inc(completion_tokens)
+
+        @staticmethod
+        def _end_stream(span_id):
+            """Time a finished stream's LLM span and the LLM spans wrapping it."""
+            while span_id in streaming_spans:
+                _, observe, label, start, parent_span_id = streaming_spans.pop(span_id)
+                if observe is not None:
+                    observe(label, time.perf_counter() - start)
+                span_id = parent_span_id
+
+    dispatcher = get_dispatcher()
+    dispatcher.add_span_handler(MetricsSpanHandler())
+    dispatcher.add_event_handler(MetricsEventHandler())
+    _llama_index_instrumented = True
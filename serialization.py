@@ -0,0 +1,232 @@
+from typing import Any, Callable, Iterable, Literal
+
+import orjson
+from fastapi.responses import Response
+
+# What the /chat routes send back:
+#   final - only the final assistant message
+#   new   - messages produced by this run (the request's own messages are left out)
+#   full  - the whole conversation, including the request's messages (default)
+ReturnMode = Literal["final", "new", "full"]
+
+
+class ORJSONResponse(Response):
+    """JSON response rendered with orjson (bytes out, no intermediate str)."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        """Serialize content to JSON bytes."""
+        return orjson.dumps(content)
+
+
+def sse_event(data: Any) -> bytes:
+    """Encode one Server-Sent Events frame; strings (e.g. "[DONE]") are sent verbatim."""
+    if isinstance(data, str):
+        return b"data: " + data.encode() + b"\n\n"
+    return b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+def ndjson_line(data: Any) -> bytes:
+    """Encode one newline-delimited JSON record."""
+    return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+
+
+def _dump_arguments(args: Any) -> str:
+    """Tool call arguments as a JSON string (OpenAI format); strings are passed through."""
+    if isinstance(args, str):
+        return args
+    return orjson.dumps(args).decode()
+
+
+def select_messages(messages: list, return_mode: ReturnMode, n_input: int = 0) -> list:
+    """Pick the messages to send back before any of them is serialized.
+
+    Args:
+        messages: Conversation returned by the agent (framework message objects or dicts).
+        return_mode: "final", "new" or "full" (see ReturnMode).
+        n_input: Number of leading messages that came from the request.
+
+    Returns:
+        The selected slice of messages.
+    """
+    if return_mode == "final":
+        return messages[-1:]
+    if return_mode == "new":
+        return messages[n_input:]
+    return messages
+
+
+class MessageSerializer:
+    """Serialize agent messages to OpenAI-style dicts through a dispatch table.
+
+    Handlers are looked up by key(message) (the message type by default). For type
+    keys the MRO is walked once per concrete class and the result cached, so each
+    message costs one dict lookup plus its handler. Messages without a handler
+    (e.g. system messages) are skipped.
+    """
+
+    def __init__(
+        self,
+        handlers: dict[Any, Callable[[Any], dict | None]],
+        key: Callable[[Any], Any] = type,
+    ) -> None:
+        self._handlers = dict(handlers)
+        self._resolved: dict[Any, Callable[[Any], dict | None] | None] = {}
+        self._key = key
+
+    def _resolve(self, key: Any) -> Callable[[Any], dict | None] | None:
+        """Find (and cache) the handler for a dispatch key."""
+        handler = self._handlers.get(key)
+        if handler is None and isinstance(key, type):
+            for base in key.__mro__[1:]:
+                if base in self._handlers:
+                    handler = self._handlers[base]
+                    break
+        self._resolved[key] = handler
+        return handler
+
+    def serialize(self, message: Any) -> dict | None:
+        """Serialize one message, or return None if it has no handler."""
+        key = self._key(message)
+        try:
+            handler = self._resolved[key]
+        except KeyError:
+            handler = self._resolve(key)
+        return handler(message) if handler is not None else None
+
+    def serialize_many(self, messages: Iterable[Any]) -> list[dict]:
+        """Serialize messages, dropping the ones without a handler."""
+        serialized = []
+        for message in messages:
+            item = self.serialize(message)
+            if item is not None:
+                serialized.append(item)
+        return serialized
+
+
+def langchain_serializer() -> MessageSerializer:
+    """MessageSerializer for LangChain messages (HumanMessage, AIMessage, ToolMessage)."""
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+    def user(message: HumanMessage) -> dict:
+        return {"role": "user", "content": message.content}
+
+    def assistant(message: AIMessage) -> dict:
+        msg_data = {"role": "assistant", "content": message.content or ""}
+        if message.tool_calls:
+            msg_data["tool_calls"] = [
+                {
+                    "id": tc["id"],
+                    "type": "function",
+                    "function": {
+                        "name": tc["name"],
+                        "arguments": _dump_arguments(tc["args"]),
+                    },
+                }
+                for tc in message.tool_calls
+            ]
+        return msg_data
+
+    def tool(message: ToolMessage) -> dict:
+        return {
+            "role": "tool",
+            "tool_call_id": message.tool_call_id,
+            "name": message.name,
+            "content": message.content,
+        }
+
+    return MessageSerializer({HumanMessage: user, AIMessage: assistant, ToolMessage: tool})
+
+
+def llama_index_message_content(msg: Any) -> str:
+    """Extract text content from a LlamaIndex ChatMessage."""
+    if getattr(msg, "blocks", None):
+        # Find the first block with text content (skip ToolCallBlock)
+        for block in msg.blocks:
+            if hasattr(block, "text"):
+                return block.text or ""
+        return ""
+    content = getattr(msg, "content", None)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list) and content:
+        first = content[0]
+        if isinstance(first, dict) and "text" in first:
+            return first["text"] or ""
+    return ""
+
+
+def _llama_index_tool_calls(tool_calls: list) -> list[dict]:
+    """Convert LlamaIndex tool calls (ToolSelection, OpenAI objects or dicts) to OpenAI dicts."""
+    if hasattr(tool_calls[0], "tool_id"):  # ToolSelection-like
+        return [
+            {
+                "id": tc.tool_id,
+                "type": "function",
+                "function": {
+                    "name": tc.tool_name,
+                    "arguments": _dump_arguments(tc.tool_kwargs),
+                },
+            }
+            for tc in tool_calls
+        ]
+    if hasattr(tool_calls[0], "id") and hasattr(tool_calls[0], "function"):
+        # ChatCompletionMessageFunctionToolCall object
+        return [
+            {
+                "id": tc.id,
+                "type": getattr(tc, "type", "function"),
+                "function": {
+                    "name": getattr(tc.function, "name", ""),
+                    "arguments": _dump_arguments(getattr(tc.function, "arguments", "")),
+                },
+            }
+            for tc in tool_calls
+        ]
+    # dict format (e.g. from additional_kwargs)
+    serialized = []
+    for tc in tool_calls:
+        fn = tc.get("function", {}) or {}
+        serialized.append(
+            {
+                "id": tc.get("id", ""),
+                "type": "function",
+                "function": {
+                    "name": fn.get("name", ""),
+                    "arguments": _dump_arguments(fn.get("arguments", "")),
+                },
+            }
+        )
+    return serialized
+
+
+def llama_index_serializer() -> MessageSerializer:
+    """MessageSerializer for LlamaIndex ChatMessages, dispatching on the message role."""
+    from llama_index.core.llms import MessageRole
+
+    def user(msg: Any) -> dict:
+        return {"role": "user", "content": llama_index_message_content(msg)}
+
+    def assistant(msg: Any) -> dict:
+        msg_data = {"role": "assistant", "content": llama_index_message_content(msg)}
+        tool_calls = getattr(msg, "tool_calls", None)
+        if not tool_calls and getattr(msg, "additional_kwargs", None):
+            tool_calls = msg.additional_kwargs.get("tool_calls")
+        if tool_calls:
+            msg_data["tool_calls"] = _llama_index_tool_calls(tool_calls)
+        return msg_data
+
+    def tool(msg: Any) -> dict:
+        additional = getattr(msg, "additional_kwargs", {}) or {}
+        return {
+            "role": "tool",
+            "tool_call_id": additional.get("tool_call_id", ""),
+            "name": additional.get("name", ""),
+            "content": llama_index_message_content(msg),
+        }
+
+    return MessageSerializer(
+        {MessageRole.USER: user, MessageRole.ASSISTANT: assistant, MessageRole.TOOL: tool},
+        key=lambda msg: getattr(msg, "role", MessageRole.USER),
+    )
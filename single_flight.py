@@ -0,0 +1,419 @@
+import asyncio
+import os
+import threading
+from typing import Any, AsyncIterator, Iterator
+
+import httpx
+
+try:
+    from .completion_cache import (
+        AsyncCachingTransport,
+        CachingTransport,
+        completion_key,
+        get_completion_cache,
+    )
+    from .deadlines import check_deadline, remaining_time
+except ImportError:
+    # Imported as a top-level module (the shared copy at the repository root)
+    from completion_cache import (
+        AsyncCachingTransport,
+        CachingTransport,
+        completion_key,
+        get_completion_cache,
+    )
+    from deadlines import check_deadline, remaining_time
+
+# Set to false to send every LLM request upstream even while an identical one is in flight
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+# Connection pool of the LLM clients (defaults match the OpenAI SDK's own pool)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 1000))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 100))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", 5))
+
+
+class _Flight:
+    """One upstream request and the body chunks received so far, shared by its subscribers."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.response: httpx.Response | None = None
+        self.chunks: list[bytes] = []
+        self.done = False
+        self.error: BaseException | None = None
+        # Requests currently attached: the leader plus the coalesced waiters
+        self.subscribers = 0
+
+
+class SingleFlight:
+    """Registry of in-flight LLM requests, so identical concurrent requests share one call.
+
+    The first request for a key (same backend, endpoint and normalized body as
+    the completion cache key) goes upstream; requests with the same key arriving
+    while it runs attach to it and receive the same status, headers and body,
+    streamed chunk by chunk as the upstream sends them. Nothing is kept once the
+    upstream response ends, so a later identical request goes upstream again.
+
+    The upstream body is pumped by a task (async) or thread (sync) of its own, so
+    a slow or disconnected subscriber never holds up the others; the upstream
+    request is abandoned once every subscriber has gone.
+    """
+
+    def __init__(self) -> None:
+        # (event loop, key) -> flight; async flights only make sense within one loop
+        self._async_flights: dict[tuple, _Flight] = {}
+        self._sync_flights: dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+        self.upstream_total = 0
+        self.coalesced_total = 0
+
+    def _join(self, flights: dict, flight_key: Any, key: str) -> tuple[_Flight, bool]:
+        """Attach to the flight for key, creating it if needed; returns (flight, is_leader)."""
+        with self._lock:
+            flight = flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = flights[flight_key] = _Flight(key)
+                self.upstream_total += 1
+            else:
+                self.coalesced_total += 1
+            flight.subscribers += 1
+            return flight, leader
+
+    def _leave(self, flights: dict, flight_key: Any, flight: _Flight) -> bool:
+        """Detach from a flight; returns True when it was the last subscriber."""
+        with self._lock:
+            flight.subscribers -= 1
+            if flight.subscribers > 0:
+                return False
+            if flights.get(flight_key) is flight:
+                del flights[flight_key]
+            return True
+
+    def _land(self, flights: dict, flight_key: Any, flight: _Flight) -> None:
+        """Stop new requests from joining a flight whose upstream response has ended."""
+        with self._lock:
+            if flights.get(flight_key) is flight:
+                del flights[flight_key]
+
+    def stats(self) -> dict[str, Any]:
+        """Counters for /health and /metrics."""
+        with self._lock:
+            flights = [*self._async_flights.values(), *self._sync_flights.values()]
+            waiters = sum(flight.subscribers - 1 for flight in flights)
+        return {
+            "in_flight": len(flights),
+            # Requests waiting on another request's upstream call right now
+            "waiters": waiters,
+            "upstream_total": self.upstream_total,
+            "coalesced_total": self.coalesced_total,
+        }
+
+
+def _read_timeout(request: httpx.Request) -> float | None:
+    """The request's own read timeout, applied while waiting for shared chunks."""
+    return (request.extensions.get("timeout") or {}).get("read")
+
+
+def _wait_timeout(request: httpx.Request) -> float | None:
+    """How long a subscriber waits for the shared response to start: its read timeout,
+    capped by what is left of the current request's deadline."""
+    timeouts = [t for t in (_read_timeout(request), remaining_time()) if t is not None]
+    return min(timeouts) if timeouts else None
+
+
+def _wait_timed_out() -> None:
+    """Raise for a subscriber that gave up waiting for the shared response."""
+    # Out of request time rather than read time: stop the run
+    check_deadline()
+    raise httpx.ReadTimeout("Timed out waiting for the shared LLM response")
+
+
+def _fan_out_response(request: httpx.Request, flight: _Flight, stream: Any) -> httpx.Response:
+    """A subscriber's copy of the flight's upstream response."""
+    return httpx.Response(
+        flight.response.status_code,
+        headers=flight.response.headers.multi_items(),
+        stream=stream,
+        request=request,
+    )
+
+
+class _AsyncFlightState:
+    """asyncio primitives of a flight: wakes subscribers when chunks arrive."""
+
+    def __init__(self) -> None:
+        self.ready = asyncio.get_running_loop().create_future()
+        self.changed = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class AsyncSingleFlightTransport(httpx.AsyncBaseTransport):
+    """httpx transport coalescing identical concurrent LLM requests (async clients)."""
+
+    def __init__(
+        self, single_flight: SingleFlight, transport: httpx.AsyncBaseTransport
+    ) -> None:
+        self.single_flight = single_flight
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = completion_key(request)
+        if key is None:
+            return await self.transport.handle_async_request(request)
+
+        flights = self.single_flight._async_flights
+        flight_key = (asyncio.get_running_loop(), key)
+        flight, leader = self.single_flight._join(flights, flight_key, key)
+        if leader:
+            flight.state = _AsyncFlightState()
+            flight.state.task = asyncio.create_task(
+                self._pump(request, flight, flight_key)
+            )
+        try:
+            # Shielded: a cancelled or timed-out subscriber must not cancel the shared
+            # upstream call
+            await asyncio.wait_for(asyncio.shield(flight.state.ready), _wait_timeout(request))
+        except asyncio.TimeoutError:
+            self._leave(flight, flight_key)
+            _wait_timed_out()
+        except BaseException:
+            self._leave(flight, flight_key)
+            raise
+        stream = _AsyncFlightStream(self, flight, flight_key, _read_timeout(request))
+        return _fan_out_response(request, flight, stream)
+
+    async def _pump(self, request: httpx.Request, flight: _Flight, flight_key: tuple) -> None:
+        """Send the upstream request and buffer its body for all subscribers."""
+        state = flight.state
+        try:
+            flight.response = await self.transport.handle_async_request(request)
+        except BaseException as e:
+            self.single_flight._land(self.single_flight._async_flights, flight_key, flight)
+            state.ready.set_exception(e)
+            # Retrieved by the subscribers; keeps asyncio from logging it when there are none
+            state.ready.exception()
+            return
+        state.ready.set_result(None)
+        try:
+            async for chunk in flight.response.stream:
+                flight.chunks.append(chunk)
+                state.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self.single_flight._land(self.single_flight._async_flights, flight_key, flight)
+            state.notify()
+            await flight.response.aclose()
+
+    def _leave(self, flight: _Flight, flight_key: tuple) -> None:
+        """Detach a subscriber; the last one cancels an unfinished upstream call."""
+        if self.single_flight._leave(self.single_flight._async_flights, flight_key, flight):
+            if not flight.done:
+                flight.state.task.cancel()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class _AsyncFlightStream(httpx.AsyncByteStream):
+    """A subscriber's view of the flight body: buffered chunks first, then live ones."""
+
+    def __init__(
+        self,
+        transport: AsyncSingleFlightTransport,
+        flight: _Flight,
+        flight_key: tuple,
+        timeout: float | None,
+    ) -> None:
+        self.transport = transport
+        self.flight = flight
+        self.flight_key = flight_key
+        self.timeout = timeout
+        self.closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        flight, index = self.flight, 0
+        while True:
+            while index < len(flight.chunks):
+                yield flight.chunks[index]
+                index += 1
+            if flight.done:
+                if flight.error is not None:
+                    raise flight.error
+                return
+            try:
+                await asyncio.wait_for(flight.state.changed.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                raise httpx.ReadTimeout("Timed out waiting for the shared LLM response") from None
+
+    async def aclose(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.transport._leave(self.flight, self.flight_key)
+
+
+class SingleFlightTransport(httpx.BaseTransport):
+    """httpx transport coalescing identical concurrent LLM requests (sync clients)."""
+
+    def __init__(self, single_flight: SingleFlight, transport: httpx.BaseTransport) -> None:
+        self.single_flight = single_flight
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = completion_key(request)
+        if key is None:
+            return self.transport.handle_request(request)
+
+        flight, leader = self.single_flight._join(self.single_flight._sync_flights, key, key)
+        if leader:
+            flight.state = threading.Condition()
+            flight.ready = threading.Event()
+            threading.Thread(target=self._pump, args=(request, flight), daemon=True).start()
+        if not flight.ready.wait(_wait_timeout(request)):
+            self._leave(flight)
+            _wait_timed_out()
+        if flight.response is None:
+            self._leave(flight)
+            raise flight.error
+        stream = _FlightStream(self, flight, _read_timeout(request))
+        return _fan_out_response(request, flight, stream)
+
+    def _pump(self, request: httpx.Request, flight: _Flight) -> None:
+        """Send the upstream request and buffer its body for all subscribers."""
+        flights = self.single_flight._sync_flights
+        try:
+            flight.response = self.transport.handle_request(request)
+        except BaseException as e:
+            # Any failure must set ready, or the subscribers would wait forever
+            flight.error = e
+            flight.done = True
+            self.single_flight._land(flights, flight.key, flight)
+            flight.ready.set()
+            return
+        flight.ready.set()
+        try:
+            for chunk in flight.response.stream:
+                with flight.state:
+                    # Every subscriber has gone: abandon the upstream response
+                    if flight.subscribers == 0:
+                        break
+                    flight.chunks.append(chunk)
+                    flight.state.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with flight.state:
+                flight.done = True
+                flight.state.notify_all()
+            self.single_flight._land(flights, flight.key, flight)
+            flight.response.close()
+
+    def _leave(self, flight: _Flight) -> None:
+        self.single_flight._leave(self.single_flight._sync_flights, flight.key, flight)
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class _FlightStream(httpx.SyncByteStream):
+    """Sync counterpart of _AsyncFlightStream."""
+
+    def __init__(
+        self, transport: SingleFlightTransport, flight: _Flight, timeout: float | None
+    ) -> None:
+        self.transport = transport
+        self.flight = flight
+        self.timeout = timeout
+        self.closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        flight, index = self.flight, 0
+        while True:
+            with flight.state:
+                if index >= len(flight.chunks) and not flight.done:
+                    if not flight.state.wait(self.timeout):
+                        raise httpx.ReadTimeout(
+                            "Timed out waiting for the shared LLM response"
+                        )
+                chunks = flight.chunks[index:]
+                done = flight.done
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+            if done and index == len(flight.chunks):
+                if flight.error is not None:
+                    raise flight.error
+                return
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.transport._leave(self.flight)
+
+
+_single_flight: SingleFlight | None = None
+
+
+def get_single_flight() -> SingleFlight | None:
+    """Process-wide registry shared by every LLM client (None when disabled)."""
+    global _single_flight
+    if _single_flight is None and SINGLE_FLIGHT_ENABLED:
+        _single_flight = SingleFlight()
+    return _single_flight
+
+
+def llm_connection_limits(
+    max_connections: int | None = None,
+    max_keepalive_connections: int | None = None,
+    keepalive_expiry: float | None = None,
+) -> httpx.Limits:
+    """Pool limits of the LLM clients; arguments left out come from the LLM_* env vars."""
+    return httpx.Limits(
+        max_connections=max_connections or LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=max_keepalive_connections or LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=(
+            keepalive_expiry if keepalive_expiry is not None else LLM_KEEPALIVE_EXPIRY_SECONDS
+        ),
+    )
+
+
+def llm_http_client(limits: httpx.Limits | None = None) -> httpx.Client:
+    """httpx client for OpenAI SDK based clients (http_client=...).
+
+    Layers request coalescing over the completion cache (each if enabled) over a
+    connection pool bounded by limits (llm_connection_limits() if omitted). Build
+    it once per process and reuse it, so connections are kept alive across
+    requests.
+    """
+    from openai import DefaultHttpxClient
+
+    transport = httpx.HTTPTransport(limits=limits or llm_connection_limits())
+    cache, single_flight = get_completion_cache(), get_single_flight()
+    if cache is not None:
+        transport = CachingTransport(cache, transport)
+    if single_flight is not None:
+        transport = SingleFlightTransport(single_flight, transport)
+    return DefaultHttpxClient(transport=transport)
+
+
+def llm_async_http_client(limits: httpx.Limits | None = None) -> httpx.AsyncClient:
+    """Async counterpart of llm_http_client (http_async_client / async_http_client).
+
+    The client's connections belong to the event loop that first uses it.
+    """
+    from openai import DefaultAsyncHttpxClient
+
+    transport = httpx.AsyncHTTPTransport(limits=limits or llm_connection_limits())
+    cache, single_flight = get_completion_cache(), get_single_flight()
+    if cache is not None:
+        transport = AsyncCachingTransport(cache, transport)
+    if single_flight is not None:
+        transport = AsyncSingleFlightTransport(single_flight, transport)
+    return DefaultAsyncHttpxClient(transport=transport)
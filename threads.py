@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+# SQLite file holding the conversation threads; set it to an empty value to disable threads
+THREAD_DB_PATH = os.getenv("THREAD_DB_PATH", "threads.sqlite")
+
+# Threads idle for longer than this are deleted (seconds)
+THREAD_TTL_SECONDS = float(os.getenv("THREAD_TTL_SECONDS", 24 * 3600))
+
+# Upper bound for the data stored in THREAD_DB_PATH; least recently used threads go first
+THREAD_DB_MAX_MB = float(os.getenv("THREAD_DB_MAX_MB", 512))
+
+# How often the eviction pass runs (seconds)
+THREAD_EVICTION_INTERVAL_SECONDS = float(
+    os.getenv("THREAD_EVICTION_INTERVAL_SECONDS", 300)
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadStore:
+    """Conversation threads persisted by a LangGraph AsyncSqliteSaver.
+
+    Clients send a thread_id with each turn and only the new user message; the
+    graph restores the earlier messages from the checkpointer. Only the latest
+    checkpoint of a thread is kept (older ones are superseded since the message
+    list is cumulative), threads idle for longer than ttl are deleted and, when the
+    stored data grows beyond max_bytes, the least recently used threads are
+    deleted until it fits again.
+
+    Turns of the same thread are serialized, so concurrent requests cannot fork a
+    conversation.
+    """
+
+    def __init__(
+        self,
+        path: str = THREAD_DB_PATH,
+        ttl: float = THREAD_TTL_SECONDS,
+        max_bytes: int = int(THREAD_DB_MAX_MB * 1024 * 1024),
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.checkpointer = None
+        self._conn = None
+        # thread_id -> [lock, number of requests holding or waiting for it]
+        self._locks: dict[str, list] = {}
+        self._eviction_task: asyncio.Task | None = None
+
+        self.evicted_expired_total = 0
+        self.evicted_size_total = 0
+
+    async def open(self) -> "ThreadStore":
+        """Open the database, create the tables and return the store."""
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        self._conn = await aiosqlite.connect(self.path)
+        async with self._conn.execute("PRAGMA page_count") as cursor:
+            created = (await cursor.fetchone())[0] == 0
+        if created:
+            # Only takes effect before the first table is created: lets deleted threads
+            # shrink the file again. An existing file without it reuses its free pages
+            # instead, which _used_bytes() does not count.
+            await self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.checkpointer = AsyncSqliteSaver(self._conn)
+        await self.checkpointer.setup()
+        await self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_activity ("
+            "thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+        )
+        await self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS thread_activity_last_seen "
+            "ON thread_activity (last_seen)"
+        )
+        await self._conn.commit()
+        return self
+
+    async def close(self) -> None:
+        """Stop the eviction loop and close the database."""
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            await asyncio.gather(self._eviction_task, return_exceptions=True)
+            self._eviction_task = None
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+            self.checkpointer = None
+
+    @asynccontextmanager
+    async def turn(self, thread_id: str) -> AsyncIterator[None]:
+        """Hold the thread for one turn, then record its activity and prune old checkpoints.
+
+        Activity is recorded even when the turn fails: the checkpointer may have
+        written already, and a thread without activity would never be evicted.
+        """
+        entry = self._locks.get(thread_id)
+        if entry is None:
+            entry = self._locks[thread_id] = [asyncio.Lock(), 0]
+        # Count holders and waiters, so the lock is only dropped once nobody uses it
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                try:
+                    yield
+                finally:
+                    await self._finish_turn(thread_id)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[thread_id]
+
+    async def _finish_turn(self, thread_id: str) -> None:
+        """Update last_seen and keep only the thread's latest checkpoint."""
+        await self._conn.execute(
+            "INSERT INTO thread_activity (thread_id, last_seen) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET last_seen = excluded.last_seen",
+            (thread_id, time.time()),
+        )
+        for table in ("checkpoints", "writes"):
+            await self._conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_id < "
+                "(SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ?)",
+                (thread_id, thread_id),
+            )
+        await self._conn.commit()
+
+    async def delete(self, thread_id: str) -> None:
+        """Delete a thread and its checkpoints."""
+        await self.checkpointer.adelete_thread(thread_id)
+        await self._conn.execute(
+            "DELETE FROM thread_activity WHERE thread_id = ?", (thread_id,)
+        )
+        await self._conn.commit()
+
+    async def _used_bytes(self) -> int:
+        """Bytes of the database actually holding data (free pages excluded)."""
+        values = []
+        for pragma in ("page_count", "freelist_count", "page_size"):
+            async with self._conn.execute(f"PRAGMA {pragma}") as cursor:
+                values.append((await cursor.fetchone())[0])
+        page_count, freelist_count, page_size = values
+        return (page_count - freelist_count) * page_size
+
+    async def evict(self) -> int:
+        """Delete expired threads, then least recently used ones until the size bound holds.
+
+        Threads with a turn in progress are never evicted.
+
+        Returns:
+            Number of threads deleted.
+        """
+        evicted = 0
+        async with self._conn.execute(
+            "SELECT thread_id FROM thread_activity WHERE last_seen < ?",
+            (time.time() - self.ttl,),
+        ) as cursor:
+            expired = [row[0] for row in await cursor.fetchall()]
+        for thread_id in expired:
+            if thread_id not in self._locks:
+                await self.delete(thread_id)
+                self.evicted_expired_total += 1
+                evicted += 1
+
+        over_limit = await self._used_bytes() > self.max_bytes
+        while over_limit:
+            async with self._conn.execute(
+                "SELECT thread_id FROM thread_activity ORDER BY last_seen LIMIT 16"
+            ) as cursor:
+                oldest = [
+                    row[0]
+                    for row in await cursor.fetchall()
+                    if row[0] not in self._locks
+                ]
+            if not oldest:
+                break
+            for thread_id in oldest:
+                await self.delete(thread_id)
+                self.evicted_size_total += 1
+                evicted += 1
+                over_limit = await self._used_bytes() > self.max_bytes
+                if not over_limit:
+                    break
+
+        if evicted:
+            await self._conn.commit()
+            # execute() steps the pragma once, freeing a single page; executescript()
+            # runs it to completion, giving every free page back to the file system
+            await self._conn.executescript("PRAGMA incremental_vacuum;")
+        return evicted
+
+    def start_eviction(self, interval: float = THREAD_EVICTION_INTERVAL_SECONDS) -> None:
+        """Run evict() every interval seconds in the background."""
+
+        async def loop() -> None:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.evict()
+                except Exception:
+                    logger.exception("Thread eviction failed")
+
+        self._eviction_task = asyncio.create_task(loop())
+
+    def stats(self) -> dict[str, Any]:
+        """Counters for /health."""
+        return {
+            "active_turns": len(self._locks),
+            "evicted_expired_total": self.evicted_expired_total,
+            "evicted_size_total": self.evicted_size_total,
+        }
+
+
+def thread_config(config: dict, thread_id: str | None) -> dict:
+    """Add the thread_id to a run config (unchanged when thread_id is None)."""
+    if thread_id is None:
+        return config
+    return {**config, "configurable": {"thread_id": thread_id}}
+
+
+def run_options(thread_id: str | None) -> dict:
+    """Extra ainvoke/astream options: threaded runs are checkpointed once, when they end."""
+    return {"durability": "exit"} if thread_id is not None else {}
+
+
+def new_messages_start(messages: list, message_id: str) -> int:
+    """Index just after the request's message in a restored thread (0 if not found).
+
+    Used as n_input for return="new", since the history before the request's
+    message is not known up front.
+    """
+    for index in range(len(messages) - 1, -1, -1):
+        if getattr(messages[index], "id", None) == message_id:
+            return index + 1
+    return 0